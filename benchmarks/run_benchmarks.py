@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+run_benchmarks.py
+
+measure ops/sec and MB/s for motoboto's hot paths against an
+in-process LocalServer, save the results as JSON, and optionally
+compare them with an earlier run.
+
+    python benchmarks/run_benchmarks.py --output new.json
+    python benchmarks/run_benchmarks.py --compare old.json
+
+exits 1 if --compare finds a regression bigger than --threshold
+"""
+import argparse
+import json
+import logging
+import os
+import os.path
+import platform
+import sys
+import tempfile
+import time
+
+# run from a checkout, without installing
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from motoboto.config import config_template
+from motoboto.local_server import LocalServer
+from motoboto.s3.key import Key
+from motoboto.worker_pool import run_jobs
+
+_config = config_template(
+    user_name="benchmark-user", auth_key_id=1, auth_key="benchmark-key"
+)
+_collection_name = "benchmark-collection"
+
+_default_concurrency = [1, 4, 16, ]
+_default_small_count = 1000
+_default_small_size = 1024
+_default_large_size = 64 * 1024 * 1024
+_default_list_sizes = [10 ** 4, 10 ** 5, 10 ** 6, ]
+_default_read_buffer_sizes = "65536,1048576,adaptive"
+_default_threshold = 0.10
+
+def _parse_args():
+    parser = argparse.ArgumentParser(prog="run_benchmarks")
+    parser.add_argument("--output", default=None,
+                        help="write the results here as JSON")
+    parser.add_argument("--compare", default=None,
+                        help="an earlier --output to compare against")
+    parser.add_argument("--threshold", type=float, default=_default_threshold,
+                        help="the slowdown that counts as a regression")
+    parser.add_argument("--concurrency", default=None,
+                        help="comma separated thread counts")
+    parser.add_argument("--small-count", type=int,
+                        default=_default_small_count)
+    parser.add_argument("--small-size", type=int,
+                        default=_default_small_size)
+    parser.add_argument("--large-size", type=int,
+                        default=_default_large_size)
+    parser.add_argument("--list-sizes", default=None,
+                        help="comma separated key counts for get_all_keys")
+    parser.add_argument("--read-buffer-sizes",
+                        default=_default_read_buffer_sizes,
+                        help="comma separated read_buffer_size values "
+                        "(bytes, or adaptive) for the read_buffer_ "
+                        "benchmarks")
+    parser.add_argument("--only", default=None,
+                        help="comma separated benchmark names")
+    parser.add_argument("--quick", action="store_true",
+                        help="small sizes, for a smoke test")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.small_count = 100
+        args.large_size = 4 * 1024 * 1024
+        if args.list_sizes is None:
+            args.list_sizes = "10000"
+        if args.concurrency is None:
+            args.concurrency = "1,4"
+
+    args.concurrency = _int_list(args.concurrency, _default_concurrency)
+    args.list_sizes = _int_list(args.list_sizes, _default_list_sizes)
+    args.read_buffer_sizes = [
+        item if item == "adaptive" else int(item)
+        for item in args.read_buffer_sizes.split(",")
+    ]
+    args.only = None if args.only is None else set(args.only.split(","))
+    return args
+
+def _int_list(value, default):
+    if value is None:
+        return default
+    return [int(item) for item in value.split(",")]
+
+def _run_concurrently(function, jobs, concurrency):
+    for job_result in run_jobs(function, jobs, concurrency):
+        if job_result.exception is not None:
+            raise job_result.exception
+
+class _Benchmarks(object):
+    """
+    each benchmark returns (op_count, byte_count, seconds)
+    """
+    def __init__(self, local_server, emulator, bucket, args):
+        self._local_server = local_server
+        self._emulator = emulator
+        self._bucket = bucket
+        self._args = args
+        self._small_data = "x" * args.small_size
+        self._small_names = [
+            "small/%08d" % (n, ) for n in range(args.small_count)
+        ]
+
+    def small_put(self, concurrency):
+        return self._time_small(
+            self._put_small, concurrency, len(self._small_data)
+        )
+
+    def small_get(self, concurrency):
+        def _get(key_name):
+            Key(self._bucket, key_name).get_contents_as_string()
+        return self._time_small(_get, concurrency, len(self._small_data))
+
+    def small_head(self, concurrency):
+        def _head(key_name):
+            Key(self._bucket, key_name).exists()
+        return self._time_small(_head, concurrency, 0)
+
+    def get_metadata(self, concurrency):
+        def _get_metadata(key_name):
+            Key(self._bucket, key_name).get_metadata("benchmark")
+        return self._time_small(_get_metadata, concurrency, 0)
+
+    def small_delete(self, concurrency):
+        def _delete(key_name):
+            Key(self._bucket, key_name).delete()
+        result = self._time_small(_delete, concurrency, 0)
+        # put them back for the next concurrency level
+        self.setup_small()
+        return result
+
+    def _time_small(self, function, concurrency, bytes_per_op):
+        start_time = time.time()
+        _run_concurrently(function, self._small_names, concurrency)
+        return (
+            len(self._small_names),
+            len(self._small_names) * bytes_per_op,
+            time.time() - start_time,
+        )
+
+    def _put_small(self, key_name):
+        key = Key(self._bucket, key_name)
+        key.set_metadata("benchmark", "value")
+        key.set_contents_from_string(self._small_data)
+
+    def setup_small(self):
+        for key_name in self._small_names:
+            self._put_small(key_name)
+
+    def large_upload(self, concurrency):
+        size = self._args.large_size
+        block = os.urandom(1024 * 1024)
+        with tempfile.TemporaryFile() as input_file:
+            for offset in xrange(0, size, len(block)):
+                input_file.write(block[:size-offset])
+            input_file.seek(0)
+            start_time = time.time()
+            Key(self._bucket, "large").set_contents_from_file(
+                input_file, thread_count=concurrency
+            )
+            return 1, size, time.time() - start_time
+
+    def large_download(self, concurrency):
+        with tempfile.TemporaryFile() as output_file:
+            start_time = time.time()
+            Key(self._bucket, "large").get_contents_to_file(
+                output_file, thread_count=concurrency
+            )
+            seconds = time.time() - start_time
+            return 1, output_file.tell(), seconds
+
+    def large_stream(self, concurrency):
+        """read the large key through Key.read, on one connection"""
+        byte_count = 0
+        key = Key(self._bucket, "large")
+        start_time = time.time()
+        for data in key:
+            byte_count += len(data)
+        return 1, byte_count, time.time() - start_time
+
+    def read_buffer_to_file(self, read_buffer_size):
+        """get_contents_to_file of the large key, on one connection"""
+        with tempfile.TemporaryFile() as output_file:
+            start_time = time.time()
+            Key(self._bucket, "large").get_contents_to_file(
+                output_file, read_buffer_size=read_buffer_size
+            )
+            seconds = time.time() - start_time
+            return 1, output_file.tell(), seconds
+
+    def read_buffer_as_string(self, read_buffer_size):
+        """get_contents_as_string of the large key"""
+        start_time = time.time()
+        data = Key(self._bucket, "large").get_contents_as_string(
+            read_buffer_size=read_buffer_size
+        )
+        return 1, len(data), time.time() - start_time
+
+    def list_keys(self, key_count):
+        collection_name = "list-%s" % (key_count, )
+        bucket = self._emulator.create_bucket(collection_name)
+        self._local_server.populate(
+            collection_name,
+            ("key/%08d" % (n, ) for n in xrange(key_count))
+        )
+        start_time = time.time()
+        listed = 0
+        for _ in bucket.list():
+            listed += 1
+        seconds = time.time() - start_time
+        assert listed == key_count, (listed, key_count, )
+        return listed, 0, seconds
+
+def _result(name, concurrency, params, measurement):
+    op_count, byte_count, seconds = measurement
+    seconds = max(seconds, 1e-9)
+    return {
+        "name"              : name,
+        "concurrency"       : concurrency,
+        "params"            : params,
+        "ops"               : op_count,
+        "bytes"             : byte_count,
+        "seconds"           : seconds,
+        "ops_per_second"    : op_count / seconds,
+        "mb_per_second"     : byte_count / seconds / (1024 * 1024),
+    }
+
+def _run(args):
+    log = logging.getLogger("run")
+    local_server = LocalServer()
+    local_server.start()
+    emulator = local_server.connect_s3(
+        _config, max_size=max(args.concurrency) + 1
+    )
+    bucket = emulator.create_bucket(_collection_name)
+    benchmarks = _Benchmarks(local_server, emulator, bucket, args)
+
+    def _wanted(name):
+        return args.only is None or name in args.only
+
+    results = list()
+    try:
+        benchmarks.setup_small()
+        for name in [
+            "small_put",
+            "small_get",
+            "small_head",
+            "get_metadata",
+            "small_delete",
+        ]:
+            if not _wanted(name):
+                continue
+            for concurrency in args.concurrency:
+                result = _result(
+                    name,
+                    concurrency,
+                    {"count" : args.small_count, "size" : args.small_size},
+                    getattr(benchmarks, name)(concurrency)
+                )
+                log.info(_format(result))
+                results.append(result)
+
+        for name in ["large_upload", "large_download", "large_stream", ]:
+            if not _wanted(name):
+                continue
+            if name != "large_upload" and not _wanted("large_upload"):
+                benchmarks.large_upload(1)
+            concurrency_levels = args.concurrency
+            if name == "large_stream":
+                concurrency_levels = [1, ]
+            for concurrency in concurrency_levels:
+                result = _result(
+                    name,
+                    concurrency,
+                    {"size" : args.large_size},
+                    getattr(benchmarks, name)(concurrency)
+                )
+                log.info(_format(result))
+                results.append(result)
+
+        for name in ["read_buffer_to_file", "read_buffer_as_string", ]:
+            if not _wanted(name):
+                continue
+            if not _wanted("large_upload"):
+                benchmarks.large_upload(1)
+            for read_buffer_size in args.read_buffer_sizes:
+                result = _result(
+                    name,
+                    1,
+                    {
+                        "size"              : args.large_size, 
+                        "read_buffer_size"  : read_buffer_size,
+                    },
+                    getattr(benchmarks, name)(read_buffer_size)
+                )
+                log.info(_format(result))
+                results.append(result)
+
+        if _wanted("list_keys"):
+            for key_count in args.list_sizes:
+                result = _result(
+                    "list_keys",
+                    1,
+                    {"key_count" : key_count},
+                    benchmarks.list_keys(key_count)
+                )
+                log.info(_format(result))
+                results.append(result)
+    finally:
+        emulator.close()
+        local_server.stop()
+
+    return results
+
+def _format(result):
+    params = ",".join([
+        "%s=%s" % item for item in sorted(result["params"].items())
+    ])
+    return "%-16s %-24s c=%-3s %10.1f ops/s %9.2f MB/s" % (
+        result["name"],
+        params,
+        result["concurrency"],
+        result["ops_per_second"],
+        result["mb_per_second"],
+    )
+
+def _result_key(result):
+    return (
+        result["name"],
+        result["concurrency"],
+        tuple(sorted(result["params"].items())),
+    )
+
+def _compare(baseline, results, threshold):
+    """
+    print each result beside its baseline, return the regressions
+    """
+    baseline_results = dict([
+        (_result_key(result), result, ) for result in baseline["results"]
+    ])
+    regressions = list()
+    for result in results:
+        old_result = baseline_results.get(_result_key(result))
+        if old_result is None or old_result["ops_per_second"] == 0.0:
+            continue
+        ratio = result["ops_per_second"] / old_result["ops_per_second"]
+        flag = ""
+        if ratio < 1.0 - threshold:
+            flag = "REGRESSION"
+            regressions.append((result, old_result, ))
+        print "%s %+6.1f%% %s" % (_format(result), (ratio - 1.0) * 100, flag)
+    return regressions
+
+def main():
+    args = _parse_args()
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARN,
+        format="%(asctime)s %(levelname)-8s %(name)-20s: %(message)s"
+    )
+
+    results = _run(args)
+    report = {
+        "timestamp"     : time.time(),
+        "python"        : platform.python_version(),
+        "platform"      : platform.platform(),
+        "results"       : results,
+    }
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+
+    if args.compare is None:
+        for result in results:
+            print _format(result)
+        return 0
+
+    with open(args.compare) as input_file:
+        baseline = json.load(input_file)
+    regressions = _compare(baseline, results, args.threshold)
+    if len(regressions) > 0:
+        print "%s regressions over %.0f%%" % (
+            len(regressions), args.threshold * 100,
+        )
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,26 @@ init for motoboto
 """
 from motoboto.s3_emulator import S3Emulator
 
-def connect_s3(config=None):
-    return S3Emulator(config)
+def connect_s3(
+    config=None, 
+    connection_pool=None, 
+    metadata_cache=None, 
+    content_cache=None,
+    retry_policy=None,
+    hedge_policy=None,
+    codec=None,
+    dedup=False,
+    read_buffer_size=None
+):
+    return S3Emulator(
+        config, 
+        connection_pool, 
+        metadata_cache, 
+        content_cache, 
+        retry_policy, 
+        hedge_policy,
+        codec,
+        dedup,
+        read_buffer_size
+    )
 
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+__main__.py
+
+python -m motoboto sync <directory> <bucket>
+"""
+import sys
+
+from motoboto.command_line import main
+
+sys.exit(main())
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+address_cache.py
+
+class AddressCache
+
+remember what hostnames resolve to, for a while
+"""
+import socket
+import threading
+import time
+
+_default_ttl = 60.0
+
+class AddressCache(object):
+    """
+    remember what each (hostname, port) resolves to for ttl seconds,
+    so opening a connection does not wait on DNS each time.
+
+    Thread safe. Call invalidate when no cached address answers,
+    and the next resolve asks DNS again.
+    """
+    def __init__(self, ttl=_default_ttl):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = dict()
+
+    def resolve(self, hostname, port):
+        """
+        return a list of (address, port) to try, in the order
+        getaddrinfo gave them
+        """
+        cache_key = (hostname, port, )
+        with self._lock:
+            entry = self._entries.get(cache_key)
+        if entry is not None:
+            expires, addresses = entry
+            if time.time() < expires:
+                return addresses
+
+        addresses = [
+            sockaddr[:2] for _, _, _, _, sockaddr in socket.getaddrinfo(
+                hostname, port, 0, socket.SOCK_STREAM
+            )
+        ]
+        with self._lock:
+            self._entries[cache_key] = (time.time() + self._ttl, addresses, )
+        return addresses
+
+    def invalidate(self, hostname, port):
+        with self._lock:
+            self._entries.pop((hostname, port, ), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
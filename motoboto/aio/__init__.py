@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+init for motoboto.aio
+
+an event loop client mirroring S3Emulator, Bucket and Key.
+needs trollius, the port of asyncio to python 2
+"""
+from motoboto.aio.s3_emulator import AsyncS3Emulator
+
+def connect_s3(config=None, connection_pool=None, loop=None):
+    return AsyncS3Emulator(config, connection_pool, loop)
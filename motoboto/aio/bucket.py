@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+bucket.py
+
+class AsyncBucket
+
+the methods of motoboto.s3.bucket.Bucket as coroutines
+"""
+import httplib
+import json
+import logging
+
+import trollius as asyncio
+from trollius import From, Return
+
+from lumberyard.http_util import compute_default_hostname, \
+        compute_collection_hostname, \
+        compute_uri
+
+from motoboto.aio.connection_pool import AsyncConnectionPool
+from motoboto.aio.key import AsyncKey
+from motoboto.s3.bucket_list_result_set import ResultSet
+from motoboto.s3.prefix import Prefix
+
+class AsyncBucket(object):
+    """
+    the methods of motoboto.s3.bucket.Bucket as coroutines
+    """
+    def __init__(self, config, collection_name, connection_pool=None):
+        self._log = logging.getLogger("AsyncBucket(%s)" % (
+            collection_name,
+        ))
+        self._config = config
+        self._collection_name = collection_name
+        if connection_pool is None:
+            connection_pool = AsyncConnectionPool(config)
+        self._connection_pool = connection_pool
+        self._hostname = compute_collection_hostname(collection_name)
+
+    @property
+    def name(self):
+        return self._collection_name
+
+    def acquire_http_connection(self):
+        """
+        a coroutine: yield From it for a pooled connection to our host
+        """
+        return self._connection_pool.acquire(self._hostname)
+
+    def release_http_connection(self, http_connection, response=None):
+        self._connection_pool.release(http_connection, response)
+
+    def discard_http_connection(self, http_connection):
+        self._connection_pool.discard(http_connection)
+
+    @asyncio.coroutine
+    def fetch(
+        self,
+        method,
+        uri,
+        body=None,
+        headers=None,
+        expected_status=httplib.OK,
+        hostname=None
+    ):
+        """
+        make one request on a pooled connection, return the whole body
+        """
+        if hostname is None:
+            hostname = self._hostname
+        http_connection = yield From(self._connection_pool.acquire(hostname))
+
+        self._log.info("requesting %s %s" % (method, uri, ))
+        try:
+            response = yield From(http_connection.request(
+                method,
+                uri,
+                body=body,
+                headers=headers,
+                expected_status=expected_status
+            ))
+            data = yield From(response.read())
+        except Exception:
+            self._connection_pool.discard(http_connection)
+            raise
+
+        self._connection_pool.release(http_connection, response)
+        raise Return(data)
+
+    @asyncio.coroutine
+    def get_all_keys(
+        self, prefix="", delimiter="", marker="", max_keys=1000
+    ):
+        """
+        return a ResultSet of up to max_keys AsyncKey objects (and Prefix
+        objects, with a delimiter) after marker.
+        """
+        kwargs = {"max_keys" : max_keys, }
+        if prefix:
+            kwargs["prefix"] = prefix
+        if delimiter:
+            kwargs["delimiter"] = delimiter
+        if marker:
+            kwargs["marker"] = marker
+
+        data = yield From(self.fetch("GET", compute_uri("data/", **kwargs)))
+        result = json.loads(data)
+
+        # an older server sends a plain list of every key name
+        if isinstance(result, list):
+            raise Return(ResultSet([
+                AsyncKey(bucket=self, name=name)
+                for name in result
+                if name.startswith(prefix) and name > marker
+            ]))
+
+        result_set = ResultSet(
+            is_truncated=result.get("truncated", False)
+        )
+        for key_entry in result.get("key_data", []):
+            result_set.append(AsyncKey.from_listing_entry(self, key_entry))
+        for prefix_name in result.get("prefixes", []):
+            result_set.append(Prefix(bucket=self, name=prefix_name))
+
+        if result_set.is_truncated and len(result_set) > 0:
+            result_set.next_marker = max([item.name for item in result_set])
+
+        raise Return(result_set)
+
+    def get_key(self, name):
+        """return a key object for the name"""
+        return AsyncKey(bucket=self, name=name)
+
+    @asyncio.coroutine
+    def get_space_used(self):
+        """
+        get disk space statistics for this bucket
+        """
+        uri = compute_uri(
+            "/".join([
+                "customers",
+                self._config.user_name,
+                "collections",
+                self._collection_name
+            ]),
+            action="space_usage"
+        )
+        data = yield From(
+            self.fetch("GET", uri, hostname=compute_default_hostname())
+        )
+        raise Return(json.loads(data))
+
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+connection_pool.py
+
+class AsyncConnectionPool
+
+a pool of keep-alive AsyncHTTPConnections, one idle list per host
+"""
+import logging
+import time
+
+import trollius as asyncio
+from trollius import From, Return
+
+from motoboto.aio.http_connection import AsyncHTTPConnection
+
+_default_max_size = 32
+_default_max_active = 8
+_default_idle_timeout = 60.0
+
+class AsyncConnectionPool(object):
+    """
+    a pool of keep-alive AsyncHTTPConnections, one idle list per host.
+
+    It belongs to one event loop, so it needs no locks.
+
+    max_size        the most idle connections we keep for any one host
+    max_active      the most connections to any one host in use at once:
+                    acquire waits for one to come back rather than open
+                    another, so many coroutines share a few sockets
+    idle_timeout    seconds an idle connection may sit in the pool
+    connection_factory
+                    callable(hostname) returning a new AsyncHTTPConnection
+    """
+    def __init__(
+        self,
+        config,
+        max_size=_default_max_size,
+        max_active=_default_max_active,
+        idle_timeout=_default_idle_timeout,
+        connection_factory=None,
+        loop=None
+    ):
+        self._log = logging.getLogger("AsyncConnectionPool")
+        self._config = config
+        self._max_size = max_size
+        self._max_active = max_active
+        self._idle_timeout = idle_timeout
+        self._loop = loop
+        if connection_factory is None:
+            self._connection_factory = self._create_http_connection
+        else:
+            self._connection_factory = connection_factory
+
+        self._idle_connections = dict()
+        # connection -> hostname, for each connection handed out
+        self._active_connections = dict()
+        # hostname -> Semaphore of max_active
+        self._semaphores = dict()
+        self._closed = False
+
+    def _create_http_connection(self, hostname):
+        return AsyncHTTPConnection(hostname, self._config, loop=self._loop)
+
+    @asyncio.coroutine
+    def acquire(self, hostname):
+        """
+        return a connection to hostname, reusing an idle one if we can,
+        once fewer than max_active are in use.
+        It connects lazily, on its first request.
+        """
+        if self._closed:
+            raise ValueError("connection pool is closed")
+
+        semaphore = self._semaphores.get(hostname)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._max_active, loop=self._loop)
+            self._semaphores[hostname] = semaphore
+        yield From(semaphore.acquire())
+        if self._closed:
+            semaphore.release()
+            raise ValueError("connection pool is closed")
+
+        http_connection = None
+        idle_list = self._idle_connections.get(hostname, [])
+        while len(idle_list) > 0:
+            candidate, idle_since = idle_list.pop()
+            if time.time() - idle_since <= self._idle_timeout \
+            and candidate.is_connected:
+                http_connection = candidate
+                break
+            candidate.close()
+
+        if http_connection is None:
+            try:
+                http_connection = self._connection_factory(hostname)
+            except Exception:
+                semaphore.release()
+                raise
+
+        self._active_connections[http_connection] = hostname
+        raise Return(http_connection)
+
+    def _end_active(self, http_connection):
+        """
+        the caller is done with http_connection: let another have its place
+        """
+        hostname = self._active_connections.pop(http_connection, None)
+        if hostname is not None:
+            self._semaphores[hostname].release()
+
+    def release(self, http_connection, response=None):
+        """
+        return a connection to the pool. If the response was not read to
+        the end, or the server will close, we close it instead.
+        """
+        self._end_active(http_connection)
+        if self._closed or (response is not None and (
+            not response.complete or response.will_close
+        )):
+            http_connection.close()
+            return
+
+        idle_list = self._idle_connections.setdefault(
+            http_connection.hostname, []
+        )
+        if len(idle_list) >= self._max_size:
+            http_connection.close()
+            return
+        idle_list.append((http_connection, time.time(), ))
+
+    def discard(self, http_connection):
+        """
+        close a connection that is not safe to reuse
+        """
+        self._end_active(http_connection)
+        http_connection.close()
+
+    def close(self):
+        """
+        close every connection we hold, idle or active
+        """
+        self._closed = True
+        connections = list(self._active_connections.keys())
+        for idle_list in self._idle_connections.values():
+            connections.extend([c for c, _ in idle_list])
+        # wake any acquire still waiting, to raise ValueError
+        for http_connection in list(self._active_connections.keys()):
+            self._end_active(http_connection)
+        self._idle_connections.clear()
+
+        self._log.debug("closing %s connections" % (len(connections), ))
+        for http_connection in connections:
+            http_connection.close()
+
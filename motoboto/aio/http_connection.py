@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+http_connection.py
+
+a non blocking keep-alive HTTP/1.1 connection for the event loop,
+signing requests the way lumberyard's HTTPConnection does
+"""
+import httplib
+import logging
+
+import trollius as asyncio
+from trollius import From, Return
+
+from lumberyard.http_connection import HTTPConnection, LumberyardHTTPError
+from lumberyard.http_util import compute_authentication_string, \
+        current_timestamp
+
+_agent = "motoboto-aio/1.0"
+_read_buffer_size = 64 * 1024
+
+# use TLS if the blocking lumberyard connection does
+_default_use_ssl = issubclass(HTTPConnection, httplib.HTTPSConnection)
+
+class AsyncHTTPError(LumberyardHTTPError):
+    """
+    an unexpected HTTP status, caught by 'except LumberyardHTTPError'
+    just like the blocking client's errors
+    """
+    def __init__(self, status, reason, body=""):
+        Exception.__init__(self, status, reason)
+        self.status = status
+        self.reason = reason
+        self.body = body
+
+    def __str__(self):
+        return "%s %s" % (self.status, self.reason, )
+
+class AsyncHTTPResponse(object):
+    """
+    the status and headers of a response; the body is read with read()
+    """
+    def __init__(self, method, status, reason, headers, reader):
+        self.status = status
+        self.reason = reason
+        self._headers = headers
+        self._reader = reader
+        self._chunked = False
+        self._chunk_left = 0
+        self._length = None
+        self._until_close = False
+
+        if method == "HEAD" or status in [204, 304, ] or 100 <= status < 200:
+            self._length = 0
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            self._chunked = True
+        elif "content-length" in headers:
+            self._length = int(headers["content-length"])
+        else:
+            self._until_close = True
+
+        self.will_close = self._until_close \
+                or headers.get("connection", "").lower() == "close"
+        self.complete = self._length == 0
+
+    def getheader(self, name, default=None):
+        return self._headers.get(name.lower(), default)
+
+    def getheaders(self):
+        return self._headers.items()
+
+    @asyncio.coroutine
+    def read(self, amt=None):
+        """
+        read up to amt bytes of the body (all of it if amt is None),
+        return "" at the end
+        """
+        if self.complete:
+            raise Return("")
+
+        if amt is None:
+            pieces = list()
+            while True:
+                data = yield From(self.read(_read_buffer_size))
+                if len(data) == 0:
+                    break
+                pieces.append(data)
+            raise Return("".join(pieces))
+
+        if self._chunked:
+            data = yield From(self._read_chunked(amt))
+        elif self._until_close:
+            data = yield From(self._reader.read(amt))
+            if len(data) == 0:
+                self.complete = True
+        else:
+            data = yield From(self._reader.read(min(amt, self._length)))
+            if len(data) == 0:
+                raise httplib.IncompleteRead("", self._length)
+            self._length -= len(data)
+            if self._length == 0:
+                self.complete = True
+
+        raise Return(data)
+
+    @asyncio.coroutine
+    def _read_chunked(self, amt):
+        if self._chunk_left == 0:
+            line = yield From(self._reader.readline())
+            self._chunk_left = int(line.split(";", 1)[0].strip(), 16)
+            if self._chunk_left == 0:
+                # skip any trailers
+                while True:
+                    line = yield From(self._reader.readline())
+                    if line in ["\r\n", "\n", "", ]:
+                        break
+                self.complete = True
+                raise Return("")
+
+        data = yield From(self._reader.read(min(amt, self._chunk_left)))
+        if len(data) == 0:
+            raise httplib.IncompleteRead("", self._chunk_left)
+        self._chunk_left -= len(data)
+        if self._chunk_left == 0:
+            yield From(self._reader.readline())
+        raise Return(data)
+
+class AsyncHTTPConnection(object):
+    """
+    one keep-alive connection to hostname
+
+    address     (host, port) to connect to, if not hostname itself
+    """
+    def __init__(
+        self,
+        hostname,
+        config,
+        address=None,
+        use_ssl=_default_use_ssl,
+        loop=None
+    ):
+        self._log = logging.getLogger("AsyncHTTPConnection(%s)" % (
+            hostname,
+        ))
+        self.hostname = hostname
+        self._config = config
+        self._use_ssl = use_ssl
+        if address is None:
+            address = (hostname, 443 if use_ssl else 80, )
+        self._address = address
+        self._loop = loop
+        self._reader = None
+        self._writer = None
+        self._response = None
+
+    @property
+    def is_connected(self):
+        return self._writer is not None and not self._reader.at_eof()
+
+    @asyncio.coroutine
+    def connect(self):
+        host, port = self._address
+        self._reader, self._writer = yield From(asyncio.open_connection(
+            host,
+            port,
+            ssl=self._use_ssl,
+            server_hostname=self.hostname if self._use_ssl else None,
+            loop=self._loop
+        ))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+        self._response = None
+
+    @asyncio.coroutine
+    def request(
+        self,
+        method,
+        uri,
+        body=None,
+        headers=None,
+        expected_status=httplib.OK
+    ):
+        """
+        send a request, return an AsyncHTTPResponse once the headers are in
+
+        body may be a string or a file-like object; a file is streamed,
+        chunked unless headers give its Content-Length.
+        """
+        if self._response is not None and not self._response.complete:
+            raise httplib.CannotSendRequest()
+        if self._writer is None or self._reader.at_eof():
+            self.close()
+            yield From(self.connect())
+
+        request_headers = {
+            "Host"                  : self.hostname,
+            "agent"                 : _agent,
+        }
+        timestamp = current_timestamp()
+        request_headers["Authorization"] = compute_authentication_string(
+            self._config.auth_key_id,
+            self._config.auth_key,
+            self._config.user_name,
+            method,
+            timestamp,
+            uri
+        )
+        request_headers["x-nimbus-io-timestamp"] = str(timestamp)
+        if headers is not None:
+            request_headers.update(headers)
+
+        lower_names = set([name.lower() for name in request_headers])
+        streaming = body is not None and hasattr(body, "read")
+        if body is None:
+            if method in ["POST", "PUT", ]:
+                request_headers["Content-Length"] = "0"
+        elif not streaming:
+            request_headers["Content-Length"] = str(len(body))
+        elif "content-length" not in lower_names:
+            request_headers["Transfer-Encoding"] = "chunked"
+        chunked = streaming and "content-length" not in lower_names
+
+        lines = ["%s %s HTTP/1.1" % (method, uri, )]
+        for name, value in request_headers.items():
+            lines.append("%s: %s" % (name, value, ))
+        self._writer.write("\r\n".join(lines) + "\r\n\r\n")
+
+        if streaming:
+            while True:
+                data = body.read(_read_buffer_size)
+                if len(data) == 0:
+                    break
+                if chunked:
+                    self._writer.write("%x\r\n%s\r\n" % (len(data), data, ))
+                else:
+                    self._writer.write(data)
+                yield From(self._writer.drain())
+            if chunked:
+                self._writer.write("0\r\n\r\n")
+        elif body is not None:
+            self._writer.write(body)
+        yield From(self._writer.drain())
+
+        response = yield From(self._read_response_head(method))
+        self._response = response
+
+        if response.status != expected_status:
+            error_body = yield From(response.read())
+            raise AsyncHTTPError(response.status, response.reason, error_body)
+
+        raise Return(response)
+
+    @asyncio.coroutine
+    def _read_response_head(self, method):
+        status_line = yield From(self._reader.readline())
+        if len(status_line) == 0:
+            raise httplib.BadStatusLine(status_line)
+        parts = status_line.strip().split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+            raise httplib.BadStatusLine(status_line)
+        status = int(parts[1])
+        reason = parts[2] if len(parts) > 2 else ""
+
+        headers = dict()
+        while True:
+            line = yield From(self._reader.readline())
+            if line in ["\r\n", "\n", "", ]:
+                break
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+        raise Return(
+            AsyncHTTPResponse(method, status, reason, headers, self._reader)
+        )
+
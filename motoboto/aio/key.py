@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+key.py
+
+class AsyncKey
+
+the methods of motoboto.s3.key.Key as coroutines
+"""
+import logging
+
+import trollius as asyncio
+from trollius import From, Return
+
+from lumberyard.http_connection import LumberyardHTTPError
+from lumberyard.http_util import compute_uri, meta_prefix
+from lumberyard.read_reporter import ReadReporter
+
+from motoboto.s3.archive_callback_wrapper import ArchiveCallbackWrapper
+from motoboto.s3.key_util import compute_file_size, \
+        default_read_buffer_size, expected_status, format_timestamp
+from motoboto.s3.retrieve_callback_wrapper import NullCallbackWrapper, \
+        RetrieveCallbackWrapper
+
+class AsyncKey(object):
+    """
+    the methods of motoboto.s3.key.Key as coroutines
+    """
+    def __init__(self, bucket=None, name=None):
+        self._log = logging.getLogger("AsyncKey")
+        self._bucket = bucket
+        self._name = name
+        self._size = None
+        self._etag = None
+        self._last_modified = None
+        self._metadata = dict()
+
+    def _get_name(self):
+        """key name."""
+        return self._name
+
+    def _set_name(self, value):
+        self._name = value
+
+    name = property(_get_name, _set_name)
+    key = property(_get_name, _set_name)
+
+    def _get_size(self):
+        """key size."""
+        return self._size
+
+    def _set_size(self, value):
+        self._size = value
+
+    size = property(_get_size, _set_size)
+
+    def _get_etag(self):
+        """key etag, the md5 hex digest of the contents."""
+        return self._etag
+
+    def _set_etag(self, value):
+        self._etag = value
+
+    etag = property(_get_etag, _set_etag)
+
+    def _get_last_modified(self):
+        """when the key was last written."""
+        return self._last_modified
+
+    def _set_last_modified(self, value):
+        self._last_modified = value
+
+    last_modified = property(_get_last_modified, _set_last_modified)
+
+    @classmethod
+    def from_listing_entry(cls, bucket, key_entry):
+        """
+        create an AsyncKey from one entry of a data/ listing
+        """
+        key = cls(bucket=bucket, name=key_entry["key"])
+        if "file_size" in key_entry:
+            key.size = key_entry["file_size"]
+        if "file_hash" in key_entry:
+            key.etag = key_entry["file_hash"]
+        if "timestamp" in key_entry:
+            key.last_modified = format_timestamp(key_entry["timestamp"])
+        if "meta" in key_entry:
+            key.update_metadata(key_entry["meta"])
+        return key
+
+    def _check(self):
+        if self._bucket is None:
+            raise ValueError("No bucket")
+        if self._name is None:
+            raise ValueError("No name")
+
+    @asyncio.coroutine
+    def exists(self):
+        """
+        return True if we can HEAD the key
+        """
+        self._check()
+        uri = compute_uri("data", self._name)
+        try:
+            yield From(self._bucket.fetch("HEAD", uri))
+        except LumberyardHTTPError, instance:
+            if instance.status == 404: # not found
+                raise Return(False)
+            self._log.error(str(instance))
+            raise
+        raise Return(True)
+
+    def _post_uri(self):
+        kwargs = {}
+        for meta_key, meta_value in self._metadata.items():
+            kwargs["".join([meta_prefix, meta_key])] = meta_value
+        return compute_uri("data", self._name, **kwargs)
+
+    @asyncio.coroutine
+    def set_contents_from_string(self, data, replace=True):
+        """
+        store the content of the string in the lumberyard
+        """
+        self._check()
+        if not replace:
+            exists = yield From(self.exists())
+            if exists:
+                raise KeyError("attempt to replace key %r" % (self._name))
+
+        yield From(self._bucket.fetch("POST", self._post_uri(), body=data))
+
+    @asyncio.coroutine
+    def set_contents_from_file(
+        self, file_object, replace=True, cb=None, cb_count=10
+    ):
+        """
+        stream the content of the file to lumberyard
+        """
+        self._check()
+        if not replace:
+            exists = yield From(self.exists())
+            if exists:
+                raise KeyError("attempt to replace key %r" % (self._name))
+
+        headers = None
+        size = compute_file_size(file_object)
+        if size is not None:
+            headers = {"Content-Length" : str(size)}
+
+        wrapper = None
+        if cb is None:
+            body = file_object
+        else:
+            body = ReadReporter(file_object)
+            wrapper = ArchiveCallbackWrapper(body, cb, cb_count, size)
+
+        yield From(self._bucket.fetch(
+            "POST", self._post_uri(), body=body, headers=headers
+        ))
+
+        if wrapper is not None:
+            wrapper.finish()
+
+    @asyncio.coroutine
+    def get_contents_as_string(self, headers=None):
+        """
+        return the contents from lumberyard as a string
+        """
+        self._check()
+        uri = compute_uri("data", self._name)
+        data = yield From(self._bucket.fetch(
+            "GET",
+            uri,
+            headers=headers,
+            expected_status=expected_status(headers)
+        ))
+        raise Return(data)
+
+    @asyncio.coroutine
+    def get_contents_to_file(
+        self, file_object, cb=None, cb_count=10, headers=None
+    ):
+        """
+        stream the contents from lumberyard to a file
+        """
+        self._check()
+        uri = compute_uri("data", self._name)
+
+        http_connection = yield From(self._bucket.acquire_http_connection())
+
+        self._log.info("requesting GET %s" % (uri, ))
+        try:
+            response = yield From(http_connection.request(
+                "GET",
+                uri,
+                headers=headers,
+                expected_status=expected_status(headers)
+            ))
+            if cb is None:
+                reporter = NullCallbackWrapper()
+            else:
+                size = response.getheader("content-length")
+                if size is not None:
+                    size = int(size)
+                elif headers is None:
+                    size = self.size
+                reporter = RetrieveCallbackWrapper(size, cb, cb_count)
+            reporter.start()
+            while True:
+                data = yield From(response.read(default_read_buffer_size))
+                if len(data) == 0:
+                    break
+                file_object.write(data)
+                reporter.bytes_written(len(data))
+            reporter.finish()
+        except Exception:
+            self._bucket.discard_http_connection(http_connection)
+            raise
+
+        self._bucket.release_http_connection(http_connection, response)
+
+    @asyncio.coroutine
+    def delete(self):
+        """
+        delete this key from the system
+        """
+        self._check()
+        uri = compute_uri("data", self._name)
+        yield From(self._bucket.fetch("DELETE", uri))
+
+    def set_metadata(self, meta_key, meta_value):
+        self._metadata[meta_key] = meta_value
+
+    def update_metadata(self, meta_dict):
+        self._metadata.update(meta_dict)
+
+    @asyncio.coroutine
+    def get_metadata(self, meta_key):
+        # If we have it local, pass it on
+        if meta_key in self._metadata:
+            raise Return(self._metadata[meta_key])
+
+        self._check()
+        kwargs = {
+            "action"            : "get_meta",
+            "meta_key"          : meta_key,
+        }
+        uri = compute_uri("data", self._name, **kwargs)
+        try:
+            meta_value = yield From(self._bucket.fetch("GET", uri))
+        except LumberyardHTTPError, instance:
+            if instance.status == 404: # not found
+                raise KeyError(meta_key)
+            self._log.error(str(instance))
+            raise
+
+        self._metadata[meta_key] = meta_value
+        raise Return(meta_value)
+
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+s3_emulator.py
+
+class AsyncS3Emulator
+
+the methods of motoboto.S3Emulator as coroutines
+"""
+import json
+import logging
+
+import trollius as asyncio
+from trollius import From, Return
+
+from lumberyard.http_util import compute_default_hostname, \
+        compute_default_collection_name, \
+        compute_uri
+
+from motoboto.aio.bucket import AsyncBucket
+from motoboto.aio.connection_pool import AsyncConnectionPool
+from motoboto.config import load_config
+
+class AsyncS3Emulator(object):
+    """
+    the methods of motoboto.S3Emulator as coroutines
+
+    Every AsyncBucket and AsyncKey we hand out shares our
+    AsyncConnectionPool, so many transfers share one event loop
+    and a few keep-alive connections per host.
+    """
+    def __init__(self, config=None, connection_pool=None, loop=None):
+        self._log = logging.getLogger("AsyncS3Emulator")
+
+        if config is not None:
+            self._config = config
+        else:
+            self._config = load_config()
+
+        if connection_pool is None:
+            connection_pool = AsyncConnectionPool(self._config, loop=loop)
+        self._connection_pool = connection_pool
+
+        self._default_bucket = AsyncBucket(
+            self._config,
+            compute_default_collection_name(self._config.user_name),
+            self._connection_pool
+        )
+
+    def close(self):
+        self._log.debug("closing")
+        self._connection_pool.close()
+
+    def _collections_uri(self, *path, **kwargs):
+        return compute_uri(
+            "/".join(
+                ["customers", self._config.user_name, "collections", ] + \
+                list(path)
+            ),
+            **kwargs
+        )
+
+    @asyncio.coroutine
+    def create_bucket(self, bucket_name):
+        uri = self._collections_uri(action="create", name=bucket_name)
+        yield From(self._default_bucket.fetch(
+            "POST", uri, hostname=compute_default_hostname()
+        ))
+        raise Return(AsyncBucket(
+            self._config,
+            bucket_name.decode("utf-8"),
+            self._connection_pool
+        ))
+
+    @asyncio.coroutine
+    def get_all_buckets(self):
+        uri = self._collections_uri()
+        data = yield From(self._default_bucket.fetch(
+            "GET", uri, hostname=compute_default_hostname()
+        ))
+        collection_list = json.loads(data)
+
+        raise Return([
+            AsyncBucket(
+                self._config,
+                collection_name.decode("utf-8"),
+                self._connection_pool
+            ) for collection_name, _timestamp in collection_list
+        ])
+
+    @asyncio.coroutine
+    def delete_bucket(self, bucket_name):
+        if bucket_name.startswith("/"):
+            bucket_name = bucket_name[1:]
+        uri = self._collections_uri(bucket_name)
+        yield From(self._default_bucket.fetch(
+            "DELETE", uri, hostname=compute_default_hostname()
+        ))
+
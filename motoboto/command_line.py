@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+command_line.py
+
+the motoboto command: motoboto sync <directory> <bucket>
+"""
+import argparse
+import logging
+import sys
+
+from motoboto.config import load_config
+from motoboto.connection_pool import ConnectionPool
+from motoboto.s3.bucket import Bucket
+from motoboto.sync import sync_directory, _default_thread_count
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog="motoboto")
+    subparsers = parser.add_subparsers(dest="command")
+
+    sync_parser = subparsers.add_parser(
+        "sync", help="upload the files in a directory that have changed"
+    )
+    sync_parser.add_argument("directory")
+    sync_parser.add_argument("bucket")
+    sync_parser.add_argument(
+        "--prefix", default="", help="prepended to each key name"
+    )
+    sync_parser.add_argument(
+        "--delete", action="store_true", 
+        help="delete keys under prefix with no local file"
+    )
+    sync_parser.add_argument(
+        "--state", default=None, help="path of the local state index"
+    )
+    sync_parser.add_argument(
+        "--threads", type=int, default=_default_thread_count
+    )
+    sync_parser.add_argument(
+        "--dry-run", action="store_true", 
+        help="report what would change, change nothing"
+    )
+    sync_parser.add_argument("--verbose", action="store_true")
+
+    return parser.parse_args(argv)
+
+def _sync(args):
+    config = load_config()
+    connection_pool = ConnectionPool(config, max_size=args.threads)
+    try:
+        bucket = Bucket(config, args.bucket, connection_pool)
+        result = sync_directory(
+            bucket,
+            args.directory,
+            prefix=args.prefix,
+            delete=args.delete,
+            state_path=args.state,
+            thread_count=args.threads,
+            dry_run=args.dry_run
+        )
+    finally:
+        connection_pool.close()
+
+    verb = "would upload" if args.dry_run else "uploaded"
+    for key_name in result.uploaded:
+        print "%s %s" % (verb, key_name, )
+    verb = "would delete" if args.dry_run else "deleted"
+    for key_name in result.deleted:
+        print "%s %s" % (verb, key_name, )
+    for key_name, error in result.failures:
+        print >> sys.stderr, "failed %s %s" % (key_name, error, )
+    print result
+
+    return 1 if len(result.failures) > 0 else 0
+
+def main(argv=None):
+    """
+    run the motoboto command, return the exit status
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    args = _parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARN,
+        format="%(asctime)s %(levelname)-8s %(name)-20s: %(message)s"
+    )
+
+    if args.command == "sync":
+        return _sync(args)
+
+    return 2
@@ -65,3 +65,17 @@ def load_config_from_file(path=_config_path):
         auth_key=auth_key
     )
 
+def load_config():
+    """
+    load config from the environment, or failing that from the file
+    raise ValueError if we find neither
+    """
+    config = load_config_from_environment()
+    if config is not None:
+        return config
+
+    config = load_config_from_file()
+    if config is not None:
+        return config
+
+    raise ValueError("You must specify config in environment of file")
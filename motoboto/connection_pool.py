@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+connection_pool.py
+
+class ConnectionPool
+
+a thread safe pool of keep-alive HTTP connections, one idle list per host
+"""
+import httplib
+import logging
+import select
+import socket
+import threading
+import time
+
+from lumberyard.http_connection import HTTPConnection
+
+from motoboto.address_cache import AddressCache
+from motoboto.instrumentation import InstrumentedConnection
+
+_default_max_size = 8
+_default_idle_timeout = 60.0
+_default_address_ttl = None
+
+# we connect to a cached address with a plain socket, which would
+# skip the TLS handshake of an HTTPS connection
+_address_cache_allowed = \
+    not issubclass(HTTPConnection, httplib.HTTPSConnection)
+
+class _CachedAddressHTTPConnection(HTTPConnection):
+    """
+    a lumberyard HTTPConnection that connects to an address from an
+    AddressCache, instead of resolving its hostname every time
+
+    Only for plain HTTP: see _address_cache_allowed
+    """
+    def __init__(self, hostname, config, address_cache):
+        HTTPConnection.__init__(
+            self,
+            hostname,
+            config.user_name,
+            config.auth_key,
+            config.auth_key_id
+        )
+        self._address_cache = address_cache
+
+    def connect(self):
+        addresses = self._address_cache.resolve(self.host, self.port)
+        last_error = socket.error("no address for %s" % (self.host, ))
+        for address in addresses:
+            try:
+                self.sock = socket.create_connection(
+                    address, self.timeout, self.source_address
+                )
+                return
+            except socket.error, instance:
+                last_error = instance
+        # the addresses may be out of date: look again next time
+        self._address_cache.invalidate(self.host, self.port)
+        raise last_error
+
+class ConnectionPool(object):
+    """
+    a thread safe pool of keep-alive HTTP connections, one idle list per host
+
+    max_size        the most idle connections we keep for any one host
+    idle_timeout    seconds an idle connection may sit in the pool before
+                    we close it instead of reusing it
+    health_check    if True, test an idle socket before handing it out
+    connection_factory
+                    callable(hostname) returning a new connection,
+                    by default a lumberyard HTTPConnection
+    address_ttl     seconds the default connections remember the
+                    address a hostname resolved to, None (the default)
+                    to resolve it for every new connection. Not for
+                    HTTPS connections: we raise ValueError.
+
+    Once a RequestHook is added, connections are handed out wrapped
+    so that every request fires the hooks. See instrumentation.py
+    """
+    def __init__(
+        self,
+        config,
+        max_size=_default_max_size,
+        idle_timeout=_default_idle_timeout,
+        health_check=True,
+        connection_factory=None,
+        address_ttl=_default_address_ttl
+    ):
+        self._log = logging.getLogger("ConnectionPool")
+        self._config = config
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._health_check = health_check
+        self._address_cache = None
+        if address_ttl is not None:
+            if not _address_cache_allowed:
+                raise ValueError(
+                    "address_ttl is only for plain HTTP connections"
+                )
+            self._address_cache = AddressCache(address_ttl)
+        if connection_factory is None:
+            self._connection_factory = self._create_http_connection
+        else:
+            self._connection_factory = connection_factory
+
+        self._lock = threading.Lock()
+        self._idle_connections = dict()
+        self._active_connections = dict()
+        self._closed = False
+        # replaced, never changed in place, so acquire can read it
+        # without the lock
+        self._hooks = ()
+
+    def add_hook(self, hook):
+        """
+        call the RequestHook around every request from now on
+        """
+        with self._lock:
+            self._hooks = self._hooks + (hook, )
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self._hooks = tuple([h for h in self._hooks if h is not hook])
+
+    def _create_http_connection(self, hostname):
+        if self._address_cache is not None:
+            return _CachedAddressHTTPConnection(
+                hostname, self._config, self._address_cache
+            )
+        return HTTPConnection(
+            hostname,
+            self._config.user_name,
+            self._config.auth_key,
+            self._config.auth_key_id
+        )
+
+    def acquire(self, hostname):
+        """
+        return a connection to hostname, reusing an idle one if we can
+        """
+        stale_connections = list()
+        http_connection = None
+
+        with self._lock:
+            if self._closed:
+                raise ValueError("connection pool is closed")
+            idle_list = self._idle_connections.get(hostname, [])
+            while len(idle_list) > 0:
+                candidate, idle_since = idle_list.pop()
+                if self._is_reusable(candidate, idle_since):
+                    http_connection = candidate
+                    break
+                stale_connections.append(candidate)
+
+        for stale_connection in stale_connections:
+            self._log.debug("closing stale connection to %s" % (hostname, ))
+            stale_connection.close()
+
+        if http_connection is None:
+            http_connection = self._connection_factory(hostname)
+
+        with self._lock:
+            self._active_connections[http_connection] = hostname
+
+        hooks = self._hooks
+        if len(hooks) > 0:
+            return InstrumentedConnection(http_connection, hostname, hooks)
+        return http_connection
+
+    def release(self, http_connection):
+        """
+        return a connection to the pool for reuse
+
+        The caller must have read the whole response first.
+        """
+        if isinstance(http_connection, InstrumentedConnection):
+            http_connection.released()
+            http_connection = http_connection.wrapped_connection
+
+        with self._lock:
+            hostname = self._active_connections.pop(http_connection, None)
+            if hostname is not None and not self._closed:
+                idle_list = self._idle_connections.setdefault(hostname, [])
+                if len(idle_list) < self._max_size:
+                    idle_list.append((http_connection, time.time(), ))
+                    return
+
+        http_connection.close()
+
+    def discard(self, http_connection):
+        """
+        close a connection that is not safe to reuse
+        (an error, or a response that was not read to the end)
+        """
+        if isinstance(http_connection, InstrumentedConnection):
+            http_connection.discarded()
+            http_connection = http_connection.wrapped_connection
+
+        with self._lock:
+            self._active_connections.pop(http_connection, None)
+        http_connection.close()
+
+    def close(self):
+        """
+        close every connection we hold, idle or active
+        """
+        with self._lock:
+            self._closed = True
+            connections = list(self._active_connections.keys())
+            for idle_list in self._idle_connections.values():
+                connections.extend([c for c, _ in idle_list])
+            self._active_connections.clear()
+            self._idle_connections.clear()
+
+        self._log.debug("closing %s connections" % (len(connections), ))
+        for http_connection in connections:
+            http_connection.close()
+
+    def _is_reusable(self, http_connection, idle_since):
+        if time.time() - idle_since > self._idle_timeout:
+            return False
+
+        if not self._health_check:
+            return True
+
+        # httplib reconnects by itself if there is no socket
+        sock = getattr(http_connection, "sock", None)
+        if sock is None:
+            return True
+
+        # an idle keep-alive socket should have nothing to read.
+        # If it is readable, the server has closed it (or sent junk)
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (select.error, ValueError, ):
+            return False
+
+        return len(readable) == 0
+
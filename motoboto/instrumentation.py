@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+instrumentation.py
+
+hooks around every HTTP exchange, and a latency histogram collector
+
+Register a RequestHook with S3Emulator.add_request_hook (or
+ConnectionPool.add_hook). For each request it is called with a
+RequestEvent at:
+
+    before_request          we are about to send
+    connection_acquired     the socket is ready, new or reused
+    first_byte              the status and headers are in
+    response_complete       the body has been read to the end
+    error                   the request or the read failed
+
+With no hooks registered, the pool hands out plain connections and
+none of this code runs.
+"""
+from collections import defaultdict
+import httplib
+import logging
+import math
+import threading
+import time
+import urlparse
+
+_log = logging.getLogger("instrumentation")
+
+def compute_operation(method, uri):
+    """
+    name the kind of request, leaving out the key name:
+    "GET data", "GET data/" (a listing), "GET data?get_meta"...
+    """
+    path, _, query = uri.partition("?")
+    parts = path.strip("/").split("/", 1)
+    operation = parts[0]
+    if len(parts) == 1 or parts[1] == "":
+        operation = "".join([operation, "/"])
+    action = dict(urlparse.parse_qsl(query)).get("action")
+    if action is not None:
+        operation = "?".join([operation, action])
+    return " ".join([method, operation])
+
+class RequestEvent(object):
+    """
+    one HTTP exchange: what was asked, what came back, and when.
+
+    Times are from time.time(), None until that point is reached.
+    """
+    def __init__(self, hostname, method, uri):
+        self.hostname = hostname
+        self.method = method
+        self.uri = uri
+        self.operation = compute_operation(method, uri)
+        self.reused_connection = None
+        self.status = None
+        self.bytes_sent = None
+        self.bytes_received = 0
+        self.exception = None
+        self.start_time = time.time()
+        self.connected_time = None
+        self.first_byte_time = None
+        self.complete_time = None
+
+    @property
+    def connect_seconds(self):
+        """time to get a socket (near 0 for a reused one)"""
+        if self.connected_time is None:
+            return None
+        return self.connected_time - self.start_time
+
+    @property
+    def first_byte_seconds(self):
+        """time from a ready socket to the status and headers"""
+        if self.first_byte_time is None or self.connected_time is None:
+            return None
+        return self.first_byte_time - self.connected_time
+
+    @property
+    def transfer_seconds(self):
+        """time reading the body"""
+        if self.complete_time is None or self.first_byte_time is None:
+            return None
+        return self.complete_time - self.first_byte_time
+
+    @property
+    def total_seconds(self):
+        if self.complete_time is None:
+            return None
+        return self.complete_time - self.start_time
+
+    def __repr__(self):
+        return "<RequestEvent %s %s %s>" % (
+            self.operation, self.status, self.total_seconds,
+        )
+
+class RequestHook(object):
+    """
+    subclass this and override the points you want
+    """
+    def before_request(self, event):
+        pass
+
+    def connection_acquired(self, event):
+        pass
+
+    def first_byte(self, event):
+        pass
+
+    def response_complete(self, event):
+        pass
+
+    def error(self, event):
+        pass
+
+def _fire(hooks, point, event):
+    for hook in hooks:
+        try:
+            getattr(hook, point)(event)
+        except Exception, instance:
+            _log.exception("%s hook %r failed: %s" % (point, hook, instance))
+
+class InstrumentedResponse(object):
+    """
+    an HTTP response that counts the body as it is read and fires
+    response_complete at the end
+    """
+    def __init__(self, response, event, hooks):
+        self._response = response
+        self._event = event
+        self._hooks = hooks
+
+    def read(self, amt=None):
+        try:
+            data = self._response.read(amt)
+        except Exception, instance:
+            self._event.exception = instance
+            self._event.complete_time = time.time()
+            _fire(self._hooks, "error", self._event)
+            raise
+        self._event.bytes_received += len(data)
+        if amt is None or len(data) == 0 or self._response.isclosed():
+            self.complete()
+        return data
+
+    def complete(self):
+        if self._event.complete_time is None:
+            self._event.complete_time = time.time()
+            _fire(self._hooks, "response_complete", self._event)
+
+    def abandon(self):
+        if self._event.complete_time is None:
+            self._event.exception = IOError("response abandoned unread")
+            self._event.complete_time = time.time()
+            _fire(self._hooks, "error", self._event)
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+class InstrumentedConnection(object):
+    """
+    wrap a pooled HTTP connection so each request fires the hooks
+    """
+    def __init__(self, http_connection, hostname, hooks):
+        self.wrapped_connection = http_connection
+        self._hostname = hostname
+        self._hooks = hooks
+        self._response = None
+
+    def request(
+        self, method, uri, body=None, headers=None, expected_status=httplib.OK
+    ):
+        event = RequestEvent(self._hostname, method, uri)
+        if isinstance(body, basestring):
+            event.bytes_sent = len(body)
+        elif headers is not None and "Content-Length" in headers:
+            event.bytes_sent = int(headers["Content-Length"])
+        _fire(self._hooks, "before_request", event)
+
+        try:
+            event.reused_connection = \
+                    getattr(self.wrapped_connection, "sock", None) is not None
+            if not event.reused_connection:
+                self.wrapped_connection.connect()
+            event.connected_time = time.time()
+            _fire(self._hooks, "connection_acquired", event)
+
+            response = self.wrapped_connection.request(
+                method,
+                uri,
+                body=body,
+                headers=headers,
+                expected_status=expected_status
+            )
+        except Exception, instance:
+            event.exception = instance
+            event.status = getattr(instance, "status", None)
+            event.complete_time = time.time()
+            _fire(self._hooks, "error", event)
+            raise
+
+        event.first_byte_time = time.time()
+        event.status = response.status
+        _fire(self._hooks, "first_byte", event)
+
+        self._response = InstrumentedResponse(response, event, self._hooks)
+        return self._response
+
+    def released(self):
+        """
+        the caller has finished with the response: count it complete
+        """
+        if self._response is not None:
+            self._response.complete()
+            self._response = None
+
+    def discarded(self):
+        """
+        the connection is being closed: if the response was not read to
+        the end, that is an error
+        """
+        if self._response is not None:
+            self._response.abandon()
+            self._response = None
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped_connection, name)
+
+class LatencyHistogram(object):
+    """
+    counts of durations in log spaced buckets, each about 5% wide,
+    from 10 microseconds up. Fixed memory, O(1) to record.
+    """
+    _smallest = 1e-5
+    _ratio = 1.05
+
+    def __init__(self):
+        self._counts = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def record(self, seconds):
+        if seconds <= self._smallest:
+            index = 0
+        else:
+            index = int(math.log(seconds / self._smallest, self._ratio)) + 1
+        self._counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if self.minimum is None or seconds < self.minimum:
+            self.minimum = seconds
+        if self.maximum is None or seconds > self.maximum:
+            self.maximum = seconds
+
+    def percentile(self, percent):
+        """
+        the duration that percent of the recordings were no longer than,
+        to within a bucket, or None if nothing has been recorded
+        """
+        if self.count == 0:
+            return None
+        rank = max(int(math.ceil(self.count * percent / 100.0)), 1)
+        seen = 0
+        for index in sorted(self._counts.keys()):
+            seen += self._counts[index]
+            if seen >= rank:
+                upper_bound = self._smallest * (self._ratio ** index)
+                return min(max(upper_bound, self.minimum), self.maximum)
+        return self.maximum
+
+class HistogramCollector(RequestHook):
+    """
+    a RequestHook that keeps a LatencyHistogram of each phase of each
+    operation ("GET data", "POST data"...) in memory.
+
+    phases are "total", "connect", "first_byte" and "transfer"
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = defaultdict(LatencyHistogram)
+        self._error_counts = defaultdict(int)
+        self._bytes_sent = defaultdict(int)
+        self._bytes_received = defaultdict(int)
+
+    def response_complete(self, event):
+        with self._lock:
+            for phase, seconds in [
+                ("total", event.total_seconds, ),
+                ("connect", event.connect_seconds, ),
+                ("first_byte", event.first_byte_seconds, ),
+                ("transfer", event.transfer_seconds, ),
+            ]:
+                if seconds is not None:
+                    self._histograms[(event.operation, phase, )].record(
+                        seconds
+                    )
+            self._bytes_sent[event.operation] += event.bytes_sent or 0
+            self._bytes_received[event.operation] += event.bytes_received
+
+    def error(self, event):
+        with self._lock:
+            self._error_counts[event.operation] += 1
+
+    def count(self, operation, phase="total"):
+        """
+        the number of timings of the phase of operation we have
+        """
+        with self._lock:
+            histogram = self._histograms.get((operation, phase, ))
+            if histogram is None:
+                return 0
+            return histogram.count
+
+    def percentile(self, operation, percent, phase="total"):
+        """
+        the percentile duration of the phase of operation, or None
+        """
+        with self._lock:
+            histogram = self._histograms.get((operation, phase, ))
+            if histogram is None:
+                return None
+            return histogram.percentile(percent)
+
+    def summary(self):
+        """
+        return {operation : {"count", "errors", "p50", "p95", "p99",
+        "bytes_sent", "bytes_received"}} for total time
+        """
+        result = dict()
+        with self._lock:
+            operations = set(self._error_counts.keys())
+            operations.update([
+                operation for operation, _ in self._histograms.keys()
+            ])
+            for operation in operations:
+                histogram = self._histograms.get(
+                    (operation, "total", ), LatencyHistogram()
+                )
+                result[operation] = {
+                    "count"             : histogram.count,
+                    "errors"            : self._error_counts[operation],
+                    "p50"               : histogram.percentile(50),
+                    "p95"               : histogram.percentile(95),
+                    "p99"               : histogram.percentile(99),
+                    "bytes_sent"        : self._bytes_sent[operation],
+                    "bytes_received"    : self._bytes_received[operation],
+                }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._error_counts.clear()
+            self._bytes_sent.clear()
+            self._bytes_received.clear()
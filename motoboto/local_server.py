@@ -0,0 +1,726 @@
+# -*- coding: utf-8 -*-
+"""
+local_server.py
+
+class LocalServer
+
+an in-process stand in for the lumberyard service: the collections,
+data/ and conjoined/ endpoints that S3Emulator, Bucket and Key use,
+so motoboto can be tested and benchmarked offline.
+
+python -m motoboto.local_server runs one in the foreground.
+"""
+import argparse
+import BaseHTTPServer
+import bisect
+import collections
+import email.utils
+import hashlib
+import itertools
+import json
+import logging
+import os
+import os.path
+import random
+import SocketServer
+import socket
+import threading
+import time
+import urllib
+import urlparse
+import uuid
+
+from lumberyard.http_connection import HTTPConnection
+from lumberyard.http_util import meta_prefix
+
+from motoboto.connection_pool import ConnectionPool
+from motoboto.s3_emulator import S3Emulator
+
+# bandwidth limits are applied a chunk at a time
+_throttle_chunk_size = 64 * 1024
+
+class _LocalHTTPConnection(HTTPConnection):
+    """
+    a lumberyard HTTPConnection that keeps the real hostname
+    (so the Host header names the collection) but connects to us
+    """
+    def __init__(self, address, hostname, config):
+        HTTPConnection.__init__(
+            self,
+            hostname,
+            config.user_name,
+            config.auth_key,
+            config.auth_key_id
+        )
+        self._local_address = address
+
+    def connect(self):
+        self.sock = socket.create_connection(self._local_address)
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # buffer the status and header lines: written one by one, Nagle and
+    # the client's delayed ACK stall each keep-alive response ~40ms.
+    # handle_one_request flushes at the end of each response
+    wbufsize = -1
+
+    def log_message(self, format_string, *args):
+        pass
+
+    def do_GET(self):
+        self.server.local_server.handle(self, "GET")
+
+    def do_HEAD(self):
+        self.server.local_server.handle(self, "HEAD")
+
+    def do_POST(self):
+        self.server.local_server.handle(self, "POST")
+
+    def do_DELETE(self):
+        self.server.local_server.handle(self, "DELETE")
+
+class _DiskCollection(collections.MutableMapping):
+    """
+    the keys of one collection, as files in a directory: maps key name
+    to (data, meta, timestamp) like the dict we use in memory.
+
+    The index (meta, timestamp, size) stays in memory, the data is read
+    from disk when asked for.
+    """
+    def __init__(self, directory):
+        self._directory = directory
+        self._index = dict()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for file_name in os.listdir(directory):
+            if not file_name.endswith(".json"):
+                continue
+            with open(os.path.join(directory, file_name)) as input_file:
+                entry = json.load(input_file)
+            self._index[entry["key"]] = entry
+
+    def _path(self, key_name, suffix):
+        if isinstance(key_name, unicode):
+            key_name = key_name.encode("utf-8")
+        return os.path.join(
+            self._directory,
+            "".join([hashlib.sha1(key_name).hexdigest(), suffix])
+        )
+
+    def __getitem__(self, key_name):
+        entry = self._index[key_name]
+        with open(self._path(key_name, ".data"), "rb") as input_file:
+            data = input_file.read()
+        return (data, entry["meta"], entry["timestamp"], )
+
+    def __setitem__(self, key_name, value):
+        data, meta, timestamp = value
+        for suffix, content in [
+            (".data", data, ),
+            (".json", json.dumps({
+                "key"       : key_name,
+                "meta"      : meta,
+                "timestamp" : timestamp,
+            }), ),
+        ]:
+            path = self._path(key_name, suffix)
+            temp_path = "%s.tmp" % (path, )
+            with open(temp_path, "wb") as output_file:
+                output_file.write(content)
+            os.rename(temp_path, path)
+        self._index[key_name] = {
+            "key"       : key_name,
+            "meta"      : meta,
+            "timestamp" : timestamp,
+        }
+
+    def __delitem__(self, key_name):
+        del self._index[key_name]
+        for suffix in [".json", ".data", ]:
+            os.unlink(self._path(key_name, suffix))
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key_name):
+        return key_name in self._index
+
+class LocalServer(object):
+    """
+    serve the collections, data/ and conjoined/ endpoints on 127.0.0.1.
+
+    A data request's collection is named by the Host header, and is
+    created when first used.
+
+    storage_path    None to keep everything in memory, or a directory
+                    (a subdirectory per collection) that survives restart
+    latency         seconds to wait before answering each request
+    bandwidth       bytes per second for request and response bodies,
+                    None for no limit
+    error_rate      the fraction of requests answered with error_status
+    seed            seed for the error_rate random numbers, so a run is
+                    reproducible
+    bulk_delete     if False, answer a bulk delete with 400 like an
+                    older server
+    port            0 for any free port
+
+    request_log is a list of (method, path) for every request we saw
+    """
+    def __init__(
+        self,
+        storage_path=None,
+        latency=0.0,
+        bandwidth=None,
+        error_rate=0.0,
+        error_status=503,
+        seed=None,
+        bulk_delete=True,
+        port=0
+    ):
+        self._log = logging.getLogger("LocalServer")
+        self._storage_path = storage_path
+        self._latency = latency
+        self._bandwidth = bandwidth
+        self._error_rate = error_rate
+        self._error_status = error_status
+        self._random = random.Random(seed)
+        self._bulk_delete = bulk_delete
+        self._lock = threading.Lock()
+        self._collections = dict()
+        self._collection_timestamps = dict()
+        self._stats = dict()
+        self._sorted_key_names = dict()
+        self._conjoined = dict()
+        self._failures = list()
+        self._delays = list()
+        self.request_log = list()
+        self._server = _ThreadingHTTPServer(
+            ("127.0.0.1", port, ), _RequestHandler
+        )
+        self._server.local_server = self
+        self._thread = None
+
+        if storage_path is not None and os.path.isdir(storage_path):
+            for collection_name in os.listdir(storage_path):
+                self._get_collection(collection_name.decode("utf-8"))
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def connection_factory(self, config):
+        """
+        return a function for ConnectionPool(connection_factory=...)
+        """
+        def _factory(hostname):
+            return _LocalHTTPConnection(self.address, hostname, config)
+        return _factory
+
+    def connect_s3(
+        self, 
+        config, 
+        retry_policy=None, 
+        hedge_policy=None, 
+        codec=None, 
+        dedup=False, 
+        read_buffer_size=None, 
+        **kwargs
+    ):
+        """
+        return an S3Emulator whose connections all come to us.
+        kwargs go to ConnectionPool (max_size, idle_timeout...)
+        """
+        connection_pool = ConnectionPool(
+            config, connection_factory=self.connection_factory(config),
+            **kwargs
+        )
+        return S3Emulator(
+            config, 
+            connection_pool, 
+            retry_policy=retry_policy, 
+            hedge_policy=hedge_policy,
+            codec=codec,
+            dedup=dedup,
+            read_buffer_size=read_buffer_size
+        )
+
+    def get_data(self, collection_name, key_name):
+        with self._lock:
+            return self._collections[collection_name][key_name][0]
+
+    def populate(self, collection_name, key_names, data=""):
+        """
+        store data under each key name directly, without HTTP,
+        to set up a big collection quickly
+        """
+        timestamp = time.time()
+        with self._lock:
+            collection = self._get_collection(collection_name)
+            for key_name in key_names:
+                collection[key_name] = (data, dict(), timestamp, )
+            self._sorted_key_names.pop(collection_name, None)
+
+    def fail_next(self, method, count=1, status=503):
+        """
+        answer the next count requests with this method with status
+        """
+        with self._lock:
+            for _ in range(count):
+                self._failures.append((method, status, ))
+
+    def delay_next(self, method, seconds, count=1):
+        """
+        hold the next count requests with this method for seconds
+        before answering, as a stall on the server would
+        """
+        with self._lock:
+            for _ in range(count):
+                self._delays.append((method, seconds, ))
+
+    def handle(self, handler, method):
+        host_collection = \
+                handler.headers["host"].split(":")[0].split(".")[0]
+        parsed = urlparse.urlparse(handler.path)
+        path = urllib.unquote(parsed.path)
+        query = dict(urlparse.parse_qsl(parsed.query, keep_blank_values=True))
+        body = self._read_body(handler)
+
+        delay = self._latency
+        with self._lock:
+            for index, (delay_method, seconds) in enumerate(self._delays):
+                if delay_method == method:
+                    del self._delays[index]
+                    delay += seconds
+                    break
+        if delay > 0.0:
+            time.sleep(delay)
+
+        with self._lock:
+            self.request_log.append((method, path, ))
+            for index, (fail_method, fail_status) in enumerate(self._failures):
+                if fail_method == method:
+                    del self._failures[index]
+                    self._send(handler, method, fail_status, "")
+                    return
+            if self._error_rate > 0.0 \
+            and self._random.random() < self._error_rate:
+                self._send(handler, method, self._error_status, "")
+                return
+
+            if path.startswith("/customers/"):
+                status, response_body = self._customers(method, path, query)
+                extra_headers = dict()
+            else:
+                collection_name = host_collection.decode("utf-8")
+                collection = self._get_collection(collection_name)
+                status, response_body = self._dispatch(
+                    collection_name, collection, method, path, query, body
+                )
+                extra_headers = _entity_headers(
+                    collection, method, path, status
+                )
+                if _not_modified(
+                    handler.headers, collection, method, path, status
+                ):
+                    status, response_body = 304, ""
+
+        range_header = handler.headers.get("range")
+        if range_header is not None and status == 200 \
+        and path.startswith("/data/") and path != "/data/":
+            status, response_body, range_headers = _apply_range(
+                range_header, response_body
+            )
+            extra_headers.update(range_headers)
+
+        self._send(handler, method, status, response_body, extra_headers)
+
+    def _get_collection(self, collection_name):
+        # hold the lock
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            if self._storage_path is None:
+                collection = dict()
+            else:
+                collection = _DiskCollection(os.path.join(
+                    self._storage_path, collection_name.encode("utf-8")
+                ))
+            self._collections[collection_name] = collection
+            self._collection_timestamps[collection_name] = time.time()
+            self._stats[collection_name] = collections.Counter()
+        return collection
+
+    def _customers(self, method, path, query):
+        """
+        /customers/<user>/collections[/<name>]
+        """
+        parts = path.strip("/").split("/")
+        if len(parts) < 3 or parts[2] != "collections":
+            return 400, ""
+
+        if len(parts) == 3 and method == "GET":
+            return 200, json.dumps([
+                [name, self._collection_timestamps[name], ]
+                for name in sorted(self._collections.keys())
+            ])
+
+        if len(parts) == 3 and method == "POST" \
+        and query.get("action") == "create":
+            collection_name = query["name"].decode("utf-8")
+            if collection_name in self._collections:
+                return 400, ""
+            self._get_collection(collection_name)
+            return 200, json.dumps({"success" : True, })
+
+        if len(parts) != 4:
+            return 400, ""
+        collection_name = parts[3].decode("utf-8")
+        if collection_name not in self._collections:
+            return 404, ""
+
+        if method == "DELETE":
+            collection = self._collections.pop(collection_name)
+            for key_name in list(collection.keys()):
+                del collection[key_name]
+            del self._collection_timestamps[collection_name]
+            del self._stats[collection_name]
+            self._sorted_key_names.pop(collection_name, None)
+            if self._storage_path is not None:
+                os.rmdir(os.path.join(
+                    self._storage_path, collection_name.encode("utf-8")
+                ))
+            return 200, json.dumps({"success" : True, })
+
+        if method == "GET" and query.get("action") == "space_usage":
+            stats = self._stats[collection_name]
+            return 200, json.dumps({
+                "success"           : True,
+                "operational_stats" : [{
+                    "timestamp"         : time.time(),
+                    "archive_success"   : stats["archive_success"],
+                    "retrieve_success"  : stats["retrieve_success"],
+                    "delete_success"    : stats["delete_success"],
+                    "listmatch_success" : stats["listmatch_success"],
+                    "success_bytes_in"  : stats["success_bytes_in"],
+                    "success_bytes_out" : stats["success_bytes_out"],
+                }],
+            })
+
+        return 400, ""
+
+    def _dispatch(self, collection_name, collection, method, path, query,
+                  body):
+        stats = self._stats[collection_name]
+
+        if path == "/data/" and method == "GET":
+            stats["listmatch_success"] += 1
+            key_names = self._sorted_key_names.get(collection_name)
+            if key_names is None:
+                key_names = sorted(collection.keys())
+                self._sorted_key_names[collection_name] = key_names
+            return 200, json.dumps(_list_keys(collection, key_names, query))
+
+        if method in ["POST", "DELETE", ]:
+            # the sorted names are kept for paging until a change
+            self._sorted_key_names.pop(collection_name, None)
+
+        if path == "/data/" and method == "POST" \
+        and query.get("action") == "delete_many" and self._bulk_delete:
+            deleted = list()
+            for key_name in json.loads(body):
+                if key_name in collection:
+                    del collection[key_name]
+                    stats["delete_success"] += 1
+                deleted.append(key_name)
+            return 200, json.dumps({"deleted" : deleted, "errors" : []})
+
+        if path.startswith("/data/") and path != "/data/":
+            status, response_body = self._data(
+                collection_name, collection, method, path[6:], query, body
+            )
+            if status == 200 and method == "POST":
+                stats["archive_success"] += 1
+                stats["success_bytes_in"] += len(body)
+            elif status == 200 and method == "GET":
+                stats["retrieve_success"] += 1
+                stats["success_bytes_out"] += len(response_body)
+            elif status == 200 and method == "DELETE":
+                stats["delete_success"] += 1
+            return status, response_body
+
+        if path == "/conjoined/" and method == "GET":
+            return 200, json.dumps([
+                {"key" : entry["key"], "conjoined_identifier" : identifier}
+                for identifier, entry in self._conjoined.items()
+                if entry["collection"] == collection_name
+            ])
+
+        if path.startswith("/conjoined/") and method == "POST":
+            return self._conjoined_action(
+                collection_name, collection, path[11:], query
+            )
+
+        return 400, ""
+
+    def _data(self, collection_name, collection, method, key_name, query,
+              body):
+        if method == "POST":
+            if "conjoined_identifier" in query:
+                entry = self._conjoined.get(query["conjoined_identifier"])
+                if entry is None or entry["collection"] != collection_name:
+                    return 404, ""
+                entry["parts"][int(query["conjoined_part"])] = body
+                return 200, ""
+            collection[key_name] = (
+                body, _meta_from_query(query), time.time(),
+            )
+            return 200, ""
+
+        if key_name not in collection:
+            return 404, ""
+
+        if method == "DELETE":
+            del collection[key_name]
+            return 200, ""
+
+        if query.get("action") == "get_meta":
+            meta = collection[key_name][1]
+            if "meta_key" not in query:
+                return 200, json.dumps(meta)
+            if query["meta_key"] not in meta:
+                return 404, ""
+            return 200, meta[query["meta_key"]]
+
+        return 200, collection[key_name][0]
+
+    def _conjoined_action(self, collection_name, collection, key_name,
+                          query):
+        action = query.get("action")
+        if action == "start":
+            identifier = uuid.uuid4().hex
+            self._conjoined[identifier] = {
+                "collection"    : collection_name,
+                "key"           : key_name,
+                "meta"          : _meta_from_query(query),
+                "parts"         : dict(),
+            }
+            return 200, json.dumps({"conjoined_identifier" : identifier})
+
+        entry = self._conjoined.pop(query.get("conjoined_identifier"), None)
+        if entry is None or entry["collection"] != collection_name:
+            return 404, ""
+
+        if action == "finish":
+            data = "".join([entry["parts"][n] for n in sorted(entry["parts"])])
+            collection[key_name] = (data, entry["meta"], time.time(), )
+        return 200, ""
+
+    def _read_body(self, handler):
+        if handler.headers.get("transfer-encoding", "") == "chunked":
+            chunks = list()
+            while True:
+                size = int(handler.rfile.readline().split(";")[0], 16)
+                if size == 0:
+                    handler.rfile.readline()
+                    break
+                chunks.append(self._throttled_read(handler.rfile, size))
+                handler.rfile.readline()
+            return "".join(chunks)
+
+        length = int(handler.headers.get("content-length", "0"))
+        return self._throttled_read(handler.rfile, length)
+
+    def _throttled_read(self, input_file, size):
+        if self._bandwidth is None:
+            return input_file.read(size)
+        chunks = list()
+        while size > 0:
+            chunk = input_file.read(min(size, _throttle_chunk_size))
+            if len(chunk) == 0:
+                break
+            time.sleep(float(len(chunk)) / self._bandwidth)
+            chunks.append(chunk)
+            size -= len(chunk)
+        return "".join(chunks)
+
+    def _send(self, handler, method, status, body, extra_headers=None):
+        handler.send_response(status)
+        handler.send_header("Content-Length", str(len(body)))
+        if extra_headers is not None:
+            for name, value in extra_headers.items():
+                handler.send_header(name, value)
+        handler.end_headers()
+        if method == "HEAD":
+            return
+        if self._bandwidth is None:
+            handler.wfile.write(body)
+            return
+        for offset in xrange(0, len(body), _throttle_chunk_size):
+            # socket._fileobject.write str()s what it is given, so a
+            # memoryview would go out as "<memory at ...>"
+            chunk = buffer(body, offset, _throttle_chunk_size)
+            time.sleep(float(len(chunk)) / self._bandwidth)
+            handler.wfile.write(chunk)
+            handler.wfile.flush()
+
+def _meta_from_query(query):
+    return dict([
+        (key[len(meta_prefix):], value, )
+        for key, value in query.items()
+        if key.startswith(meta_prefix)
+    ])
+
+def _list_keys(collection, key_names, query):
+    """
+    a page of the listing: keys after marker that start with prefix,
+    rolled up to common prefixes by delimiter. key_names is every key
+    in the collection, sorted.
+    """
+    prefix = query.get("prefix", "")
+    delimiter = query.get("delimiter", "")
+    marker = query.get("marker", "")
+    max_keys = int(query.get("max_keys", "1000"))
+
+    key_data = list()
+    prefixes = list()
+    truncated = False
+    start = bisect.bisect_left(key_names, prefix)
+    if marker >= prefix:
+        start = bisect.bisect_right(key_names, marker)
+    for key_name in itertools.islice(key_names, start, None):
+        if not key_name.startswith(prefix):
+            break
+        if delimiter:
+            index = key_name.find(delimiter, len(prefix))
+            if index >= 0:
+                common_prefix = key_name[:index+len(delimiter)]
+                if common_prefix <= marker or common_prefix in prefixes:
+                    continue
+                if len(key_data) + len(prefixes) >= max_keys:
+                    truncated = True
+                    break
+                prefixes.append(common_prefix)
+                continue
+        if len(key_data) + len(prefixes) >= max_keys:
+            truncated = True
+            break
+        data, meta, timestamp = collection[key_name]
+        key_data.append({
+            "key"       : key_name,
+            "file_size" : len(data),
+            "file_hash" : hashlib.md5(data).hexdigest(),
+            "timestamp" : timestamp,
+            "meta"      : meta,
+        })
+
+    return {
+        "key_data"  : key_data,
+        "prefixes"  : prefixes,
+        "truncated" : truncated,
+    }
+
+def _entity_headers(collection, method, path, status):
+    """
+    ETag and Last-Modified for a GET or HEAD of a key
+    """
+    if method not in ["GET", "HEAD", ] or status != 200 \
+    or not path.startswith("/data/") or path == "/data/" \
+    or path[6:] not in collection:
+        return dict()
+    data, _meta, timestamp = collection[path[6:]]
+    return {
+        "ETag"          : '"%s"' % (hashlib.md5(data).hexdigest(), ),
+        "Last-Modified" : email.utils.formatdate(timestamp, usegmt=True),
+    }
+
+def _not_modified(request_headers, collection, method, path, status):
+    """
+    True if a conditional GET or HEAD matches the key we hold
+    """
+    if method not in ["GET", "HEAD", ] or status != 200 \
+    or not path.startswith("/data/") or path == "/data/" \
+    or path[6:] not in collection:
+        return False
+    data, _meta, timestamp = collection[path[6:]]
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return if_none_match.strip('"') == hashlib.md5(data).hexdigest()
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is not None:
+        since = email.utils.parsedate_tz(if_modified_since)
+        return since is not None \
+           and int(timestamp) <= email.utils.mktime_tz(since)
+
+    return False
+
+def _apply_range(range_header, data):
+    """
+    answer a single "bytes=first-last", "bytes=first-" or "bytes=-suffix"
+    """
+    first, last = range_header.split("=", 1)[1].split("-", 1)
+    if first == "":
+        first = max(len(data) - int(last), 0)
+        last = len(data) - 1
+    else:
+        first = int(first)
+        last = len(data) - 1 if last == "" else min(int(last), len(data) - 1)
+
+    if first >= len(data) or first > last:
+        return 416, "", {"Content-Range" : "bytes */%d" % (len(data), )}
+
+    return 206, data[first:last+1], {
+        "Content-Range" : "bytes %d-%d/%d" % (first, last, len(data), )
+    }
+
+def main():
+    """
+    run a LocalServer in the foreground until interrupted
+    """
+    parser = argparse.ArgumentParser(prog="motoboto.local_server")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--storage-path", default=None)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=int, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    local_server = LocalServer(
+        storage_path=args.storage_path,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        port=args.port
+    )
+    local_server.start()
+    logging.getLogger("main").info("serving on %s:%s" % local_server.address)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    local_server.stop()
+
+if __name__ == "__main__":
+    main()
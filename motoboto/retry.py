@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+retry.py
+
+retry idempotent requests with jittered exponential backoff, under a
+retry budget, and optionally hedge slow reads with a second request
+"""
+import httplib
+import logging
+import Queue
+import random
+import sys
+import threading
+import time
+
+from lumberyard.http_connection import LumberyardHTTPError
+
+from motoboto.instrumentation import compute_operation
+
+_default_max_attempts = 3
+_default_base_delay = 0.1
+_default_max_delay = 10.0
+_default_budget_ratio = 0.1
+_default_budget_reserve = 10.0
+_default_hedge_percent = 95
+_default_hedge_min_samples = 50
+_default_hedge_min_delay = 0.001
+_default_hedge_max_size = 1024 * 1024
+
+def is_retryable(instance):
+    """
+    True for an error worth another try: a 5xx from the server,
+    or a broken connection
+    """
+    if isinstance(instance, LumberyardHTTPError):
+        return instance.status >= 500
+    return isinstance(instance, (IOError, httplib.HTTPException, ))
+
+class RetryBudget(object):
+    """
+    a limit on retries across many requests, so a server in trouble
+    does not get several times its normal load.
+
+    Each request adds ratio to the balance (up to reserve), each retry
+    takes 1 from it: over time retries are at most ratio of requests,
+    plus reserve in a burst.
+    """
+    def __init__(
+        self, ratio=_default_budget_ratio, reserve=_default_budget_reserve
+    ):
+        self._lock = threading.Lock()
+        self._ratio = ratio
+        self._reserve = reserve
+        self._balance = reserve
+
+    def deposit(self):
+        with self._lock:
+            self._balance = min(self._balance + self._ratio, self._reserve)
+
+    def withdraw(self):
+        """
+        return True if there is a retry left to spend, and spend it
+        """
+        with self._lock:
+            if self._balance < 1.0:
+                return False
+            self._balance -= 1.0
+            return True
+
+    @property
+    def balance(self):
+        return self._balance
+
+class RetryPolicy(object):
+    """
+    how to retry an idempotent request
+
+    max_attempts    tries in all, including the first
+    base_delay      the backoff before the first retry is up to this,
+                    doubling for each retry after (full jitter)
+    max_delay       the most we wait before any one retry
+    budget          a RetryBudget, which may be shared between policies
+    """
+    def __init__(
+        self,
+        max_attempts=_default_max_attempts,
+        base_delay=_default_base_delay,
+        max_delay=_default_max_delay,
+        budget=None
+    ):
+        self._log = logging.getLogger("RetryPolicy")
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._budget = budget
+
+    @property
+    def max_attempts(self):
+        return self._max_attempts
+
+    def should_retry(self, instance, attempt_count):
+        """
+        after attempt_count tries, the last failing with instance:
+        return True if we should try again (spending from the budget)
+        """
+        if attempt_count >= self._max_attempts:
+            return False
+        if not is_retryable(instance):
+            return False
+        if self._budget is not None and not self._budget.withdraw():
+            self._log.warn("retry budget exhausted: not retrying %s" % (
+                instance,
+            ))
+            return False
+        return True
+
+    def compute_delay(self, attempt_count):
+        """
+        seconds to wait after attempt_count tries, chosen at random
+        so that clients which failed together do not retry together
+        """
+        ceiling = min(
+            self._max_delay, self._base_delay * (2 ** (attempt_count - 1))
+        )
+        return random.uniform(0.0, ceiling)
+
+    def backoff(self, attempt_count):
+        time.sleep(self.compute_delay(attempt_count))
+
+    def call(self, function, description=""):
+        """
+        return function(), trying again while it raises a retryable error
+        """
+        if self._budget is not None:
+            self._budget.deposit()
+        attempt_count = 0
+        while True:
+            attempt_count += 1
+            try:
+                return function()
+            except Exception, instance:
+                if not self.should_retry(instance, attempt_count):
+                    raise
+                self._log.warn("%s retry %s after %s" % (
+                    description, attempt_count, instance,
+                ))
+                self.backoff(attempt_count)
+
+class HedgePolicy(object):
+    """
+    race a slow read against a second copy of itself.
+
+    If a GET or HEAD has not finished after the percent percentile
+    of the time that operation usually takes, we send the same request
+    again on another connection and take whichever answer comes first.
+    The loser finishes in the background and its connection goes back
+    to the pool.
+
+    The percentiles come from collector, a HistogramCollector, which
+    must be registered as a request hook: S3Emulator does that for you.
+    Until an operation has min_samples timings we do not hedge it.
+
+    The percentile covers GETs of every size, so a read of contents is
+    only hedged if we know they are at most max_size bytes (see
+    accepts_size): a big body takes longer than the usual one without
+    being stalled, and a second copy would double the bandwidth.
+    """
+    def __init__(
+        self,
+        collector,
+        percent=_default_hedge_percent,
+        min_samples=_default_hedge_min_samples,
+        min_delay=_default_hedge_min_delay,
+        max_size=_default_hedge_max_size
+    ):
+        self._log = logging.getLogger("HedgePolicy")
+        self._collector = collector
+        self._percent = percent
+        self._min_samples = min_samples
+        self._min_delay = min_delay
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._hedge_count = 0
+
+    @property
+    def collector(self):
+        return self._collector
+
+    @property
+    def hedge_count(self):
+        """the number of second requests we have sent"""
+        return self._hedge_count
+
+    def accepts_size(self, size):
+        """
+        True if a read of contents of size bytes may be hedged:
+        we know the size, and it is at most max_size
+        """
+        return size is not None and size <= self._max_size
+
+    def compute_delay(self, operation):
+        """
+        seconds to wait before hedging operation, or None if we do not
+        know enough about it yet
+        """
+        if self._collector.count(operation) < self._min_samples:
+            return None
+        delay = self._collector.percentile(operation, self._percent)
+        if delay is None:
+            return None
+        return max(delay, self._min_delay)
+
+    def call(self, method, uri, function):
+        """
+        return function(), which makes one idempotent request
+        (method uri) and must be safe to run twice at once
+        """
+        delay = self.compute_delay(compute_operation(method, uri))
+        if delay is None:
+            return function()
+
+        outcomes = Queue.Queue()
+
+        def _attempt():
+            try:
+                outcomes.put((function(), None, ))
+            except Exception:
+                outcomes.put((None, sys.exc_info(), ))
+
+        _start_thread(_attempt)
+        pending = 1
+        try:
+            result, exc_info = outcomes.get(timeout=delay)
+        except Queue.Empty:
+            self._log.debug("hedging %s %s after %.6fs" % (
+                method, uri, delay,
+            ))
+            with self._lock:
+                self._hedge_count += 1
+            _start_thread(_attempt)
+            pending += 1
+            result, exc_info = outcomes.get()
+        pending -= 1
+
+        # if the first answer is an error, wait for the other one
+        if exc_info is not None and pending > 0:
+            other_result, other_exc_info = outcomes.get()
+            if other_exc_info is None:
+                return other_result
+
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return result
+
+def _start_thread(function):
+    thread = threading.Thread(target=function)
+    thread.daemon = True
+    thread.start()
@@ -6,22 +6,24 @@ class ArchiveCallbackWrapper
 
 wrap a boto style callback for progress reporting
 """
-
+from motoboto.s3.callback_throttle import CallbackThrottle
 
 class ArchiveCallbackWrapper(object):
     """
     wrap a boto style callback for progress reporting
+
+    The reader calls us on every read; the user's callback is called
+    at most cb_count times, evenly spaced over total_size, plus once
+    at finish() if the last call did not report the end.
     """
-    def __init__(self, reader, cb, cb_count):
+    def __init__(self, reader, cb, cb_count, total_size=None):
         self._reader = reader
         self._reader.set_callback(self._internal_callback)
-        self._external_callback = cb
-        self._callback_count = cb_count
-
-        self._total_bytes_read = 0
+        self._throttle = CallbackThrottle(cb, total_size, cb_count)
 
     def _internal_callback(self, bytes_read):
-        self._total_bytes_read += bytes_read
-        # TODO: use callback_count to control the callbacks
-        self._external_callback(self._total_bytes_read, 42)
+        self._throttle.add(bytes_read)
+
+    def finish(self):
+        self._throttle.finish()
 
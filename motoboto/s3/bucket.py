@@ -9,65 +9,428 @@ import logging
 
 from lumberyard.http_util import compute_default_hostname, \
         compute_collection_hostname, \
-        compute_uri
-from lumberyard.http_connection import HTTPConnection
+        compute_uri, \
+        meta_prefix
+from lumberyard.http_connection import HTTPConnection, LumberyardHTTPError
 
+from motoboto.connection_pool import ConnectionPool
+from motoboto.s3.bucket_list_result_set import BucketListResultSet, \
+        ResultSet
+from motoboto.s3.codec import get_codec
 from motoboto.s3.key import Key
+from motoboto.s3.multi_delete import Deleted, Error, MultiDeleteResult
+from motoboto.s3.multipart_upload import MultiPartUpload
+from motoboto.s3.prefix import Prefix
+from motoboto.s3.read_size import validate_read_buffer_size
+from motoboto.s3.transfer_manager import TransferManager
+from motoboto.worker_pool import run_jobs
+
+# boto sends at most 1000 keys in one multi-object delete
+_delete_batch_size = 1000
+_delete_thread_count = 8
+
+# a server without bulk delete answers one of these
+_bulk_delete_unsupported = set([400, 404, 405, 501, ])
 
 class Bucket(object):
     """
     simulate a boto Bucket object
+
+    Pass a MetadataCache as metadata_cache to keep key metadata between
+    requests, and a ContentCache as content_cache to keep key contents 
+    on local disk; writes and deletes through this bucket invalidate them.
+
+    Pass a RetryPolicy as retry_policy to retry idempotent requests
+    (GET, HEAD, DELETE and listings) that fail with a server or socket
+    error, and a HedgePolicy as hedge_policy to race slow reads
+    against a second request.
+
+    Pass a codec name ("zlib", "gzip", "bz2" or "lzma") as codec to
+    compress what our keys write, and to have them look up (and undo)
+    the compression of what they read. Pass dedup=True to have
+    set_contents_from_file store content defined chunks once each, 
+    under a manifest (see dedup.py), and to have reads look for one.
+    read_buffer_size sets how our keys read response bodies: a number
+    of bytes, or "adaptive" (see read_size.py).
     """
-    def __init__(self, config, collection_name):
+    def __init__(
+        self, 
+        config, 
+        collection_name, 
+        connection_pool=None, 
+        metadata_cache=None,
+        content_cache=None,
+        retry_policy=None,
+        hedge_policy=None,
+        codec=None,
+        dedup=False,
+        read_buffer_size=None
+    ):
         self._log = logging.getLogger("Bucket(%s)" % (collection_name, ))
         self._config = config
         self._collection_name = collection_name
+        if connection_pool is None:
+            connection_pool = ConnectionPool(config)
+        self._connection_pool = connection_pool
+        self._metadata_cache = metadata_cache
+        self._content_cache = content_cache
+        self._retry_policy = retry_policy
+        self._hedge_policy = hedge_policy
+        if codec is not None:
+            codec = get_codec(codec).name
+        self._codec = codec
+        self._dedup = dedup
+        self._read_buffer_size = validate_read_buffer_size(read_buffer_size)
+        self._hostname = compute_collection_hostname(collection_name)
+        self._bulk_delete_supported = None
 
     @property
     def name(self):
         return self._collection_name
 
-    def get_all_keys(self):
-        """return a list of all keys in this bucket"""
-        method = "GET"
+    @property
+    def metadata_cache(self):
+        """the MetadataCache our keys share, or None"""
+        return self._metadata_cache
 
-        http_connection = self.create_http_connection()
+    @property
+    def content_cache(self):
+        """the ContentCache our keys read through, or None"""
+        return self._content_cache
+
+    @property
+    def retry_policy(self):
+        """the RetryPolicy for our idempotent requests, or None"""
+        return self._retry_policy
 
-        uri = compute_uri("data/")
+    @property
+    def hedge_policy(self):
+        """the HedgePolicy for our reads, or None"""
+        return self._hedge_policy
+
+    @property
+    def codec(self):
+        """the name of the codec our keys compress with, or None"""
+        return self._codec
+
+    @property
+    def dedup(self):
+        """True if our keys store files deduplicated"""
+        return self._dedup
+
+    @property
+    def read_buffer_size(self):
+        """
+        how our keys read response bodies, unless told otherwise:
+        None (the default size), a number of bytes, or "adaptive"
+        """
+        return self._read_buffer_size
+
+    def run_idempotent(self, function, method, uri, hedge=False):
+        """
+        return function(), which makes one idempotent request (method
+        uri), under our retry policy. With hedge, and a hedge policy,
+        function must be safe to run twice at once.
+        """
+        if hedge and self._hedge_policy is not None:
+            attempt = lambda: self._hedge_policy.call(method, uri, function)
+        else:
+            attempt = function
+        if self._retry_policy is None:
+            return attempt()
+        return self._retry_policy.call(attempt, " ".join([method, uri]))
+
+    def invalidate_cache(self, key_name):
+        """
+        drop any cached metadata or contents for the key, 
+        after a write or delete
+        """
+        if self._metadata_cache is not None:
+            self._metadata_cache.invalidate(self._collection_name, key_name)
+        if self._content_cache is not None:
+            self._content_cache.invalidate(self._collection_name, key_name)
 
-        response = http_connection.request(method, uri)
+    def list(self, prefix="", delimiter="", marker=""):
+        """
+        return an iterable over every key (and, with a delimiter, every
+        Prefix) in this bucket, in name order after marker. 
+
+        Keys are fetched a page at a time, as the caller consumes them.
+        """
+        return BucketListResultSet(
+            self, prefix=prefix, delimiter=delimiter, marker=marker
+        )
+
+    def get_all_keys(
+        self, prefix="", delimiter="", marker="", max_keys=1000
+    ):
+        """
+        return a ResultSet of up to max_keys Key objects (and Prefix 
+        objects, with a delimiter) after marker. 
         
-        data = response.read()
-        http_connection.close()
-        data_list = json.loads(data)
-        return [Key(bucket=self, name=n) for n in data_list]
+        If result_set.is_truncated is True, pass result_set.next_marker 
+        as marker for the next page; or let list() do that for you.
+        """
+        method = "GET"
+
+        kwargs = {"max_keys" : max_keys, }
+        if prefix:
+            kwargs["prefix"] = prefix
+        if delimiter:
+            kwargs["delimiter"] = delimiter
+        if marker:
+            kwargs["marker"] = marker
+
+        uri = compute_uri("data/", **kwargs)
+
+        result = json.loads(self.run_idempotent(
+            lambda: self.read_response(method, uri), method, uri
+        ))
+
+        # an older server sends a plain list of every key name
+        if isinstance(result, list):
+            return ResultSet([
+                Key(bucket=self, name=name) 
+                for name in result 
+                if name.startswith(prefix) and name > marker
+            ])
+
+        result_set = ResultSet(
+            is_truncated=result.get("truncated", False)
+        )
+        for key_entry in result.get("key_data", []):
+            result_set.append(Key.from_listing_entry(self, key_entry))
+        for prefix_name in result.get("prefixes", []):
+            result_set.append(Prefix(bucket=self, name=prefix_name))
+
+        if result_set.is_truncated and len(result_set) > 0:
+            result_set.next_marker = max([item.name for item in result_set])
+
+        return result_set
     
     def get_key(self, name):
         """return a key object for the name"""
         return Key(bucket=self, name=name)
     
+    def delete_key(self, key_name):
+        """delete one key"""
+        Key(bucket=self, name=key_name).delete()
+
+    def delete_keys(
+        self, keys, quiet=True, thread_count=_delete_thread_count
+    ):
+        """
+        delete many keys (Key objects or names), return a MultiDeleteResult.
+
+        Names go to the server in bulk requests of up to 1000. If the
+        server does not support that, we send one DELETE per key on
+        thread_count pooled connections. A key that is already gone
+        counts as deleted. With quiet, only errors are reported.
+        """
+        result = MultiDeleteResult(bucket=self)
+        key_names = list()
+        for key in keys:
+            if isinstance(key, Key):
+                key = key.name
+            key_names.append(key)
+            if len(key_names) >= _delete_batch_size:
+                self._delete_batch(key_names, quiet, thread_count, result)
+                key_names = list()
+
+        if len(key_names) > 0:
+            self._delete_batch(key_names, quiet, thread_count, result)
+
+        return result
+
+    def _delete_batch(self, key_names, quiet, thread_count, result):
+        if self._bulk_delete_supported is not False:
+            try:
+                self._delete_bulk(key_names, quiet, result)
+            except LumberyardHTTPError, instance:
+                if self._bulk_delete_supported \
+                or instance.status not in _bulk_delete_unsupported:
+                    raise
+                self._log.info("no bulk delete (%s) using DELETE per key" % (
+                    instance.status, 
+                ))
+                self._bulk_delete_supported = False
+            else:
+                self._bulk_delete_supported = True
+                return
+
+        self._delete_each(key_names, quiet, thread_count, result)
+
+    def _delete_bulk(self, key_names, quiet, result):
+        method = "POST"
+        uri = compute_uri("data/", action="delete_many")
+
+        http_connection = self.acquire_http_connection()
+
+        self._log.info("requesting POST %s (%s keys)" % (uri, len(key_names)))
+        try:
+            response = http_connection.request(
+                method, uri, body=json.dumps(key_names)
+            )
+            data = response.read()
+        except Exception:
+            self.discard_http_connection(http_connection)
+            raise
+        self.release_http_connection(http_connection)
+
+        for key_name in key_names:
+            self.invalidate_cache(key_name)
+
+        result_dict = json.loads(data)
+        if not quiet:
+            for key_name in result_dict.get("deleted", []):
+                result.deleted.append(Deleted(key=key_name))
+        for error_entry in result_dict.get("errors", []):
+            result.errors.append(Error(
+                key=error_entry["key"],
+                code=error_entry.get("status"),
+                message=error_entry.get("message")
+            ))
+
+    def _delete_each(self, key_names, quiet, thread_count, result):
+        def _delete(key_name):
+            try:
+                self.delete_key(key_name)
+            except LumberyardHTTPError, instance:
+                if instance.status != 404:
+                    raise
+
+        for job_result in run_jobs(_delete, key_names, thread_count):
+            if job_result.exception is None:
+                if not quiet:
+                    result.deleted.append(Deleted(key=job_result.job))
+                continue
+            result.errors.append(Error(
+                key=job_result.job,
+                code=getattr(job_result.exception, "status", None),
+                message=str(job_result.exception)
+            ))
+
+    def upload_many(self, jobs, **kwargs):
+        """
+        store each (local path or file-like or bytearray, key_name) on
+        a bounded pool of threads, return a TransferSummary.
+        kwargs go to TransferManager (thread_count, retry_count, cb...)
+        """
+        return TransferManager(self, **kwargs).upload(jobs)
+
+    def download_many(self, jobs, **kwargs):
+        """
+        retrieve each (local path or file-like, key_name) on a bounded
+        pool of threads, return a TransferSummary.
+        kwargs go to TransferManager (thread_count, retry_count, cb...)
+        """
+        return TransferManager(self, **kwargs).download(jobs)
+
+    def initiate_multipart_upload(self, key_name, metadata=None):
+        """
+        start a multipart upload, return a MultiPartUpload object
+        """
+        kwargs = {"action" : "start", }
+        if metadata is not None:
+            for meta_key, meta_value in metadata.items():
+                kwargs["".join([meta_prefix, meta_key])] = meta_value
+
+        method = "POST"
+        uri = compute_uri("conjoined", key_name, **kwargs)
+
+        http_connection = self.acquire_http_connection()
+
+        self._log.info("requesting POST %s" % (uri, ))
+        try:
+            response = http_connection.request(method, uri, body=None)
+            data = response.read()
+        except Exception:
+            self.discard_http_connection(http_connection)
+            raise
+        self.release_http_connection(http_connection)
+
+        data_dict = json.loads(data)
+        return MultiPartUpload(
+            bucket=self, 
+            key_name=key_name, 
+            upload_id=data_dict["conjoined_identifier"]
+        )
+
+    def get_all_multipart_uploads(self):
+        """
+        return a list of MultiPartUpload objects for uploads in progress
+        """
+        method = "GET"
+        uri = compute_uri("conjoined/")
+
+        data_list = json.loads(self.run_idempotent(
+            lambda: self.read_response(method, uri), method, uri
+        ))
+        return [
+            MultiPartUpload(
+                bucket=self, 
+                key_name=entry["key"], 
+                upload_id=entry["conjoined_identifier"]
+            ) for entry in data_list
+        ]
+
+    def read_response(self, method, uri, hostname=None):
+        """
+        make one request on a pooled connection, return the whole body.
+        hostname defaults to our name as the host.
+        """
+        if hostname is None:
+            hostname = self._hostname
+        http_connection = self._connection_pool.acquire(hostname)
+
+        self._log.info("requesting %s %s" % (method, uri, ))
+        try:
+            response = http_connection.request(method, uri, body=None)
+            data = response.read()
+        except Exception:
+            self._connection_pool.discard(http_connection)
+            raise
+        self._connection_pool.release(http_connection)
+
+        return data
+
     def create_http_connection(self):
         """
         create an HTTP connection with our name as the host
+
+        The connection is not pooled: the caller must close it.
         """
         return HTTPConnection(
-            compute_collection_hostname(self._collection_name),
+            self._hostname,
             self._config.user_name,
             self._config.auth_key,
             self._config.auth_key_id
         )
 
+    def acquire_http_connection(self):
+        """
+        get a keep-alive HTTP connection with our name as the host
+        from the pool. Hand it back with release_http_connection,
+        or discard_http_connection if it is not safe to reuse.
+        """
+        return self._connection_pool.acquire(self._hostname)
+
+    def release_http_connection(self, http_connection):
+        """
+        return a connection to the pool, the response must be fully read
+        """
+        self._connection_pool.release(http_connection)
+
+    def discard_http_connection(self, http_connection):
+        """
+        close a connection after an error
+        """
+        self._connection_pool.discard(http_connection)
+
     def get_space_used(self):
         """
         get disk space statistics for this bucket
         """
-
-        http_connection = HTTPConnection(
-            compute_default_hostname(),
-            self._config.user_name,
-            self._config.auth_key,
-            self._config.auth_key_id
-        )
         method = "GET"
         uri = compute_uri(
             "/".join([
@@ -79,9 +442,11 @@ class Bucket(object):
             action="space_usage"
         )
 
-        response = http_connection.request(method, uri)
-        data = response.read()
-        http_connection.close()
-    
-        return json.loads(data)
+        return json.loads(self.run_idempotent(
+            lambda: self.read_response(
+                method, uri, hostname=compute_default_hostname()
+            ),
+            method,
+            uri
+        ))
 
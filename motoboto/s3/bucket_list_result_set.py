@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+bucket_list_result_set.py
+
+simulate boto's ResultSet and BucketListResultSet
+"""
+
+class ResultSet(list):
+    """
+    one page of a listing: a list of Key and Prefix objects
+
+    is_truncated    True if there is more after this page
+    next_marker     pass as marker to get the next page
+    """
+    def __init__(self, items=(), is_truncated=False, next_marker=None):
+        list.__init__(self, items)
+        self.is_truncated = is_truncated
+        self.next_marker = next_marker
+
+def bucket_lister(bucket, prefix="", delimiter="", marker="", page_size=1000):
+    """
+    generate every Key (and Prefix, with a delimiter) in the bucket,
+    fetching one page at a time as the caller consumes them
+    """
+    more_results = True
+    while more_results:
+        result_set = bucket.get_all_keys(
+            prefix=prefix, 
+            delimiter=delimiter, 
+            marker=marker, 
+            max_keys=page_size
+        )
+        for item in result_set:
+            yield item
+        more_results = result_set.is_truncated and len(result_set) > 0
+        marker = result_set.next_marker
+
+class BucketListResultSet(object):
+    """
+    an iterable over the whole listing that can be iterated more than once,
+    each iteration starting a new (lazy) listing
+    """
+    def __init__(self, bucket, prefix="", delimiter="", marker="", 
+                 page_size=1000):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.delimiter = delimiter
+        self.marker = marker
+        self.page_size = page_size
+
+    def __iter__(self):
+        return bucket_lister(
+            self.bucket, 
+            prefix=self.prefix, 
+            delimiter=self.delimiter, 
+            marker=self.marker, 
+            page_size=self.page_size
+        )
+
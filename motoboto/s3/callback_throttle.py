@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+callback_throttle.py
+
+class CallbackThrottle
+
+call a boto style progress callback at most callback_count times
+"""
+
+class CallbackThrottle(object):
+    """
+    call a boto style progress callback, cb(bytes_done, total_size),
+    at most callback_count times, evenly spaced over total_size,
+    and always once more at the end if the last call was not the end.
+
+    If we don't know total_size we call back each time the byte count
+    has at least doubled, which keeps the count down to about
+    log2 of the size.
+    """
+    def __init__(self, callback, total_size, callback_count):
+        self._callback = callback
+        self._total_size = total_size
+        self._callback_count = max(callback_count, 1)
+        self._bytes_done = 0
+        self._bytes_reported = None
+        self._next_report = self._compute_next_report()
+
+    @property
+    def bytes_done(self):
+        return self._bytes_done
+
+    def start(self):
+        self._report()
+
+    def add(self, byte_count):
+        self._bytes_done += byte_count
+        if self._bytes_done >= self._next_report:
+            self._report()
+            self._next_report = self._compute_next_report()
+
+    def finish(self):
+        if self._bytes_reported != self._bytes_done:
+            self._report()
+
+    def _report(self):
+        self._bytes_reported = self._bytes_done
+        self._callback(self._bytes_done, self._total_size)
+
+    def _compute_next_report(self):
+        if self._total_size is None:
+            return max(self._bytes_done * 2, 1)
+
+        if self._total_size == 0:
+            return 1
+
+        interval = float(self._total_size) / self._callback_count
+        intervals_done = int(self._bytes_done / interval)
+        return (intervals_done + 1) * interval
+
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+codec.py
+
+compression codecs for key contents
+
+A compressed key has its codec name in its metadata, under
+codec_meta_key, so a reader knows how to decode it.
+"""
+import bz2
+from cStringIO import StringIO
+import tempfile
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+codec_meta_key = "motoboto-codec"
+
+_read_buffer_size = 64 * 1024
+
+# compressed contents bigger than this go to a temporary file
+_spool_size = 8 * 1024 * 1024
+
+class _ZlibCodec(object):
+    def __init__(self, name, wbits, level=6):
+        self.name = name
+        self._wbits = wbits
+        self._level = level
+
+    def compressor(self):
+        return zlib.compressobj(self._level, zlib.DEFLATED, self._wbits)
+
+    def decompressor(self):
+        return zlib.decompressobj(self._wbits)
+
+class _StreamCodec(object):
+    """
+    a codec whose decompressor has no flush (bz2, lzma)
+    """
+    def __init__(self, name, compressor_class, decompressor_class):
+        self.name = name
+        self._compressor_class = compressor_class
+        self._decompressor_class = decompressor_class
+
+    def compressor(self):
+        return self._compressor_class()
+
+    def decompressor(self):
+        return _FlushingDecompressor(self._decompressor_class())
+
+class _FlushingDecompressor(object):
+    def __init__(self, decompressor):
+        self._decompressor = decompressor
+
+    def decompress(self, data):
+        return self._decompressor.decompress(data)
+
+    def flush(self):
+        return ""
+
+_codecs = {
+    "zlib"          : _ZlibCodec("zlib", zlib.MAX_WBITS),
+    "gzip"          : _ZlibCodec("gzip", 16 + zlib.MAX_WBITS),
+    "bz2"           : _StreamCodec("bz2", bz2.BZ2Compressor,
+                                   bz2.BZ2Decompressor),
+}
+if lzma is not None:
+    _codecs["lzma"] = _StreamCodec(
+        "lzma", lzma.LZMACompressor, lzma.LZMADecompressor
+    )
+
+def get_codec(name):
+    """
+    return the codec called name, raise ValueError if we have none
+    """
+    try:
+        return _codecs[name]
+    except KeyError:
+        raise ValueError("unknown codec %r, we have %s" % (
+            name, sorted(_codecs.keys()),
+        ))
+
+def compress_string(codec, data):
+    compressor = codec.compressor()
+    return "".join([compressor.compress(data), compressor.flush()])
+
+def decompress_string(codec, data):
+    decompressor = codec.decompressor()
+    return "".join([decompressor.decompress(data), decompressor.flush()])
+
+def compress_file(codec, file_object, buffer_size=_read_buffer_size):
+    """
+    compress the rest of file_object, return a new file object
+    positioned at the start of the compressed data: in memory if it
+    is small, otherwise a temporary file.
+
+    lumberyard needs a Content-Length, so we can't compress as we send.
+    """
+    compressor = codec.compressor()
+    chunks = list()
+    chunks_size = 0
+    output_file = None
+    while True:
+        data = file_object.read(buffer_size)
+        if len(data) == 0:
+            break
+        data = compressor.compress(data)
+        if output_file is not None:
+            output_file.write(data)
+            continue
+        chunks.append(data)
+        chunks_size += len(data)
+        if chunks_size > _spool_size:
+            output_file = tempfile.TemporaryFile()
+            for chunk in chunks:
+                output_file.write(chunk)
+            chunks = None
+
+    if output_file is None:
+        chunks.append(compressor.flush())
+        return StringIO("".join(chunks))
+
+    output_file.write(compressor.flush())
+    output_file.seek(0)
+    return output_file
+
+class DecodingWriter(object):
+    """
+    decompress data as it is written, passing the output to write
+    """
+    def __init__(self, codec, write):
+        self._decompressor = codec.decompressor()
+        self._write = write
+
+    def write(self, data):
+        decoded = self._decompressor.decompress(data)
+        if len(decoded) > 0:
+            self._write(decoded)
+
+    def finish(self):
+        decoded = self._decompressor.flush()
+        if len(decoded) > 0:
+            self._write(decoded)
+
+class StreamDecoder(object):
+    """
+    decompress a body as it is read, holding only what one chunk
+    decodes to until the caller takes it
+    """
+    def __init__(self, codec):
+        self._decompressor = codec.decompressor()
+        self._buffer = ""
+        self._offset = 0
+        self.eof = False
+
+    @property
+    def buffered(self):
+        return len(self._buffer) - self._offset
+
+    def feed(self, data):
+        decoded = self._decompressor.decompress(data)
+        if len(decoded) > 0:
+            self._buffer = "".join([self._buffer[self._offset:], decoded])
+            self._offset = 0
+
+    def finish(self):
+        decoded = self._decompressor.flush()
+        self._buffer = "".join([self._buffer[self._offset:], decoded])
+        self._offset = 0
+        self.eof = True
+
+    def take(self, size=0):
+        """
+        return up to size decoded bytes (all we have, if size is 0)
+        """
+        if size == 0:
+            size = self.buffered
+        data = self._buffer[self._offset:self._offset+size]
+        self._offset += len(data)
+        if self._offset == len(self._buffer):
+            self._buffer = ""
+            self._offset = 0
+        return data
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+content_cache.py
+
+class ContentCache
+
+a local read-through disk cache of key contents, with LRU eviction
+"""
+from collections import namedtuple, OrderedDict
+import errno
+import hashlib
+import json
+import logging
+import os
+import os.path
+import threading
+import uuid
+
+_default_max_size = 1024 * 1024 * 1024
+
+cache_entry_template = namedtuple(
+    "CacheEntry", ["path", "size", "etag", "last_modified", ]
+)
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError, instance:
+        if instance.errno != errno.ENOENT:
+            raise
+
+class ContentCacheWriter(object):
+    """
+    the contents of one key on the way into the cache.
+
+    Nothing is visible in the cache until commit.
+    """
+    def __init__(self, content_cache, entry_name, etag, last_modified):
+        self._content_cache = content_cache
+        self._entry_name = entry_name
+        self._etag = etag
+        self._last_modified = last_modified
+        self._path = content_cache._data_path(entry_name)
+        self._file = open(self._path, "wb")
+        self._size = 0
+
+    def write(self, data):
+        self._file.write(data)
+        self._size += len(data)
+
+    def commit(self):
+        """
+        make the contents visible in the cache, return a CacheEntry,
+        or None if it is too big to keep
+        """
+        self._file.close()
+        return self._content_cache._commit(
+            self._entry_name,
+            cache_entry_template(
+                path=self._path,
+                size=self._size,
+                etag=self._etag,
+                last_modified=self._last_modified
+            )
+        )
+
+    def abort(self):
+        self._file.close()
+        _remove(self._path)
+
+class ContentCache(object):
+    """
+    a local read-through disk cache of key contents, with LRU eviction.
+
+    Each key has an index file, <digest>.json, naming a data file that
+    is never rewritten. A new version goes into a new data file and the
+    index is replaced with an atomic rename, so a reader (or another
+    process) never sees a partly written entry.
+
+    Entries are validated by ETag (or Last-Modified) with a conditional
+    GET before use; see Key.get_contents_as_string.
+
+    directory   where entries live, created if need be
+    max_size    bytes of contents we keep, least recently used goes first
+    """
+    def __init__(self, directory, max_size=_default_max_size):
+        self._log = logging.getLogger("ContentCache")
+        self._directory = directory
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._load()
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def size(self):
+        """bytes of contents held"""
+        return self._size
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def lookup(self, collection_name, key_name):
+        """
+        return the CacheEntry for the key, or None
+        """
+        entry_name = _entry_name(collection_name, key_name)
+        with self._lock:
+            entry = self._entries.pop(entry_name, None)
+            if entry is None:
+                return None
+            if not os.path.exists(entry.path):
+                self._size -= entry.size
+                return None
+            # back on the end as the most recently used, and on disk
+            # for the next process to load
+            self._entries[entry_name] = entry
+            try:
+                os.utime(self._index_path(entry_name), None)
+            except OSError:
+                pass
+            return entry
+
+    def begin(self, collection_name, key_name, etag, last_modified):
+        """
+        return a ContentCacheWriter for a new version of the key
+        """
+        return ContentCacheWriter(
+            self,
+            _entry_name(collection_name, key_name),
+            etag,
+            last_modified
+        )
+
+    def invalidate(self, collection_name, key_name):
+        """
+        forget the key, after it is written or deleted
+        """
+        entry_name = _entry_name(collection_name, key_name)
+        with self._lock:
+            entry = self._entries.pop(entry_name, None)
+            if entry is not None:
+                self._size -= entry.size
+                self._remove_entry(entry_name, entry)
+
+    def clear(self):
+        with self._lock:
+            while len(self._entries) > 0:
+                entry_name, entry = self._entries.popitem(last=False)
+                self._remove_entry(entry_name, entry)
+            self._size = 0
+
+    def _commit(self, entry_name, entry):
+        if entry.size > self._max_size:
+            self._log.debug("%s bytes is too big to cache" % (entry.size, ))
+            _remove(entry.path)
+            return None
+
+        index_path = self._index_path(entry_name)
+        temp_path = "%s.%s.tmp" % (index_path, uuid.uuid4().hex, )
+        with open(temp_path, "w") as index_file:
+            json.dump({
+                "data"          : os.path.basename(entry.path),
+                "size"          : entry.size,
+                "etag"          : entry.etag,
+                "last_modified" : entry.last_modified,
+            }, index_file)
+
+        with self._lock:
+            os.rename(temp_path, index_path)
+            previous = self._entries.pop(entry_name, None)
+            if previous is not None:
+                self._size -= previous.size
+                if previous.path != entry.path:
+                    _remove(previous.path)
+            self._entries[entry_name] = entry
+            self._size += entry.size
+            self._evict()
+
+        return entry
+
+    def _evict(self):
+        # hold the lock
+        while self._size > self._max_size and len(self._entries) > 1:
+            entry_name, entry = self._entries.popitem(last=False)
+            self._log.debug("evicting %s" % (entry_name, ))
+            self._size -= entry.size
+            self._remove_entry(entry_name, entry)
+
+    def _remove_entry(self, entry_name, entry):
+        _remove(self._index_path(entry_name))
+        _remove(entry.path)
+
+    def _index_path(self, entry_name):
+        return os.path.join(self._directory, "%s.json" % (entry_name, ))
+
+    def _data_path(self, entry_name):
+        return os.path.join(
+            self._directory, "%s.%s.data" % (entry_name, uuid.uuid4().hex, )
+        )
+
+    def _load(self):
+        """
+        pick up the entries already on disk, oldest first, and
+        clear out data files that no index names
+        """
+        loaded = list()
+        data_names = set()
+        for file_name in os.listdir(self._directory):
+            path = os.path.join(self._directory, file_name)
+            if file_name.endswith(".data"):
+                data_names.add(file_name)
+                continue
+            if file_name.endswith(".tmp"):
+                _remove(path)
+                continue
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(path) as index_file:
+                    index = json.load(index_file)
+                mtime = os.path.getmtime(path)
+            except (IOError, OSError, ValueError, ), instance:
+                self._log.warn("unreadable index %s %s" % (path, instance, ))
+                _remove(path)
+                continue
+            loaded.append((mtime, file_name[:-len(".json")], index, ))
+
+        referenced = set()
+        for _mtime, entry_name, index in sorted(loaded):
+            if index["data"] not in data_names:
+                _remove(self._index_path(entry_name))
+                continue
+            referenced.add(index["data"])
+            self._entries[entry_name] = cache_entry_template(
+                path=os.path.join(self._directory, index["data"]),
+                size=index["size"],
+                etag=index["etag"],
+                last_modified=index["last_modified"]
+            )
+            self._size += index["size"]
+
+        for data_name in data_names - referenced:
+            _remove(os.path.join(self._directory, data_name))
+
+        with self._lock:
+            self._evict()
+
+def _entry_name(collection_name, key_name):
+    if isinstance(collection_name, unicode):
+        collection_name = collection_name.encode("utf-8")
+    if isinstance(key_name, unicode):
+        key_name = key_name.encode("utf-8")
+    return hashlib.sha1("\0".join([collection_name, key_name])).hexdigest()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+dedup.py
+
+content defined chunking, for deduplicated uploads.
+
+A deduplicated key holds a small JSON manifest, and has manifest_meta_key
+in its metadata. Each chunk of the contents is stored once, as its own
+key under chunk_prefix named by its sha256, however many manifests
+list it. Because chunk boundaries depend on the contents around them,
+not on offsets, a change in one place of a big file only changes the
+chunks near it.
+
+The rolling hash looks at every byte. With numpy installed it runs
+vectorized, at about 100MB/s; without, it runs in pure Python at about
+10MB/s, slower than most networks: install numpy before deduplicating
+big files.
+"""
+import hashlib
+import json
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+manifest_meta_key = "motoboto-manifest"
+chunk_prefix = ".motoboto-chunks/"
+
+_manifest_version = 1
+
+_min_chunk_size = 256 * 1024
+_average_chunk_size = 1024 * 1024
+_max_chunk_size = 4 * 1024 * 1024
+_read_buffer_size = 1024 * 1024
+
+# the gear hash covers the last 32 bytes; we only test its top bits,
+# which depend on all of them, by comparing it with a threshold
+_hash_bits = 32
+_hash_mask = (1 << _hash_bits) - 1
+_window_size = _hash_bits
+
+def _compute_gear_table():
+    """
+    256 fixed pseudo random 32 bit numbers: chunk boundaries, and so
+    chunk names, must be the same in every process and every release
+    """
+    return [
+        int(hashlib.md5(chr(n)).hexdigest()[:8], 16) for n in range(256)
+    ]
+
+_gear_table = _compute_gear_table()
+if numpy is not None:
+    _numpy_gear_table = numpy.array(_gear_table, dtype=numpy.uint32)
+
+# numpy hashes this many positions at a time, so a boundary soon after
+# min_size doesn't cost hashing all the way to max_size
+_numpy_block_size = 64 * 1024
+
+def _compute_boundary_threshold(min_size, average_size):
+    # past min_size, each byte is a boundary with probability
+    # 1 / (average_size - min_size), so chunks average average_size
+    # (a little less, where max_size cuts the longest ones short)
+    return (1 << _hash_bits) // max(average_size - min_size, 1)
+
+def _find_boundary(data, min_size, max_size, boundary_threshold):
+    """
+    return the length of the first chunk of data (a bytearray)
+    """
+    end = min(len(data), max_size)
+    if end <= min_size:
+        return end
+    if numpy is not None:
+        return _find_boundary_numpy(data, min_size, end, boundary_threshold)
+
+    gear_table = _gear_table
+    gear_hash = 0
+    for index in xrange(max(min_size - _window_size, 0), min_size):
+        gear_hash = ((gear_hash << 1) + gear_table[data[index]]) & _hash_mask
+    for index in xrange(min_size, end):
+        gear_hash = ((gear_hash << 1) + gear_table[data[index]]) & _hash_mask
+        if gear_hash < boundary_threshold:
+            return index + 1
+    return end
+
+def _find_boundary_numpy(data, start, end, boundary_threshold):
+    """
+    _find_boundary, vectorized. The hash at index i is the sum of
+    gear_table[data[i - k]] << k for k below _window_size (bits shifted
+    further fall off the top). The sum over a window of 2w is the sum
+    over the last w plus the sum over the w before, shifted by w, so
+    log2(_window_size) passes over a block hash all of it.
+    """
+    byte_array = numpy.frombuffer(data, dtype=numpy.uint8)
+    for block_start in xrange(start, end, _numpy_block_size):
+        block_end = min(block_start + _numpy_block_size, end)
+        # the window reaches back _window_size - 1 bytes before the block;
+        # before the start of data it adds nothing
+        window_start = block_start - (_window_size - 1)
+        gear_values = _numpy_gear_table[
+            byte_array[max(window_start, 0):block_end]
+        ]
+        if window_start < 0:
+            gear_values = numpy.concatenate([
+                numpy.zeros(-window_start, dtype=numpy.uint32), gear_values
+            ])
+        # each pass drops the first width values, which lack a full
+        # window, leaving block_size at the end
+        gear_hash = gear_values
+        width = 1
+        while width < _window_size:
+            gear_hash = gear_hash[width:] + numpy.left_shift(
+                gear_hash[:-width], numpy.uint32(width)
+            )
+            width *= 2
+        boundaries = numpy.flatnonzero(gear_hash < boundary_threshold)
+        if len(boundaries) > 0:
+            return block_start + int(boundaries[0]) + 1
+    return end
+
+def iter_chunks(
+    file_object,
+    min_size=_min_chunk_size,
+    average_size=_average_chunk_size,
+    max_size=_max_chunk_size
+):
+    """
+    generate the rest of file_object as content defined chunks (strings)
+    of min_size to max_size bytes, except perhaps the last
+    """
+    boundary_threshold = _compute_boundary_threshold(min_size, average_size)
+    data = bytearray()
+    eof = False
+    while True:
+        while not eof and len(data) < max_size:
+            block = file_object.read(_read_buffer_size)
+            if len(block) == 0:
+                eof = True
+            else:
+                data.extend(block)
+        if len(data) == 0:
+            return
+        chunk_size = _find_boundary(
+            data, min_size, max_size, boundary_threshold
+        )
+        yield str(data[:chunk_size])
+        del data[:chunk_size]
+
+def compute_chunk_name(digest, codec_name=None):
+    """
+    the key name of the chunk with this sha256 hex digest. A chunk
+    compressed with a codec is kept apart from the same data without.
+    """
+    if codec_name is None:
+        return "".join([chunk_prefix, digest])
+    return "".join([chunk_prefix, codec_name, "/", digest])
+
+def encode_manifest(size, codec_name, chunks):
+    """
+    chunks is a list of (sha256 hex digest, size) in order
+    """
+    return json.dumps({
+        "version"       : _manifest_version,
+        "size"          : size,
+        "codec"         : codec_name,
+        "chunks"        : [list(chunk) for chunk in chunks],
+    })
+
+def decode_manifest(data):
+    """
+    return the manifest as a dict, raise ValueError if we can't read it
+    """
+    manifest = json.loads(data)
+    if manifest.get("version") != _manifest_version:
+        raise ValueError("unknown manifest version %r" % (
+            manifest.get("version"),
+        ))
+    manifest["chunks"] = [tuple(chunk) for chunk in manifest["chunks"]]
+    return manifest
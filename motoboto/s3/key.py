@@ -4,17 +4,101 @@ key.py
 
 simulate a boto Key object
 """
+import base64
+import hashlib
+import httplib
+import json
 import logging
+import mmap
+import sys
+import time
 
 from lumberyard.http_connection import LumberyardHTTPError
 from lumberyard.http_util import compute_uri, meta_prefix
 from lumberyard.read_reporter import ReadReporter
 
 from motoboto.s3.archive_callback_wrapper import ArchiveCallbackWrapper
+from motoboto.s3.codec import DecodingWriter, StreamDecoder, \
+        codec_meta_key, compress_file, compress_string, decompress_string, \
+        get_codec
+from motoboto.s3.dedup import compute_chunk_name, decode_manifest, \
+        encode_manifest, iter_chunks, manifest_meta_key
+from motoboto.s3.key_reader import KeyReader, _default_read_ahead
+from motoboto.s3.key_util import compute_file_size, \
+        default_read_buffer_size, expected_status, format_timestamp
+from motoboto.s3.mapped_file_reader import create_mapped_file_reader
+from motoboto.s3.not_modified import NotModified
+from motoboto.s3.ranged_download import download_ranges
+from motoboto.s3.read_size import create_read_size, iter_body
 from motoboto.s3.retrieve_callback_wrapper import NullCallbackWrapper, \
         RetrieveCallbackWrapper
+from motoboto.worker_pool import run_jobs
 
-_read_buffer_size = 64 * 1024
+# set_contents_from_file switches to a parallel multipart upload
+# for files at least this big
+_default_multipart_threshold = 64 * 1024 * 1024
+_default_part_size = 8 * 1024 * 1024
+_default_thread_count = 4
+
+def _is_conditional(headers):
+    """
+    True for a GET that may be answered 304 Not Modified
+    """
+    if headers is not None:
+        for name in headers.keys():
+            if name.lower() in ["if-none-match", "if-modified-since", ]:
+                return True
+    return False
+
+def _read_body_into(response, view, read_size):
+    """
+    fill the writable memoryview from the response body, in reads of
+    read_size.size bytes, return the number of bytes read 
+    (less than len(view) at the end)
+
+    We use readinto if the response has it, otherwise each chunk is
+    copied once, into its place in view.
+    """
+    readinto = getattr(response, "readinto", None)
+    position = 0
+    while position < len(view):
+        end = min(position + read_size.size, len(view))
+        start_time = time.time()
+        if readinto is not None:
+            bytes_read = readinto(view[position:end])
+        else:
+            data = response.read(end - position)
+            bytes_read = len(data)
+            view[position:position+bytes_read] = data
+        if bytes_read == 0:
+            break
+        read_size.record(bytes_read, time.time() - start_time)
+        position += bytes_read
+    return position
+
+def compute_md5(
+    file_object, buffer_size=default_read_buffer_size, size=None
+):
+    """
+    like boto's compute_md5: return (hex_digest, base64_digest, size)
+    for up to size bytes (default: the rest) of file_object, which is
+    left where it was
+    """
+    position = file_object.tell()
+    md5 = hashlib.md5()
+    bytes_read = 0
+    while size is None or bytes_read < size:
+        read_size = buffer_size
+        if size is not None:
+            read_size = min(read_size, size - bytes_read)
+        data = file_object.read(read_size)
+        if len(data) == 0:
+            break
+        md5.update(data)
+        bytes_read += len(data)
+    file_object.seek(position)
+
+    return md5.hexdigest(), base64.b64encode(md5.digest()), bytes_read
 
 class Key(object):
     """
@@ -25,10 +109,270 @@ class Key(object):
         self._bucket = bucket
         self._name = name
         self._size = None
+        self._etag = None
+        self._last_modified = None
+        self._md5 = None
+        self._base64md5 = None
         self._metadata = dict()
+        # True once our metadata is all the server has
+        self._metadata_complete = False
+        self._http_connection = None
+        self._response = None
+        self._decoder = None
+        self._read_size = None
 
     def close(self):
+        """
+        end a streaming read. If the body was not read to the end the
+        connection is not safe to reuse, so we close it.
+        """
         self._log.debug("closing")
+        self._decoder = None
+        if self._response is not None:
+            self._end_read(reusable=False)
+
+    def __iter__(self):
+        return self.iter_content()
+
+    def next(self):
+        """
+        boto style iteration: the next chunk of the contents, sized by
+        the bucket's read_buffer_size
+        """
+        if self._decoder is None or not self._decoder.eof:
+            self._begin_read()
+        data = self._read_next()
+        if len(data) == 0:
+            raise StopIteration()
+        return data
+
+    def _read_next(self):
+        """
+        read one chunk of our read size, timing it for an adaptive size
+        (a compressed body times its own reads, in _read_decoded)
+        """
+        read_size = self._read_size
+        start_time = time.time()
+        data = self.read(read_size.size)
+        if self._decoder is None:
+            read_size.record(len(data), time.time() - start_time)
+        return data
+
+    def read(self, size=0):
+        """
+        boto style streaming read: up to size bytes of the contents 
+        (all the rest if size is 0). At the end we return "" and the
+        connection goes back to the pool.
+        """
+        # a compressed body may be read to the end before we have
+        # handed out all it decodes to
+        if self._decoder is not None and self._decoder.eof:
+            return self._take_decoded(size)
+
+        self._begin_read()
+        if self._decoder is not None:
+            return self._read_decoded(size)
+        try:
+            if size == 0:
+                data = self._response.read()
+            else:
+                data = self._response.read(size)
+        except Exception:
+            self._end_read(reusable=False)
+            raise
+
+        if size == 0 or len(data) == 0:
+            self._end_read(reusable=True)
+
+        return data
+
+    def iter_content(self, chunk_size=None, headers=None):
+        """
+        generate the contents in chunks of up to chunk_size bytes
+        (by default, sized by the bucket's read_buffer_size),
+        straight off the response, in constant memory.
+
+        The connection goes back to the pool when the generator is
+        exhausted. If it is closed early, the connection is closed.
+        """
+        self._begin_read(headers)
+        try:
+            while True:
+                if chunk_size is None:
+                    data = self._read_next()
+                else:
+                    data = self.read(chunk_size)
+                if len(data) == 0:
+                    break
+                yield data
+        finally:
+            self.close()
+
+    def _read_decoded(self, size):
+        try:
+            while not self._decoder.eof \
+            and (size == 0 or self._decoder.buffered < size):
+                start_time = time.time()
+                data = self._response.read(self._read_size.size)
+                if len(data) == 0:
+                    self._decoder.finish()
+                else:
+                    self._read_size.record(
+                        len(data), time.time() - start_time
+                    )
+                    self._decoder.feed(data)
+        except Exception:
+            self._decoder = None
+            self._end_read(reusable=False)
+            raise
+
+        if self._decoder.eof:
+            self._end_read(reusable=True)
+        return self._take_decoded(size)
+
+    def _take_decoded(self, size):
+        data = self._decoder.take(size)
+        if size == 0 or len(data) == 0:
+            self._decoder = None
+        return data
+
+    def _begin_read(self, headers=None):
+        if self._response is not None:
+            return
+        if self._bucket is None:
+            raise ValueError("No bucket")
+        if self._name is None:
+            raise ValueError("No name")
+
+        codec = self._get_read_codec(headers)
+        if self._is_manifest():
+            raise ValueError("%s is deduplicated, use get_contents_*" % (
+                self._name,
+            ))
+
+        # nothing has been read yet, so a failed request can be retried
+        http_connection, response = self._bucket.run_idempotent(
+            lambda: self._send_get(headers),
+            "GET",
+            compute_uri("data", self._name)
+        )
+
+        self._http_connection = http_connection
+        self._response = response
+        self._read_size = self._create_read_size(None, response)
+        if codec is not None:
+            self._decoder = StreamDecoder(codec)
+
+    def _is_small(self):
+        """
+        True if a read of our contents may be hedged: we know our size,
+        and it is small enough for the bucket's HedgePolicy
+        """
+        hedge_policy = self._bucket.hedge_policy
+        if hedge_policy is None:
+            return False
+        return hedge_policy.accepts_size(self._size)
+
+    def _get_stored_metadata(self):
+        """
+        our metadata, which says if our contents are stored compressed
+        or deduplicated. We know that from our own write, or a listing;
+        otherwise we ask the server (or the bucket's MetadataCache):
+        any key may have been written with a per call codec or dedup,
+        whatever the bucket's defaults.
+        """
+        if not self._metadata_complete \
+        and codec_meta_key not in self._metadata \
+        and manifest_meta_key not in self._metadata:
+            self.get_all_metadata()
+        return self._metadata
+
+    def _is_manifest(self):
+        return manifest_meta_key in self._get_stored_metadata()
+
+    def _get_read_codec(self, headers=None):
+        """
+        return the codec our contents were compressed with, or None
+        """
+        codec_name = self._get_stored_metadata().get(codec_meta_key)
+        if codec_name is None:
+            return None
+        if expected_status(headers) == httplib.PARTIAL_CONTENT:
+            raise ValueError("can't read a range of compressed %s" % (
+                self._name,
+            ))
+        return get_codec(codec_name)
+
+    def _compute_write_codec(self, codec_name):
+        """
+        return the codec to write with (the bucket's, if codec_name is
+        None) and record it in our metadata, or clear it from there
+        """
+        if codec_name is None:
+            codec_name = self._bucket.codec
+        if codec_name is None:
+            self._metadata.pop(codec_meta_key, None)
+            return None
+        codec = get_codec(codec_name)
+        self._metadata[codec_meta_key] = codec.name
+        return codec
+
+    def _end_read(self, reusable):
+        http_connection = self._http_connection
+        self._http_connection = None
+        self._response = None
+        if reusable:
+            self._bucket.release_http_connection(http_connection)
+        else:
+            self._bucket.discard_http_connection(http_connection)
+
+    def _send_get(self, headers):
+        """
+        GET the key on a pooled connection, return (connection, response)
+        for the caller to read and release.
+
+        We fill in etag from the response, and size and last_modified 
+        too unless it is a range. If a conditional GET (If-None-Match or 
+        If-Modified-Since) gets 304, we raise NotModified.
+        """
+        method = "GET"
+        uri = compute_uri("data", self._name)
+
+        http_connection = self._bucket.acquire_http_connection()
+
+        self._log.info("requesting GET %s" % (uri, ))
+        try:
+            response = http_connection.request(
+                method, 
+                uri, 
+                body=None, 
+                headers=headers, 
+                expected_status=expected_status(headers)
+            )
+        except LumberyardHTTPError, instance:
+            if instance.status != httplib.NOT_MODIFIED \
+            or not _is_conditional(headers):
+                self._bucket.discard_http_connection(http_connection)
+                raise
+            # a 304 has no body, so the connection is clean
+            self._bucket.release_http_connection(http_connection)
+            raise NotModified(self._name)
+        except Exception:
+            self._bucket.discard_http_connection(http_connection)
+            raise
+
+        etag = response.getheader("etag")
+        if etag is not None:
+            self._etag = etag.strip('"')
+        if expected_status(headers) == httplib.OK:
+            content_length = response.getheader("content-length")
+            if content_length is not None:
+                self._size = int(content_length)
+            last_modified = response.getheader("last-modified")
+            if last_modified is not None:
+                self._last_modified = last_modified
+
+        return http_connection, response
 
     def _get_name(self):
         """key name."""
@@ -49,12 +393,67 @@ class Key(object):
 
     size = property(_get_size, _set_size)
 
+    def _get_etag(self):
+        """key etag, the md5 hex digest of the contents."""
+        return self._etag
+
+    def _set_etag(self, value):
+        self._etag = value
+
+    etag = property(_get_etag, _set_etag)
+
+    def _get_last_modified(self):
+        """when the key was last written."""
+        return self._last_modified
+
+    def _set_last_modified(self, value):
+        self._last_modified = value
+
+    last_modified = property(_get_last_modified, _set_last_modified)
+
+    @property
+    def md5(self):
+        """hex md5 of the contents, once we have computed it"""
+        return self._md5
+
+    @property
+    def base64md5(self):
+        """base64 md5 of the contents, once we have computed it"""
+        return self._base64md5
+
+    def compute_md5(self, file_object, size=None):
+        """
+        return (hex_digest, base64_digest) for up to size bytes (default:
+        the rest) of file_object, which is left where it was
+        """
+        hex_digest, base64_digest, data_size = compute_md5(
+            file_object, size=size
+        )
+        self._size = data_size
+        return hex_digest, base64_digest
+
+    @classmethod
+    def from_listing_entry(cls, bucket, key_entry):
+        """
+        create a Key from one entry of a data/ listing, with whatever
+        size, etag, last_modified and metadata the server gave us
+        """
+        key = cls(bucket=bucket, name=key_entry["key"])
+        if "file_size" in key_entry:
+            key.size = key_entry["file_size"]
+        if "file_hash" in key_entry:
+            key.etag = key_entry["file_hash"]
+        if "timestamp" in key_entry:
+            key.last_modified = format_timestamp(key_entry["timestamp"])
+        if "meta" in key_entry:
+            key.update_metadata(key_entry["meta"])
+            key._metadata_complete = True
+        return key
+
     def exists(self):
         """
         return True if we can HEAD the key
         """  
-        found = False
-
         if self._bucket is None:
             raise ValueError("No bucket")
         if self._name is None:
@@ -62,34 +461,96 @@ class Key(object):
 
         method = "HEAD"
         uri = compute_uri("data", self._name)
-        
-        http_connection = self._bucket.create_http_connection()
+
+        return self._bucket.run_idempotent(
+            lambda: self._exists(method, uri), method, uri, hedge=True
+        )
+
+    def _exists(self, method, uri):
+        http_connection = self._bucket.acquire_http_connection()
 
         self._log.info("requesting HEAD %s" % (uri, ))
         try:
             response = http_connection.request(method, uri, body=None)
+            response.read()
         except LumberyardHTTPError, instance:
+            self._bucket.discard_http_connection(http_connection)
             if instance.status == 404: # not found
-                pass
-            else:
-                self._log.error(str(instance))
-                http_connection.close()
-                raise
-        else:
-            found = True
-        
-        if found:
+                return False
+            self._log.error(str(instance))
+            raise
+        except Exception:
+            self._bucket.discard_http_connection(http_connection)
+            raise
+            
+        self._bucket.release_http_connection(http_connection)
+
+        return True
+
+    def refresh(self):
+        """
+        fill in size, etag and last_modified with one HEAD
+        """
+        if self._bucket is None:
+            raise ValueError("No bucket")
+        if self._name is None:
+            raise ValueError("No name")
+
+        headers = self._head()
+
+        if "content-length" in headers:
+            self._size = int(headers["content-length"])
+        if "etag" in headers:
+            self._etag = headers["etag"].strip('"')
+        if "last-modified" in headers:
+            self._last_modified = headers["last-modified"]
+
+    def _head(self):
+        """
+        HEAD the key, return a dict of the response headers (lower case)
+        """
+        method = "HEAD"
+        uri = compute_uri("data", self._name)
+
+        return self._bucket.run_idempotent(
+            lambda: self._send_head(method, uri), method, uri, hedge=True
+        )
+
+    def _send_head(self, method, uri):
+        http_connection = self._bucket.acquire_http_connection()
+
+        self._log.info("requesting HEAD %s" % (uri, ))
+        try:
+            response = http_connection.request(method, uri, body=None)
             response.read()
+        except Exception:
+            self._bucket.discard_http_connection(http_connection)
+            raise
             
-        http_connection.close()
+        self._bucket.release_http_connection(http_connection)
 
-        return found
+        return dict(response.getheaders())
 
     def set_contents_from_string(
-        self, data, replace=True, cb=None, cb_count=10
+        self, 
+        data, 
+        replace=True, 
+        cb=None, 
+        cb_count=10, 
+        md5=None, 
+        skip_identical=False,
+        codec=None
     ):
         """
         store the content of the string in the lumberyard
+
+        md5 is a boto style (hex_digest, base64_digest), we compute it
+        if it is not given. With skip_identical we HEAD the key first, 
+        and send nothing if it already has these contents (and metadata).
+
+        codec ("zlib", "gzip", "bz2" or "lzma") compresses the contents,
+        by default with the bucket's codec, if it has one; md5 and size
+        are then those of the compressed contents.
         """
         if self._bucket is None:
             raise ValueError("No bucket")
@@ -102,6 +563,24 @@ class Key(object):
             if self.exists():
                 raise KeyError("attempt to replace key %r" % (self._name))
 
+        self._metadata.pop(manifest_meta_key, None)
+        write_codec = self._compute_write_codec(codec)
+        if write_codec is not None:
+            data = compress_string(write_codec, data)
+            md5 = None
+
+        self._send_string(data, md5, skip_identical)
+
+    def _send_string(self, data, md5, skip_identical):
+        if md5 is None:
+            digest = hashlib.md5(data)
+            md5 = (digest.hexdigest(), base64.b64encode(digest.digest()), )
+
+        if skip_identical and self._is_identical(md5[0]):
+            self._log.info("%s is unchanged, not sending" % (self._name, ))
+            self._set_md5(md5)
+            return
+
         kwargs = {}
         for meta_key, meta_value in self._metadata.items():
             kwargs["".join([meta_prefix, meta_key])] = meta_value
@@ -109,20 +588,61 @@ class Key(object):
         method = "POST"
         uri = compute_uri("data", self._name, **kwargs)
 
-        http_connection = self._bucket.create_http_connection()
+        http_connection = self._bucket.acquire_http_connection()
 
         self._log.info("posting %s" % (uri, ))
-        response = http_connection.request(method, uri, body=data)
-        
-        response.read()
+        try:
+            response = http_connection.request(method, uri, body=data)
+            response.read()
+        except Exception:
+            self._bucket.discard_http_connection(http_connection)
+            raise
 
-        http_connection.close()
+        self._bucket.release_http_connection(http_connection)
+        self._bucket.invalidate_cache(self._name)
+        self._metadata_complete = True
+        self._set_md5(md5)
+        self._size = len(data)
 
     def set_contents_from_file(
-        self, file_object, replace=True, cb=None, cb_count=10
+        self, 
+        file_object, 
+        replace=True, 
+        cb=None, 
+        cb_count=10,
+        multipart_threshold=_default_multipart_threshold,
+        part_size=_default_part_size,
+        thread_count=_default_thread_count,
+        md5=None,
+        skip_identical=False,
+        codec=None,
+        dedup=None
     ):
         """
         store the content of the file in lumberyard
+
+        If the file has at least multipart_threshold bytes left, we send
+        it as a multipart upload: parts of part_size bytes on
+        thread_count connections, retrying failed parts on their own.
+        Pass multipart_threshold=None to always use a single POST.
+        A single POST of a regular file is sent from a memory map.
+
+        md5 is a boto style (hex_digest, base64_digest). With 
+        skip_identical we compute it if it is not given (so the file 
+        must be seekable), HEAD the key, and send nothing if it already 
+        has these contents (and metadata).
+
+        codec ("zlib", "gzip", "bz2" or "lzma") compresses the contents,
+        by default with the bucket's codec, if it has one. The file is
+        compressed first (in memory if small, otherwise to a temporary
+        file) so md5, size, cb and multipart_threshold all apply to the
+        compressed contents.
+
+        With dedup (by default, the bucket's dedup) we split the file 
+        into content defined chunks, send on thread_count connections
+        only those chunks the bucket does not have, then write a 
+        manifest under our name (see dedup.py). A codec applies to each
+        chunk; multipart_threshold and md5 do not apply.
         """
         if self._bucket is None:
             raise ValueError("No bucket")
@@ -135,88 +655,777 @@ class Key(object):
             if self.exists():
                 raise KeyError("attempt to replace key %r" % (self._name))
 
+        if dedup is None:
+            dedup = self._bucket.dedup
+        write_codec = self._compute_write_codec(codec)
+        if dedup:
+            # the codec is for the chunks, the manifest is plain
+            self._metadata.pop(codec_meta_key, None)
+            self._send_deduplicated(
+                file_object, cb, cb_count, thread_count, write_codec, 
+                skip_identical
+            )
+            return
+
+        self._metadata.pop(manifest_meta_key, None)
+        if write_codec is None:
+            self._send_file(
+                file_object, 
+                cb, 
+                cb_count, 
+                multipart_threshold, 
+                part_size, 
+                thread_count, 
+                md5, 
+                skip_identical
+            )
+            return
+
+        compressed_file = compress_file(write_codec, file_object)
+        try:
+            self._send_file(
+                compressed_file, 
+                cb, 
+                cb_count, 
+                multipart_threshold, 
+                part_size, 
+                thread_count, 
+                None, 
+                skip_identical
+            )
+        finally:
+            compressed_file.close()
+
+    def _send_file(
+        self, 
+        file_object, 
+        cb, 
+        cb_count, 
+        multipart_threshold, 
+        part_size, 
+        thread_count, 
+        md5, 
+        skip_identical
+    ):
+        if skip_identical:
+            if md5 is None:
+                md5 = self.compute_md5(file_object)
+            if self._is_identical(md5[0]):
+                self._log.info("%s is unchanged, not sending" % (
+                    self._name, 
+                ))
+                self._set_md5(md5)
+                return
+
+        size = compute_file_size(file_object)
+        if multipart_threshold is not None \
+        and size is not None and size >= multipart_threshold:
+            self._set_contents_multipart(
+                file_object, size, cb, cb_count, part_size, thread_count
+            )
+            self._metadata_complete = True
+            if md5 is not None:
+                self._set_md5(md5)
+            return
+
+        # httplib can only size a body with len() or fileno()
+        headers = None
+        if size is not None:
+            headers = {"Content-Length" : str(size)}
+
+        # a local file goes from a memory map, without copying
+        mapped_reader = create_mapped_file_reader(file_object, size)
         wrapper = None
-        if cb is None:
+        if mapped_reader is not None:
+            body = mapped_reader
+        elif cb is None:
             body = file_object
         else:
             body = ReadReporter(file_object)
-            wrapper = ArchiveCallbackWrapper(body, cb, cb_count) 
+        if cb is not None:
+            wrapper = ArchiveCallbackWrapper(body, cb, cb_count, size) 
 
         kwargs = {}
-        for meta_key, meta_value in self._metadata:
+        for meta_key, meta_value in self._metadata.items():
             kwargs["".join([meta_prefix, meta_key])] = meta_value
 
         method = "POST"
         uri = compute_uri("data", self._name, **kwargs)
 
-        http_connection = self._bucket.create_http_connection()
+        http_connection = self._bucket.acquire_http_connection()
 
         self._log.info("requesting POST %s" % (uri, ))
-        response = http_connection.request(method, uri, body=body)
-        
-        response.read()
+        try:
+            response = http_connection.request(
+                method, uri, body=body, headers=headers
+            )
+            response.read()
+        except Exception:
+            self._bucket.discard_http_connection(http_connection)
+            raise
+        finally:
+            if mapped_reader is not None:
+                mapped_reader.close()
+
+        self._bucket.release_http_connection(http_connection)
+        self._bucket.invalidate_cache(self._name)
+        self._metadata_complete = True
+        if md5 is not None:
+            self._set_md5(md5)
+
+        if wrapper is not None:
+            wrapper.finish()
 
-    def get_contents_as_string(self, cb=None, cb_count=10):
+    def _send_deduplicated(
+        self, file_object, cb, cb_count, thread_count, codec, skip_identical
+    ):
+        """
+        store each chunk of file_object that the bucket does not have,
+        then a manifest of them all under our name
+        """
+        codec_name = None if codec is None else codec.name
+        chunk_names = self._load_chunk_names()
+        chunks = list()
+
+        if cb is None:
+            reporter = NullCallbackWrapper()
+        else:
+            reporter = RetrieveCallbackWrapper(
+                compute_file_size(file_object), cb, cb_count
+            )
+
+        def _new_chunks():
+            for data in iter_chunks(file_object):
+                digest = hashlib.sha256(data).hexdigest()
+                chunks.append((digest, len(data), ))
+                chunk_name = compute_chunk_name(digest, codec_name)
+                if chunk_name in chunk_names:
+                    reporter.bytes_written(len(data))
+                    continue
+                chunk_names.add(chunk_name)
+                yield chunk_name, data
+
+        def _store_chunk(job):
+            chunk_name, data = job
+            chunk_key = Key(bucket=self._bucket, name=chunk_name)
+            if chunk_key.exists():
+                return 0
+            chunk_key.set_contents_from_string(data, codec=codec_name)
+            return len(data)
+
+        reporter.start()
+        bytes_sent = 0
+        for job_result in run_jobs(_store_chunk, _new_chunks(), thread_count):
+            if job_result.exception is not None:
+                raise job_result.exception
+            bytes_sent += job_result.result
+            reporter.bytes_written(len(job_result.job[1]))
+
+        self._log.info("%s: %s chunks, sent %s bytes of new chunks" % (
+            self._name, len(chunks), bytes_sent,
+        ))
+        self._metadata[manifest_meta_key] = "1"
+        self._send_string(
+            encode_manifest(sum([size for _, size in chunks]), codec_name, 
+                            chunks),
+            None, 
+            skip_identical
+        )
+        reporter.finish()
+
+    def _load_chunk_names(self):
+        """
+        return the set of chunk names in the manifest we are replacing,
+        if there is one: the bucket has those already
+        """
+        current_key = Key(bucket=self._bucket, name=self._name)
+        try:
+            metadata = current_key.get_all_metadata()
+        except LumberyardHTTPError, instance:
+            if instance.status == 404: # not found
+                return set()
+            raise
+        if manifest_meta_key not in metadata:
+            return set()
+
+        manifest = decode_manifest(
+            current_key._get_contents_as_string(None, 0, None)
+        )
+        return set([
+            compute_chunk_name(digest, manifest["codec"])
+            for digest, _ in manifest["chunks"]
+        ])
+
+    def _read_manifest(self, write, thread_count, cb, cb_count):
+        """
+        pass our contents to write(data), chunk by chunk, fetching
+        thread_count chunks at a time
+        """
+        manifest = decode_manifest(self._get_contents_as_string(None, 0, None))
+        chunks = manifest["chunks"]
+
+        if cb is None:
+            reporter = NullCallbackWrapper()
+        else:
+            reporter = RetrieveCallbackWrapper(manifest["size"], cb, cb_count)
+
+        # a window of chunks at a time, so memory stays bounded however
+        # the fetches finish
+        window_size = thread_count * 2
+        reporter.start()
+        for start in xrange(0, len(chunks), window_size):
+            window = chunks[start:start+window_size]
+            fetched = dict()
+            for job_result in run_jobs(
+                lambda chunk: self._fetch_chunk(chunk, manifest["codec"]),
+                set(window),
+                thread_count
+            ):
+                if job_result.exception is not None:
+                    raise job_result.exception
+                fetched[job_result.job] = job_result.result
+            for chunk in window:
+                write(fetched[chunk])
+                reporter.bytes_written(chunk[1])
+        reporter.finish()
+
+    def _fetch_chunk(self, chunk, codec_name):
+        digest, size = chunk
+        chunk_key = Key(
+            bucket=self._bucket, name=compute_chunk_name(digest, codec_name)
+        )
+        if codec_name is not None:
+            chunk_key.set_metadata(codec_meta_key, codec_name)
+        chunk_key._metadata_complete = True
+        data = chunk_key.get_contents_as_string()
+        if len(data) != size or hashlib.sha256(data).hexdigest() != digest:
+            raise IOError("chunk %s of %s is not what we stored" % (
+                digest, self._name,
+            ))
+        return data
+
+    def _set_md5(self, md5):
+        self._md5, self._base64md5 = md5[:2]
+
+    def _is_identical(self, hex_md5):
+        """
+        True if the server already holds contents with this md5 and,
+        if we have any, this metadata
+        """
+        try:
+            headers = self._head()
+        except LumberyardHTTPError, instance:
+            if instance.status == 404: # not found
+                return False
+            raise
+
+        etag = headers.get("etag")
+        if etag is None or etag.strip('"') != hex_md5:
+            return False
+
+        if len(self._metadata) > 0:
+            local_metadata = dict(self._metadata)
+            remote_metadata = self.get_all_metadata()
+            self._metadata = local_metadata
+            if remote_metadata != local_metadata:
+                return False
+
+        return True
+
+    def _set_contents_multipart(
+        self, file_object, size, cb, cb_count, part_size, thread_count
+    ):
+        multipart_upload = self._bucket.initiate_multipart_upload(
+            self._name, metadata=self._metadata
+        )
+        self._log.info("multipart upload %s of %s bytes" % (
+            multipart_upload.id, size,
+        ))
+        try:
+            multipart_upload.upload_parts_from_file(
+                file_object, 
+                part_size, 
+                thread_count, 
+                size=size, 
+                cb=cb, 
+                cb_count=cb_count
+            )
+        except Exception:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            try:
+                multipart_upload.cancel_upload()
+            except Exception, instance:
+                self._log.error("cancel_upload failed %s" % (instance, ))
+            raise exc_type, exc_value, exc_traceback
+        multipart_upload.complete_upload()
+
+    def get_contents_as_string(
+        self, cb=None, cb_count=10, headers=None, read_buffer_size=None
+    ):
         """
         return the contents from lumberyard as a string
+
+        headers are passed with the request, so a boto style
+        {"Range" : "bytes=0-1023"} returns just those bytes.
+        Without headers, we read through the bucket's content cache,
+        if it has one. Compressed contents are decompressed.
+
+        read_buffer_size (by default, the bucket's) is the size of each
+        read of the response: a number of bytes, or "adaptive" 
+        (see read_size.py).
         """
         if self._bucket is None:
             raise ValueError("No bucket")
         if self._name is None:
             raise ValueError("No name")
 
-        method = "GET"
-        uri = compute_uri("data", self._name)
+        if self._is_manifest():
+            if headers is not None:
+                raise ValueError("%s is deduplicated, no headers" % (
+                    self._name,
+                ))
+            body_list = list()
+            self._read_manifest(
+                body_list.append, _default_thread_count, cb, cb_count
+            )
+            return "".join(body_list)
 
-        http_connection = self._bucket.create_http_connection()
+        return self._get_contents_as_string(
+            cb, cb_count, headers, read_buffer_size
+        )
 
-        self._log.info("requesting GET %s" % (uri, ))
-        response = http_connection.request(method, uri, body=None)
-        
-        body_list = list()
-        while True:
-            data = response.read(_read_buffer_size)
-            if len(data) == 0:
-                break
-            body_list.append(data)
+    def _get_contents_as_string(
+        self, cb, cb_count, headers, read_buffer_size=None
+    ):
+        """
+        return the contents as stored, decompressed if need be
+        """
+        codec = self._get_read_codec(headers)
+
+        if headers is None and self._bucket.content_cache is not None:
+            body_list = list()
+            self._read_through_cache_decoded(
+                body_list.append, codec, cb, cb_count, read_buffer_size
+            )
+            return "".join(body_list)
+
+        body = self._bucket.run_idempotent(
+            lambda: self._read_contents(headers, read_buffer_size),
+            "GET",
+            compute_uri("data", self._name),
+            hedge=self._is_small()
+        )
+        if codec is not None:
+            return decompress_string(codec, body)
+        return body
+
+    def _read_contents(self, headers, read_buffer_size):
+        http_connection, response = self._send_get(headers)
+
+        try:
+            read_size = self._create_read_size(read_buffer_size, response)
+            content_length = response.getheader("content-length")
+            if content_length is not None:
+                # read into one buffer of the right size, rather than
+                # a list of chunks joined at the end. str(body) below
+                # still copies it all once, so the peak is twice the
+                # body: only get_contents_into avoids that copy.
+                body = bytearray(int(content_length))
+                bytes_read = _read_body_into(
+                    response, memoryview(body), read_size
+                )
+                if bytes_read < len(body):
+                    raise IOError("short read %s of %s bytes" % (
+                        bytes_read, len(body),
+                    ))
+            else:
+                body = "".join(iter_body(response, read_size))
+        except Exception:
+            self._bucket.discard_http_connection(http_connection)
+            raise
+
+        self._bucket.release_http_connection(http_connection)
+
+        return str(body)
+
+    def get_contents_into(self, buffer, headers=None):
+        """
+        read the contents from lumberyard into a writable buffer 
+        (a bytearray, or anything memoryview accepts) and return the 
+        number of bytes read. 
+
+        Nothing is allocated per call, so a caller can reuse one buffer 
+        for many keys (except for compressed contents, which we 
+        decompress to a string first). Raise ValueError if the contents
+        do not fit.
+        """
+        if self._bucket is None:
+            raise ValueError("No bucket")
+        if self._name is None:
+            raise ValueError("No name")
 
-        http_connection.close()
+        view = memoryview(buffer)
 
-        return "".join(body_list)
+        if self._is_manifest() or self._get_read_codec(headers) is not None:
+            data = self.get_contents_as_string(headers=headers)
+            if len(data) > len(view):
+                raise ValueError("%s bytes will not fit in buffer of %s" % (
+                    len(data), len(view),
+                ))
+            view[:len(data)] = data
+            return len(data)
 
-    def get_contents_to_file(self, file_object, cb=None, cb_count=10):
+        # each try reads from the start of the buffer again
+        return self._bucket.run_idempotent(
+            lambda: self._read_into(view, headers),
+            "GET",
+            compute_uri("data", self._name)
+        )
+
+    def _read_into(self, view, headers):
+        http_connection, response = self._send_get(headers)
+
+        try:
+            content_length = response.getheader("content-length")
+            if content_length is not None and int(content_length) > len(view):
+                raise ValueError("%s bytes will not fit in buffer of %s" % (
+                    content_length, len(view),
+                ))
+            bytes_read = _read_body_into(
+                response, view, self._create_read_size(None, response)
+            )
+            if content_length is None and len(response.read(1)) > 0:
+                raise ValueError("contents will not fit in buffer of %s" % (
+                    len(view),
+                ))
+        except Exception:
+            self._bucket.discard_http_connection(http_connection)
+            raise
+
+        self._bucket.release_http_connection(http_connection)
+
+        return bytes_read
+
+    def get_contents_to_file(
+        self, 
+        file_object, 
+        cb=None, 
+        cb_count=10, 
+        thread_count=1, 
+        part_size=_default_part_size,
+        headers=None,
+        read_buffer_size=None
+    ):
         """
         return the contents from lumberyard to a file
+
+        With thread_count > 1 we HEAD the key for its size and, if it is
+        bigger than part_size, GET ranges of part_size bytes on
+        thread_count connections, writing each range at its offset
+        in file_object. A range that fails is retried on its own.
+
+        headers are passed with the request (and turn off the parallel
+        path) so a boto style {"Range" : "bytes=-1024"} gets just the tail.
+        Without headers, we read through the bucket's content cache, 
+        if it has one, on a single connection.
+
+        read_buffer_size (by default, the bucket's) is the size of each
+        read of a response: a number of bytes, or "adaptive" 
+        (see read_size.py).
         """
         if self._bucket is None:
             raise ValueError("No bucket")
         if self._name is None:
             raise ValueError("No name")
 
-        method = "GET"
-        uri = compute_uri("data", self._name)
+        if self._is_manifest():
+            if headers is not None:
+                raise ValueError("%s is deduplicated, no headers" % (
+                    self._name,
+                ))
+            self._read_manifest(
+                file_object.write, 
+                max(thread_count, _default_thread_count), 
+                cb, 
+                cb_count
+            )
+            return
 
-        http_connection = self._bucket.create_http_connection()
+        # compressed contents are decompressed in order, on one
+        # connection
+        codec = self._get_read_codec(headers)
 
-        self._log.info("requesting GET %s" % (uri, ))
-        response = http_connection.request(method, uri, body=None)
+        if headers is None and self._bucket.content_cache is not None:
+            self._read_through_cache_decoded(
+                file_object.write, codec, cb, cb_count, read_buffer_size
+            )
+            return
+
+        if thread_count > 1 and headers is None and codec is None:
+            if self._size is None:
+                self.refresh()
+            size = self._size
+            if size > part_size:
+                if cb is None:
+                    reporter = NullCallbackWrapper()
+                else:
+                    reporter = RetrieveCallbackWrapper(size, cb, cb_count) 
+                reporter.start()
+                download_ranges(
+                    self._bucket, 
+                    self._name, 
+                    file_object, 
+                    size, 
+                    part_size, 
+                    thread_count, 
+                    reporter, 
+                    read_buffer_size or self._bucket.read_buffer_size
+                )
+                reporter.finish()
+                return
+
+        # nothing has been written yet, so a failed request can be retried
+        http_connection, response = self._bucket.run_idempotent(
+            lambda: self._send_get(headers),
+            "GET",
+            compute_uri("data", self._name)
+        )
+
+        try:
+            if cb is None:
+                reporter = NullCallbackWrapper()
+            else:
+                # the size of this response, which may be a range
+                size = response.getheader("content-length")
+                if size is not None:
+                    size = int(size)
+                elif headers is None:
+                    size = self.size
+                reporter = RetrieveCallbackWrapper(size, cb, cb_count) 
+
+            write = file_object.write
+            if codec is not None:
+                decoder = DecodingWriter(codec, write)
+                write = decoder.write
+
+            read_size = self._create_read_size(read_buffer_size, response)
 
+            self._log.info("reading response")
+            reporter.start()
+            for data in iter_body(response, read_size):
+                write(data)
+                reporter.bytes_written(len(data))
+            if codec is not None:
+                decoder.finish()
+            reporter.finish()
+        except Exception:
+            self._bucket.discard_http_connection(http_connection)
+            raise
+
+        self._bucket.release_http_connection(http_connection)
+
+    def get_contents_as_mmap(self):
+        """
+        return the contents as a read only mmap of the bucket's content
+        cache entry, so a warm read copies nothing. An empty key gives
+        an empty string, which mmap can't map.
+        """
+        if self._bucket is None:
+            raise ValueError("No bucket")
+        if self._name is None:
+            raise ValueError("No name")
+        if self._bucket.content_cache is None:
+            raise ValueError("No content cache")
+        if self._is_manifest() or self._get_read_codec() is not None:
+            raise ValueError("can't map compressed or deduplicated %s" % (
+                self._name, 
+            ))
+
+        # another thread may evict the entry before we open it
+        retry_count = 0
+        while True:
+            entry = self._read_through_cache(None, None, 0)
+            if entry.size == 0:
+                return ""
+            try:
+                input_file = open(entry.path, "rb")
+            except IOError:
+                if retry_count >= 1:
+                    raise
+                retry_count += 1
+                continue
+            try:
+                return mmap.mmap(
+                    input_file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            finally:
+                input_file.close()
+
+    def _read_through_cache_decoded(
+        self, write, codec, cb, cb_count, read_buffer_size=None
+    ):
+        """
+        _read_through_cache, decompressing what we pass to write.
+        The cache holds the contents as they are on the server.
+        """
+        if codec is None:
+            self._read_through_cache(write, cb, cb_count, read_buffer_size)
+            return
+        decoder = DecodingWriter(codec, write)
+        self._read_through_cache(
+            decoder.write, cb, cb_count, read_buffer_size
+        )
+        decoder.finish()
+
+    def _read_through_cache(self, write, cb, cb_count, read_buffer_size=None):
+        """
+        pass the contents to write(data) (if it is not None) from the 
+        bucket's content cache if the server says our copy is current, 
+        otherwise from the server, keeping a copy in the cache. 
+        
+        Return the CacheEntry, or None if the contents were too big 
+        to keep.
+        """
+        content_cache = self._bucket.content_cache
+        entry = content_cache.lookup(self._bucket.name, self._name)
+
+        # open our copy now, so it stays readable even if it is evicted
+        # while we ask the server about it
+        cached_file = None
+        if entry is not None:
+            try:
+                cached_file = open(entry.path, "rb")
+            except IOError:
+                entry = None
+
+        try:
+            return self._fetch_through_cache(
+                content_cache, 
+                entry, 
+                cached_file, 
+                write, 
+                cb, 
+                cb_count, 
+                read_buffer_size
+            )
+        finally:
+            if cached_file is not None:
+                cached_file.close()
+
+    def _fetch_through_cache(
+        self, 
+        content_cache, 
+        entry, 
+        cached_file, 
+        write, 
+        cb, 
+        cb_count, 
+        read_buffer_size
+    ):
+        headers = None
+        if entry is not None and entry.etag is not None:
+            headers = {"If-None-Match" : '"%s"' % (entry.etag, ), }
+        elif entry is not None and entry.last_modified is not None:
+            headers = {"If-Modified-Since" : entry.last_modified, }
+
+        # a 304 is not retryable, so NotModified comes straight through
+        try:
+            http_connection, response = self._bucket.run_idempotent(
+                lambda: self._send_get(headers),
+                "GET",
+                compute_uri("data", self._name)
+            )
+        except NotModified:
+            self._log.debug("%s is current in the cache" % (self._name, ))
+            if write is not None:
+                self._copy_from_cache(
+                    entry, cached_file, write, cb, cb_count, read_buffer_size
+                )
+            return entry
+
+        writer = None
+        try:
+            writer = content_cache.begin(
+                self._bucket.name, 
+                self._name, 
+                self._etag, 
+                self._last_modified
+            )
+            if cb is None:
+                reporter = NullCallbackWrapper()
+            else:
+                size = response.getheader("content-length")
+                if size is not None:
+                    size = int(size)
+                reporter = RetrieveCallbackWrapper(size, cb, cb_count) 
+            read_size = self._create_read_size(read_buffer_size, response)
+            reporter.start()
+            for data in iter_body(response, read_size):
+                writer.write(data)
+                if write is not None:
+                    write(data)
+                reporter.bytes_written(len(data))
+        except Exception:
+            if writer is not None:
+                writer.abort()
+            self._bucket.discard_http_connection(http_connection)
+            raise
+
+        self._bucket.release_http_connection(http_connection)
+
+        new_entry = writer.commit()
+        reporter.finish()
+
+        if new_entry is None:
+            # too big to keep; the caller has the contents already
+            if write is None:
+                raise ValueError("%s is bigger than the content cache" % (
+                    self._name, 
+                ))
+        return new_entry
+
+    def _copy_from_cache(
+        self, entry, cached_file, write, cb, cb_count, read_buffer_size
+    ):
         if cb is None:
             reporter = NullCallbackWrapper()
         else:
-            reporter = RetrieveCallbackWrapper(self.size, cb, cb_count) 
-        
-        self._log.info("reading response")
+            reporter = RetrieveCallbackWrapper(entry.size, cb, cb_count) 
+        if read_buffer_size is None:
+            read_buffer_size = self._bucket.read_buffer_size
+        read_size = create_read_size(read_buffer_size, entry.size)
         reporter.start()
-        while True:
-            data = response.read(_read_buffer_size)
-            bytes_read = len(data)
-            if bytes_read == 0:
-                break
-            file_object.write(data)
-            reporter.bytes_written(bytes_read)
+        for data in iter_body(cached_file, read_size):
+            write(data)
+            reporter.bytes_written(len(data))
         reporter.finish()
-        http_connection.close()
+
+    def open(self, mode="r", read_ahead=_default_read_ahead):
+        """
+        return a seekable file-like KeyReader for this key
+
+        We HEAD the key for its size (unless we already know it), the
+        data is fetched by range as it is read.
+        """
+        if mode != "r":
+            raise ValueError("only mode 'r' is supported")
+        if self._bucket is None:
+            raise ValueError("No bucket")
+        if self._name is None:
+            raise ValueError("No name")
+        if self._get_read_codec() is not None:
+            raise ValueError("can't seek in compressed %s, use read()" % (
+                self._name,
+            ))
+        if self._is_manifest():
+            raise ValueError("%s is deduplicated, use get_contents_*" % (
+                self._name,
+            ))
+
+        if self._size is None:
+            self.refresh()
+
+        return KeyReader(self, self._size, read_ahead=read_ahead)
 
     def delete(self):
         """
@@ -230,13 +1439,37 @@ class Key(object):
         method = "DELETE"
         uri = compute_uri("data", self._name)
 
-        http_connection = self._bucket.create_http_connection()
+        attempts = list()
+
+        def _attempt():
+            attempts.append(method)
+            try:
+                self._send_delete(method, uri)
+            except LumberyardHTTPError, instance:
+                # an earlier try may have deleted the key and lost
+                # the response: then the key being gone is success
+                if instance.status != httplib.NOT_FOUND \
+                or len(attempts) == 1:
+                    raise
+                self._log.info("%s already deleted on retry" % (
+                    self._name,
+                ))
+
+        self._bucket.run_idempotent(_attempt, method, uri)
+        self._bucket.invalidate_cache(self._name)
+
+    def _send_delete(self, method, uri):
+        http_connection = self._bucket.acquire_http_connection()
 
         self._log.info("requesting DELETE %s" % (uri, ))
-        response = http_connection.request(method, uri, body=None)
-        
-        response.read()
-        http_connection.close()
+        try:
+            response = http_connection.request(method, uri, body=None)
+            response.read()
+        except Exception:
+            self._bucket.discard_http_connection(http_connection)
+            raise
+
+        self._bucket.release_http_connection(http_connection)
 
     def set_metadata(self, meta_key, meta_value):
         self._metadata[meta_key] = meta_value
@@ -250,7 +1483,20 @@ class Key(object):
         if meta_key in self._metadata:
             return self._metadata[meta_key]
 
-        found = False
+        # with a bucket cache, one request gets every meta_key at once
+        if self._bucket is not None \
+        and self._bucket.metadata_cache is not None:
+            try:
+                metadata = self.get_all_metadata()
+            except LumberyardHTTPError, instance:
+                # a missing key, as without the cache
+                if instance.status == 404: # not found
+                    raise KeyError(meta_key)
+                raise
+            if meta_key not in metadata:
+                raise KeyError(meta_key)
+            return metadata[meta_key]
+
         method = "GET"
 
         if self._bucket is None:
@@ -258,34 +1504,72 @@ class Key(object):
         if self._name is None:
             raise ValueError("No name")
 
-        http_connection = self._bucket.create_http_connection()
-
         kwargs = {
             "action"            : "get_meta", 
             "meta_key"          : meta_key,            
         }
 
         uri = compute_uri("data", self._name, **kwargs)
-        
-        self._log.info("requesting GET %s" % (uri, ))
+
         try:
-            response = http_connection.request(method, uri, body=None)
+            meta_value = self._bucket.run_idempotent(
+                lambda: self._bucket.read_response(method, uri),
+                method,
+                uri,
+                hedge=True
+            )
         except LumberyardHTTPError, instance:
             if instance.status == 404: # not found
-                pass
-            else:
-                self._log.error(str(instance))
-                http_connection.close()
-                raise
-        else:
-            found = True
-        
-        if not found:
-            http_connection.close()
-            raise KeyError(meta_key)
+                raise KeyError(meta_key)
+            self._log.error(str(instance))
+            raise
+
+        self._metadata[meta_key] = meta_value
+        return self._metadata[meta_key]
+
+    def get_all_metadata(self):
+        """
+        return a dict of all the metadata for this key, in one request.
 
-        self._metadata[meta_key] = response.read()
+        If the bucket has a MetadataCache, we look there first, and
+        put what we fetch there for the next Key with this name.
+        """
+        if self._bucket is None:
+            raise ValueError("No bucket")
+        if self._name is None:
+            raise ValueError("No name")
 
-        http_connection.close()
-        return self._metadata[meta_key] 
+        metadata_cache = self._bucket.metadata_cache
+        if metadata_cache is not None:
+            metadata = metadata_cache.get(self._bucket.name, self._name)
+            if metadata is not None:
+                self._metadata.update(metadata)
+                self._metadata_complete = True
+                return metadata
 
+        method = "GET"
+        uri = compute_uri("data", self._name, action="get_meta")
+
+        metadata = json.loads(self._bucket.run_idempotent(
+            lambda: self._bucket.read_response(method, uri),
+            method,
+            uri,
+            hedge=True
+        ))
+        if metadata_cache is not None:
+            metadata_cache.put(self._bucket.name, self._name, metadata)
+        self._metadata.update(metadata)
+        self._metadata_complete = True
+        return metadata
+
+    def _create_read_size(self, read_buffer_size, response):
+        """
+        how to read the body of response: read_buffer_size, or the 
+        bucket's if it is None
+        """
+        if read_buffer_size is None:
+            read_buffer_size = self._bucket.read_buffer_size
+        content_length = response.getheader("content-length")
+        if content_length is not None:
+            content_length = int(content_length)
+        return create_read_size(read_buffer_size, content_length)
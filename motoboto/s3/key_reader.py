@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+key_reader.py
+
+class KeyReader
+
+a seekable, read only file-like object over a key, fetched lazily by range
+"""
+import os
+
+_default_read_ahead = 256 * 1024
+
+class KeyReader(object):
+    """
+    a seekable, read only file-like object over a key
+
+    Each read that misses our buffer fetches one HTTP Range of at least
+    read_ahead bytes, so small sequential reads do not each cost a
+    round trip, and reading a header or footer does not fetch the rest.
+    """
+    def __init__(self, key, size, read_ahead=_default_read_ahead):
+        self._key = key
+        self._size = size
+        self._read_ahead = read_ahead
+        self._position = 0
+        self._buffer = ""
+        self._buffer_offset = 0
+        self._closed = False
+
+    @property
+    def name(self):
+        return self._key.name
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        self._buffer = ""
+        self._closed = True
+
+    def tell(self):
+        self._check_closed()
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._check_closed()
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError("invalid whence %r" % (whence, ))
+        if position < 0:
+            raise IOError("negative seek position %s" % (position, ))
+        self._position = position
+
+    def read(self, size=-1):
+        """
+        read up to size bytes (all the rest if size < 0)
+        """
+        self._check_closed()
+        if size < 0 or self._position + size > self._size:
+            size = self._size - self._position
+        if size <= 0:
+            return ""
+
+        pieces = list()
+
+        buffer_end = self._buffer_offset + len(self._buffer)
+        if self._buffer_offset <= self._position < buffer_end:
+            start = self._position - self._buffer_offset
+            piece = self._buffer[start:start+size]
+            pieces.append(piece)
+            self._position += len(piece)
+            size -= len(piece)
+
+        if size > 0:
+            last_byte = min(
+                self._position + max(size, self._read_ahead), self._size
+            ) - 1
+            self._buffer = self._key.get_contents_as_string(
+                headers={"Range" : "bytes=%d-%d" % (
+                    self._position, last_byte,
+                )}
+            )
+            self._buffer_offset = self._position
+            piece = self._buffer[:size]
+            pieces.append(piece)
+            self._position += len(piece)
+
+        return "".join(pieces)
+
+    def _check_closed(self):
+        if self._closed:
+            raise ValueError("I/O operation on closed KeyReader")
+
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+key_util.py
+
+helpers shared by Key and AsyncKey
+"""
+import httplib
+import os
+import time
+
+default_read_buffer_size = 64 * 1024
+
+def expected_status(headers):
+    """
+    a request with a Range header expects 206 Partial Content
+    """
+    if headers is not None:
+        for name in headers.keys():
+            if name.lower() == "range":
+                return httplib.PARTIAL_CONTENT
+    return httplib.OK
+
+def format_timestamp(timestamp):
+    """
+    boto gives last_modified from a listing as an ISO 8601 string
+    """
+    if isinstance(timestamp, basestring):
+        return timestamp
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(timestamp))
+
+def compute_file_size(file_object):
+    """
+    return the number of bytes from the current position to the end of
+    file_object, or None if we can't tell without reading it
+    """
+    try:
+        position = file_object.tell()
+    except (AttributeError, IOError, ValueError, ):
+        return None
+
+    try:
+        return os.fstat(file_object.fileno()).st_size - position
+    except (AttributeError, IOError, OSError, ValueError, ):
+        pass
+
+    try:
+        file_object.seek(0, os.SEEK_END)
+        size = file_object.tell() - position
+        file_object.seek(position, os.SEEK_SET)
+    except (AttributeError, IOError, ValueError, ):
+        return None
+
+    return size
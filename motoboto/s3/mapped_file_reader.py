@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+mapped_file_reader.py
+
+class MappedFileReader
+
+an upload body that sends a local file from a read only memory map
+"""
+import mmap
+import os
+import stat
+
+_default_block_size = 1024 * 1024
+
+class MappedFileReader(object):
+    """
+    an upload body that sends a local file from a read only memory map
+
+    read() returns buffer slices of the map, which socket.sendall sends
+    straight from the page cache: no bytes are copied into Python
+    strings. httplib asks for 8K at a time; we hand out at least
+    block_size, so a big file takes few trips through Python.
+
+    Like lumberyard's ReadReporter, set_callback(callback) has
+    callback(bytes_read) called on every read, for
+    ArchiveCallbackWrapper.
+
+    Use create_mapped_file_reader, which returns None for a file we
+    can't map.
+    """
+    def __init__(
+        self, file_object, mapped_file, start, size,
+        block_size=_default_block_size
+    ):
+        self._file_object = file_object
+        self._mmap = mapped_file
+        self._position = start
+        self._end = start + size
+        self._block_size = block_size
+        self._callback = None
+
+    def set_callback(self, callback):
+        self._callback = callback
+
+    def read(self, size=-1):
+        remaining = self._end - self._position
+        if size < 0:
+            size = remaining
+        size = min(max(size, self._block_size), remaining)
+        if size == 0:
+            return ""
+        data = buffer(self._mmap, self._position, size)
+        self._position += size
+        if self._callback is not None:
+            self._callback(size)
+        return data
+
+    def close(self):
+        """
+        unmap the file, leaving its position after what we sent
+        """
+        if self._mmap is None:
+            return
+        self._mmap.close()
+        self._mmap = None
+        self._file_object.seek(self._position, os.SEEK_SET)
+
+def create_mapped_file_reader(file_object, size):
+    """
+    return a MappedFileReader over the next size bytes of file_object,
+    or None if it is not a regular file we can map for reading
+    (a StringIO, a pipe, a file opened write only...)
+    """
+    if size is None or size == 0:
+        return None
+    try:
+        fileno = file_object.fileno()
+        if not stat.S_ISREG(os.fstat(fileno).st_mode):
+            return None
+        start = file_object.tell()
+        # our position must count what is buffered in file_object
+        file_object.flush()
+        mapped_file = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (AttributeError, EnvironmentError, ValueError, ):
+        return None
+    return MappedFileReader(file_object, mapped_file, start, size)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+metadata_cache.py
+
+class MetadataCache
+
+a client side LRU cache of key metadata, with a time to live
+"""
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+_default_max_size = 10000
+_default_ttl = 60.0
+
+class MetadataCache(object):
+    """
+    a client side LRU cache of key metadata, with a time to live.
+
+    Entries are keyed by (collection_name, key_name), so one cache can
+    be shared by every Bucket of an S3Emulator. It is thread safe.
+
+    max_size    the most keys we hold, the least recently used goes first
+    ttl         seconds an entry stays good, None for no expiry
+    """
+    def __init__(self, max_size=_default_max_size, ttl=_default_ttl):
+        self._log = logging.getLogger("MetadataCache")
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, collection_name, key_name):
+        """
+        return a copy of the cached metadata dict, or None
+        """
+        cache_key = (collection_name, key_name, )
+        with self._lock:
+            entry = self._entries.pop(cache_key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            metadata, expires = entry
+            if expires is not None and time.time() >= expires:
+                self.misses += 1
+                return None
+            # back on the end, as the most recently used
+            self._entries[cache_key] = entry
+            self.hits += 1
+            return dict(metadata)
+
+    def put(self, collection_name, key_name, metadata):
+        """
+        cache a copy of the metadata dict for the key
+        """
+        if self._max_size <= 0:
+            return
+        cache_key = (collection_name, key_name, )
+        expires = None
+        if self._ttl is not None:
+            expires = time.time() + self._ttl
+        with self._lock:
+            self._entries.pop(cache_key, None)
+            self._entries[cache_key] = (dict(metadata), expires, )
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection_name, key_name):
+        """
+        forget the key, after it is written or deleted
+        """
+        with self._lock:
+            self._entries.pop((collection_name, key_name, ), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
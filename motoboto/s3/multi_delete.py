@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+multi_delete.py
+
+simulate boto's MultiDeleteResult, Deleted and Error objects
+"""
+
+class Deleted(object):
+    """
+    a key that was deleted
+    """
+    def __init__(self, key=None):
+        self.key = key
+
+    def __repr__(self):
+        return "<Deleted: %s>" % (self.key, )
+
+class Error(object):
+    """
+    a key that was not deleted, with the HTTP status and a message
+    """
+    def __init__(self, key=None, code=None, message=None):
+        self.key = key
+        self.code = code
+        self.message = message
+
+    def __repr__(self):
+        return "<Error: %s (%s, %s)>" % (self.key, self.code, self.message, )
+
+class MultiDeleteResult(object):
+    """
+    the result of Bucket.delete_keys: deleted is a list of Deleted objects
+    (empty when quiet), errors a list of Error objects
+    """
+    def __init__(self, bucket=None):
+        self.bucket = bucket
+        self.deleted = list()
+        self.errors = list()
+
+    def __repr__(self):
+        return "<MultiDeleteResult: %s deleted, %s errors>" % (
+            len(self.deleted), len(self.errors),
+        )
+
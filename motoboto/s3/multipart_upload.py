@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+multipart_upload.py
+
+simulate a boto MultiPartUpload object, using lumberyard conjoined archives
+"""
+import logging
+
+from lumberyard.http_util import compute_uri
+
+from motoboto.retry import RetryPolicy
+from motoboto.s3.callback_throttle import CallbackThrottle
+from motoboto.s3.key import Key
+from motoboto.worker_pool import run_jobs
+
+# unless the bucket has a retry policy of its own
+_part_retry_policy = RetryPolicy(max_attempts=4, base_delay=1.0)
+
+class MultiPartUpload(object):
+    """
+    simulate a boto MultiPartUpload object
+
+    Parts go up as parts of a lumberyard conjoined archive.
+    upload_part_from_file is safe to call from several threads,
+    upload_parts_from_file does that for you.
+    """
+    def __init__(self, bucket=None, key_name=None, upload_id=None):
+        self._log = logging.getLogger("MultiPartUpload(%s)" % (key_name, ))
+        self._bucket = bucket
+        self._key_name = key_name
+        self._upload_id = upload_id
+
+    def __repr__(self):
+        return "<MultiPartUpload %s %s>" % (self._key_name, self._upload_id)
+
+    @property
+    def bucket(self):
+        return self._bucket
+
+    @property
+    def key_name(self):
+        return self._key_name
+
+    @property
+    def id(self):
+        return self._upload_id
+
+    def upload_part_from_file(
+        self, fp, part_num, cb=None, cb_count=10, size=None
+    ):
+        """
+        upload size bytes (default: the rest) of fp as part number part_num
+        """
+        if size is None:
+            data = fp.read()
+        else:
+            data = fp.read(size)
+
+        self._upload_part(part_num, data)
+
+        if cb is not None:
+            cb(len(data), len(data))
+
+    def upload_parts_from_file(
+        self, 
+        file_object, 
+        part_size, 
+        thread_count, 
+        size=None, 
+        cb=None, 
+        cb_count=10
+    ):
+        """
+        cut file_object into parts of part_size bytes and upload them
+        on thread_count threads. A part that fails is retried on its own.
+
+        We hold at most about 2 * thread_count parts in memory.
+        cb(bytes_sent, size) is called as parts complete, at most
+        cb_count times and once at the end.
+        """
+        if part_size <= 0:
+            raise ValueError("invalid part_size %r" % (part_size, ))
+
+        def _parts():
+            part_num = 0
+            while True:
+                data = file_object.read(part_size)
+                if len(data) == 0 and part_num > 0:
+                    break
+                part_num += 1
+                yield (part_num, data, )
+                if len(data) < part_size:
+                    break
+
+        def _upload(job):
+            part_num, data = job
+            self._upload_part(part_num, data)
+            return len(data)
+
+        throttle = None
+        if cb is not None:
+            throttle = CallbackThrottle(cb, size, cb_count)
+
+        bytes_sent = 0
+        error = None
+        for job_result in run_jobs(_upload, _parts(), thread_count):
+            if job_result.exception is not None:
+                error = job_result.exception
+                break
+            bytes_sent += job_result.result
+            if throttle is not None:
+                throttle.add(job_result.result)
+
+        if error is not None:
+            self._log.error("part upload failed: %s" % (error, ))
+            raise error
+
+        if throttle is not None:
+            throttle.finish()
+
+        return bytes_sent
+
+    def complete_upload(self):
+        """
+        finish the conjoined archive, return a Key for the whole object
+        """
+        self._conjoined_action("finish")
+        self._bucket.invalidate_cache(self._key_name)
+        return Key(bucket=self._bucket, name=self._key_name)
+
+    def cancel_upload(self):
+        """
+        abort the conjoined archive
+        """
+        self._conjoined_action("abort")
+
+    def _upload_part(self, part_num, data):
+        kwargs = {
+            "conjoined_identifier"  : self._upload_id,
+            "conjoined_part"        : part_num,
+        }
+        method = "POST"
+        uri = compute_uri("data", self._key_name, **kwargs)
+
+        retry_policy = self._bucket.retry_policy or _part_retry_policy
+        attempt_count = 0
+        while True:
+            attempt_count += 1
+            http_connection = self._bucket.acquire_http_connection()
+
+            self._log.info("requesting POST %s" % (uri, ))
+            try:
+                response = http_connection.request(method, uri, body=data)
+                response.read()
+            except Exception, instance:
+                self._bucket.discard_http_connection(http_connection)
+                if not retry_policy.should_retry(instance, attempt_count):
+                    raise
+                self._log.warn("part %s retry %s after %s" % (
+                    part_num, attempt_count, instance,
+                ))
+                retry_policy.backoff(attempt_count)
+                continue
+
+            self._bucket.release_http_connection(http_connection)
+            return
+
+    def _conjoined_action(self, action):
+        kwargs = {
+            "action"                : action,
+            "conjoined_identifier"  : self._upload_id,
+        }
+        method = "POST"
+        uri = compute_uri("conjoined", self._key_name, **kwargs)
+
+        http_connection = self._bucket.acquire_http_connection()
+
+        self._log.info("requesting POST %s" % (uri, ))
+        try:
+            response = http_connection.request(method, uri, body=None)
+            response.read()
+        except Exception:
+            self._bucket.discard_http_connection(http_connection)
+            raise
+
+        self._bucket.release_http_connection(http_connection)
+
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+not_modified.py
+
+class NotModified
+"""
+import httplib
+
+from lumberyard.http_connection import LumberyardHTTPError
+
+class NotModified(LumberyardHTTPError):
+    """
+    a conditional GET (If-None-Match or If-Modified-Since) found the key
+    unchanged: 304 Not Modified. Caught by 'except LumberyardHTTPError'
+    like any other status.
+    """
+    def __init__(self, key_name):
+        Exception.__init__(self, httplib.NOT_MODIFIED, key_name)
+        self.status = httplib.NOT_MODIFIED
+        self.reason = "Not Modified"
+        self.key_name = key_name
+
+    def __str__(self):
+        return "%s %s %s" % (self.status, self.reason, self.key_name, )
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+prefix.py
+
+simulate a boto Prefix object
+"""
+
+class Prefix(object):
+    """
+    simulate a boto Prefix object: a common prefix rolled up by a
+    delimiter in a key listing
+    """
+    def __init__(self, bucket=None, name=None):
+        self.bucket = bucket
+        self.name = name
+
+    def __repr__(self):
+        return "<Prefix %s>" % (self.name, )
+
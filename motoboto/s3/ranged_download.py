@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+ranged_download.py
+
+retrieve one key with concurrent HTTP Range requests
+"""
+import httplib
+import logging
+import mmap
+import os
+import threading
+
+from lumberyard.http_util import compute_uri
+
+from motoboto.retry import RetryPolicy
+from motoboto.s3.read_size import create_read_size, iter_body
+from motoboto.worker_pool import run_jobs
+
+# unless the bucket has a retry policy of its own
+_range_retry_policy = RetryPolicy(max_attempts=4, base_delay=1.0)
+
+class PositionalWriter(object):
+    """
+    write blocks at offsets in a file, from several threads.
+
+    We memory map the file if we can. If not (a file opened write only,
+    or not a real file) we fall back to seek and write under a lock.
+    Offsets are relative to the file position when we were created.
+    """
+    def __init__(self, file_object, size):
+        self._file_object = file_object
+        self._size = size
+        self._base = file_object.tell()
+        self._lock = threading.Lock()
+        self._mmap = None
+
+        if size == 0:
+            return
+
+        try:
+            fileno = file_object.fileno()
+            file_object.flush()
+            os.ftruncate(fileno, self._base + size)
+            self._mmap = mmap.mmap(
+                fileno, self._base + size, access=mmap.ACCESS_WRITE
+            )
+        except (AttributeError, EnvironmentError, ValueError, ):
+            self._mmap = None
+
+    def write(self, offset, data):
+        start = self._base + offset
+        if self._mmap is not None:
+            self._mmap[start:start+len(data)] = data
+            return
+
+        with self._lock:
+            self._file_object.seek(start)
+            self._file_object.write(data)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+        self._file_object.seek(self._base + self._size)
+
+def compute_ranges(size, part_size):
+    """
+    return a list of (first_byte, last_byte) covering size bytes
+    """
+    return [
+        (offset, min(offset + part_size, size) - 1, )
+        for offset in xrange(0, size, part_size)
+    ]
+
+def download_ranges(
+    bucket, key_name, file_object, size, part_size, thread_count,
+    reporter, read_buffer_size
+):
+    """
+    GET key_name in ranges of part_size bytes on thread_count pooled
+    connections, writing each range at its offset in file_object.
+
+    A range that fails is retried from the last byte we got.
+    reporter sees the progress of all ranges together.
+    read_buffer_size is as for read_size.create_read_size.
+    """
+    log = logging.getLogger("download_ranges")
+    uri = compute_uri("data", key_name)
+    writer = PositionalWriter(file_object, size)
+    reporter_lock = threading.Lock()
+    retry_policy = bucket.retry_policy or _range_retry_policy
+
+    def _download_range(job):
+        first_byte, last_byte = job
+        offset = first_byte
+        attempt_count = 0
+        while offset <= last_byte:
+            attempt_count += 1
+            http_connection = bucket.acquire_http_connection()
+            headers = {"Range" : "bytes=%d-%d" % (offset, last_byte, )}
+            log.debug("requesting GET %s %s" % (uri, headers["Range"], ))
+            try:
+                response = http_connection.request(
+                    "GET",
+                    uri,
+                    body=None,
+                    headers=headers,
+                    expected_status=httplib.PARTIAL_CONTENT
+                )
+                read_size = create_read_size(
+                    read_buffer_size, last_byte - offset + 1
+                )
+                for data in iter_body(response, read_size):
+                    writer.write(offset, data)
+                    offset += len(data)
+                    with reporter_lock:
+                        reporter.bytes_written(len(data))
+            except Exception, instance:
+                bucket.discard_http_connection(http_connection)
+                if not retry_policy.should_retry(instance, attempt_count):
+                    raise
+                log.warn("range %s-%s retry %s at %s after %s" % (
+                    first_byte, last_byte, attempt_count, offset, instance,
+                ))
+                retry_policy.backoff(attempt_count)
+                continue
+
+            bucket.release_http_connection(http_connection)
+
+            if offset <= last_byte:
+                raise IOError("short range %s-%s: got to %s" % (
+                    first_byte, last_byte, offset,
+                ))
+
+    error = None
+    try:
+        for job_result in run_jobs(
+            _download_range, compute_ranges(size, part_size), thread_count
+        ):
+            if job_result.exception is not None:
+                error = job_result.exception
+                break
+    finally:
+        writer.close()
+
+    if error is not None:
+        log.error("range download failed: %s" % (error, ))
+        raise error
+
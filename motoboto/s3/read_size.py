@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+read_size.py
+
+how much to ask of an HTTP response body on each read
+
+A bucket, or a single get_contents_* call, takes read_buffer_size:
+None for the default of 64K, a number of bytes, or "adaptive" to start
+at the default and follow the measured throughput.
+"""
+import time
+
+adaptive = "adaptive"
+
+_default_read_buffer_size = 64 * 1024
+_min_read_buffer_size = 16 * 1024
+_max_read_buffer_size = 4 * 1024 * 1024
+
+# an adaptive read aims to take about this long: long enough that the
+# per read overhead in Python is small, short enough that progress
+# callbacks and writes keep flowing
+_target_read_seconds = 0.01
+
+def validate_read_buffer_size(read_buffer_size):
+    """
+    return read_buffer_size if it is one we understand,
+    raise ValueError if not
+    """
+    if read_buffer_size is None or read_buffer_size == adaptive:
+        return read_buffer_size
+    if not isinstance(read_buffer_size, (int, long, )) \
+    or read_buffer_size <= 0:
+        raise ValueError(
+            "read_buffer_size must be None, %r or a number of bytes, "
+            "not %r" % (adaptive, read_buffer_size, )
+        )
+    return read_buffer_size
+
+def create_read_size(read_buffer_size, content_length=None):
+    """
+    return a FixedReadSize or an AdaptiveReadSize for one response body
+    """
+    if read_buffer_size == adaptive:
+        return AdaptiveReadSize(content_length)
+    if read_buffer_size is None:
+        read_buffer_size = _default_read_buffer_size
+    return FixedReadSize(read_buffer_size)
+
+class FixedReadSize(object):
+    """
+    the same read size every time
+    """
+    def __init__(self, size):
+        self.size = size
+
+    def record(self, bytes_read, seconds):
+        pass
+
+class AdaptiveReadSize(object):
+    """
+    a read size that follows throughput: after each read we aim for
+    the next to take about _target_read_seconds, changing the size by
+    at most a factor of 2 at a time and keeping it a power of 2,
+    between min_size and max_size.
+
+    A known content_length caps the size, so a small body is read at
+    once, without the size growing past what is left.
+    """
+    def __init__(
+        self,
+        content_length=None,
+        min_size=_min_read_buffer_size,
+        max_size=_max_read_buffer_size,
+        target_seconds=_target_read_seconds
+    ):
+        self._min_size = min_size
+        self._max_size = max_size
+        self._target_seconds = target_seconds
+        self._remaining = content_length
+        self._size = min(max(_default_read_buffer_size, min_size), max_size)
+
+    @property
+    def size(self):
+        if self._remaining is not None and self._remaining > 0:
+            return min(self._size, self._remaining)
+        return self._size
+
+    def record(self, bytes_read, seconds):
+        """
+        a read asked for size bytes, got bytes_read in seconds
+        """
+        if self._remaining is not None:
+            self._remaining = max(self._remaining - bytes_read, 0)
+
+        # a short read is the end of the body (or of what the socket
+        # had), which tells us nothing about a bigger one
+        if bytes_read < self._size:
+            return
+
+        if seconds < self._target_seconds / 2.0:
+            self._size = min(self._size * 2, self._max_size)
+        elif seconds > self._target_seconds * 2.0:
+            self._size = max(self._size // 2, self._min_size)
+
+def iter_body(response, read_size):
+    """
+    generate the response body in reads of read_size.size bytes,
+    telling read_size how long each took
+    """
+    while True:
+        start_time = time.time()
+        data = response.read(read_size.size)
+        if len(data) == 0:
+            return
+        read_size.record(len(data), time.time() - start_time)
+        yield data
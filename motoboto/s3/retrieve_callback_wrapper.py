@@ -4,6 +4,7 @@ retrieve_callback_wrapper.py
 
 class RetrieveCallbackWrapper
 """
+from motoboto.s3.callback_throttle import CallbackThrottle
 
 class NullCallbackWrapper(object):
     """
@@ -23,22 +24,20 @@ class NullCallbackWrapper(object):
 
 class RetrieveCallbackWrapper(object):
     """
+    wrap a boto style callback for retrieve progress reporting
+
+    We call back at start, then at most cb_count times evenly spaced 
+    over size, then at finish if the last call did not report the end.
     """
     def __init__(self, size, cb, cb_count):
-        self._size = size
-        self._callback = cb
-        self._callback_count = cb_count
-        self._total_bytes_written = 0
+        self._throttle = CallbackThrottle(cb, size, cb_count)
 
     def start(self):
-        self._callback(self._total_bytes_written, self._size)
+        self._throttle.start()
 
     def bytes_written(self, bytes_written):
-        self._total_bytes_written += bytes_written
-        # TODO: use callback_count
-        self._callback(self._total_bytes_written, self._size)
+        self._throttle.add(bytes_written)
 
     def finish(self):
-        self._callback(self._total_bytes_written, self._size)
+        self._throttle.finish()
 
-        
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+transfer_manager.py
+
+class TransferManager
+
+upload or download many keys on a bounded pool of threads
+"""
+import logging
+import time
+
+from motoboto.retry import RetryPolicy
+from motoboto.s3.key import Key
+from motoboto.worker_pool import run_jobs
+
+_default_thread_count = 8
+_default_retry_count = 2
+_default_retry_delay = 1.0
+
+class TransferSummary(object):
+    """
+    what a bulk transfer did
+
+    failures is a list of (job, exception)
+    """
+    def __init__(self):
+        self.job_count = 0
+        self.succeeded = 0
+        self.bytes_transferred = 0
+        self.elapsed_seconds = 0.0
+        self.failures = list()
+
+    @property
+    def failed(self):
+        return len(self.failures)
+
+    @property
+    def bytes_per_second(self):
+        if self.elapsed_seconds == 0.0:
+            return 0.0
+        return self.bytes_transferred / self.elapsed_seconds
+
+    @property
+    def jobs_per_second(self):
+        if self.elapsed_seconds == 0.0:
+            return 0.0
+        return self.job_count / self.elapsed_seconds
+
+    def __repr__(self):
+        return "<TransferSummary %s ok, %s failed, %s bytes in %.3fs>" % (
+            self.succeeded,
+            self.failed,
+            self.bytes_transferred,
+            self.elapsed_seconds,
+        )
+
+class TransferManager(object):
+    """
+    upload or download many keys on a bounded pool of threads
+
+    Jobs are (source, key_name) for upload and (destination, key_name)
+    for download. A source or destination is a local path or a file-like
+    object; an upload source may also be a bytearray or memoryview.
+    Jobs are taken from the iterable only as threads come free, so it
+    can be a lazy generator.
+
+    A job that fails with a server error or a socket error is retried
+    retry_count times, with jittered backoff from retry_delay (or as
+    retry_policy says). After each job, cb(jobs_done, bytes_done) is
+    called from the caller's thread.
+    """
+    def __init__(
+        self,
+        bucket,
+        thread_count=_default_thread_count,
+        max_pending=None,
+        retry_count=_default_retry_count,
+        retry_delay=_default_retry_delay,
+        cb=None,
+        retry_policy=None
+    ):
+        self._log = logging.getLogger("TransferManager(%s)" % (
+            bucket.name,
+        ))
+        self._bucket = bucket
+        self._thread_count = thread_count
+        self._max_pending = max_pending
+        if retry_policy is None:
+            retry_policy = RetryPolicy(
+                max_attempts=retry_count + 1, base_delay=retry_delay
+            )
+        self._retry_policy = retry_policy
+        self._callback = cb
+
+    def upload(self, jobs):
+        """
+        store each (source, key_name), return a TransferSummary
+        """
+        return self._run(self._upload_one, jobs)
+
+    def download(self, jobs):
+        """
+        retrieve each (destination, key_name), return a TransferSummary
+        """
+        return self._run(self._download_one, jobs)
+
+    def _run(self, function, jobs):
+        summary = TransferSummary()
+        start_time = time.time()
+
+        for job_result in run_jobs(
+            lambda job: self._with_retry(function, job),
+            jobs,
+            self._thread_count,
+            self._max_pending
+        ):
+            summary.job_count += 1
+            if job_result.exception is None:
+                summary.succeeded += 1
+                summary.bytes_transferred += job_result.result
+            else:
+                self._log.error("%r failed: %s" % (
+                    job_result.job, job_result.exception,
+                ))
+                summary.failures.append(
+                    (job_result.job, job_result.exception, )
+                )
+            if self._callback is not None:
+                self._callback(summary.job_count, summary.bytes_transferred)
+
+        summary.elapsed_seconds = time.time() - start_time
+        return summary
+
+    def _with_retry(self, function, job):
+        # a file-like object goes back to where it was for each retry
+        file_object = job[0] if hasattr(job[0], "seek") else None
+        if file_object is not None:
+            position = file_object.tell()
+
+        attempt_count = 0
+        while True:
+            attempt_count += 1
+            try:
+                return function(job)
+            except Exception, instance:
+                if not self._retry_policy.should_retry(
+                    instance, attempt_count
+                ):
+                    raise
+                self._log.warn("%r retry %s after %s" % (
+                    job, attempt_count, instance,
+                ))
+                self._retry_policy.backoff(attempt_count)
+                if file_object is not None:
+                    file_object.seek(position)
+
+    def _upload_one(self, job):
+        source, key_name = job
+        key = Key(bucket=self._bucket, name=key_name)
+
+        if isinstance(source, basestring):
+            with open(source, "rb") as input_file:
+                key.set_contents_from_file(input_file)
+                return input_file.tell()
+
+        if hasattr(source, "read"):
+            position = source.tell()
+            key.set_contents_from_file(source)
+            return source.tell() - position
+
+        # a bytearray or memoryview
+        if isinstance(source, memoryview):
+            data = source.tobytes()
+        else:
+            data = str(source)
+        key.set_contents_from_string(data)
+        return len(data)
+
+    def _download_one(self, job):
+        destination, key_name = job
+        key = Key(bucket=self._bucket, name=key_name)
+
+        if isinstance(destination, basestring):
+            with open(destination, "wb") as output_file:
+                key.get_contents_to_file(output_file)
+                return output_file.tell()
+
+        position = destination.tell()
+        key.get_contents_to_file(destination)
+        bytes_written = destination.tell() - position
+        # a retry may have left more behind than this try wrote
+        if hasattr(destination, "truncate"):
+            destination.truncate()
+        return bytes_written
+
@@ -6,53 +6,98 @@ Emulate the functions of the object returned by boto.connect_s3
 """
 import json
 import logging
+import threading
 
-from lumberyard.http_connection import HTTPConnection, LumberyardHTTPError
+from lumberyard.http_connection import LumberyardHTTPError
 from lumberyard.http_util import compute_default_hostname, \
         compute_default_collection_name, \
         compute_uri
 
-from motoboto.config import load_config_from_environment, load_config_from_file
+from motoboto.config import load_config
+from motoboto.connection_pool import ConnectionPool
 from motoboto.s3.bucket import Bucket
 
 class S3Emulator(object):
     """
     Emulate the functions of the object returned by boto.connect_s3
+
+    All HTTP traffic goes through one keep-alive ConnectionPool, shared
+    with every Bucket (and so every Key) that we hand out. Pass
+    connection_pool to tune it, or to share it between emulators.
+
+    Pass a MetadataCache as metadata_cache, or a ContentCache as
+    content_cache, to share it between every Bucket, so hot metadata 
+    and contents reads stay off the network.
+
+    Pass a RetryPolicy as retry_policy to retry idempotent requests,
+    and a HedgePolicy as hedge_policy to hedge slow reads; we register
+    the hedge policy's collector as a request hook. Pass a codec name
+    as codec to compress what every Bucket writes, and dedup=True to
+    store files deduplicated. read_buffer_size is passed to every
+    Bucket.
+
+    We keep one Bucket object per collection, so get_bucket,
+    create_bucket and get_all_buckets hand out the same handle each
+    time, and get_bucket needs no request unless asked to validate.
     """
-    def __init__(self, config=None):
+    def __init__(
+        self, 
+        config=None, 
+        connection_pool=None, 
+        metadata_cache=None, 
+        content_cache=None,
+        retry_policy=None,
+        hedge_policy=None,
+        codec=None,
+        dedup=False,
+        read_buffer_size=None
+    ):
         self._log = logging.getLogger("S3Emulator")
 
         if config is not None:
             self._config = config
         else:
-            config = load_config_from_environment()
-            if config is not None:
-                self._config = config
-            else:
-                config = load_config_from_file()
-                if config is not None:
-                    self._config = config
-                else:
-                    raise ValueError(
-                        "You must specify config in environment of file"
-                    )
-
-        self._default_bucket = Bucket(
-            self._config, 
+            self._config = load_config()
+
+        if connection_pool is None:
+            connection_pool = ConnectionPool(self._config)
+        self._connection_pool = connection_pool
+        self._metadata_cache = metadata_cache
+        self._content_cache = content_cache
+        self._retry_policy = retry_policy
+        self._hedge_policy = hedge_policy
+        self._codec = codec
+        self._dedup = dedup
+        self._read_buffer_size = read_buffer_size
+        if hedge_policy is not None:
+            self.add_request_hook(hedge_policy.collector)
+
+        self._buckets_lock = threading.Lock()
+        self._buckets = dict()
+
+        self._default_bucket = self._get_bucket_object(
             compute_default_collection_name(self._config.user_name)
         )
 
     def close(self):
         self._log.debug("closing")
+        self._connection_pool.close()
+
+    def add_request_hook(self, hook):
+        """
+        call the RequestHook (see motoboto.instrumentation) around every
+        request made through us, our buckets and their keys
+        """
+        self._connection_pool.add_hook(hook)
+
+    def remove_request_hook(self, hook):
+        self._connection_pool.remove_hook(hook)
 
     def create_bucket(self, bucket_name):
         method = "POST"
 
-        http_connection = HTTPConnection(
-            compute_default_hostname(),
-            self._config.user_name,
-            self._config.auth_key,
-            self._config.auth_key_id
+        http_connection = self._connection_pool.acquire(
+            compute_default_hostname()
         )
         uri = compute_uri(
             "/".join(["customers", self._config.user_name, "collections"]), 
@@ -63,56 +108,90 @@ class S3Emulator(object):
         self._log.info("requesting %s" % (uri, ))
         try:
             response = http_connection.request(method, uri, body=None)
+            response.read()
         except LumberyardHTTPError, instance:
             self._log.error(str(instance))
-            http_connection.close()
+            self._connection_pool.discard(http_connection)
+            raise
+        except Exception:
+            self._connection_pool.discard(http_connection)
             raise
         
-        response.read()
-        http_connection.close()
-
-        return Bucket(self._config, bucket_name.decode("utf-8"))
+        self._connection_pool.release(http_connection)
+
+        return self._get_bucket_object(bucket_name.decode("utf-8"))
+
+    def get_bucket(self, bucket_name, validate=False):
+        """
+        return the Bucket object for bucket_name, without a request
+        unless validate is True. Then we ask the server about the
+        collection first, raising LumberyardHTTPError (404) if it does
+        not exist.
+        """
+        if isinstance(bucket_name, str):
+            bucket_name = bucket_name.decode("utf-8")
+        with self._buckets_lock:
+            bucket = self._buckets.get(bucket_name)
+        if bucket is not None and not validate:
+            return bucket
+
+        if bucket is None:
+            bucket = self._create_bucket_object(bucket_name)
+        if validate:
+            bucket.get_space_used()
+
+        with self._buckets_lock:
+            return self._buckets.setdefault(bucket_name, bucket)
 
     def get_all_buckets(self):
         method = "GET"
-
-        http_connection = HTTPConnection(
-            compute_default_hostname(),
-            self._config.user_name,
-            self._config.auth_key,
-            self._config.auth_key_id
-        )
         uri = compute_uri(
             "/".join(["customers", self._config.user_name, "collections"]), 
         )
 
+        if self._retry_policy is None:
+            data = self._list_collections(method, uri)
+        else:
+            data = self._retry_policy.call(
+                lambda: self._list_collections(method, uri),
+                " ".join([method, uri])
+            )
+        collection_list = json.loads(data)
+
+        bucket_list = list()
+        for collection_name, _timestamp in collection_list:
+            bucket_list.append(
+                self._get_bucket_object(collection_name.decode("utf-8"))
+            )
+        return bucket_list
+
+    def _list_collections(self, method, uri):
+        http_connection = self._connection_pool.acquire(
+            compute_default_hostname()
+        )
+
         self._log.info("requesting %s" % (uri, ))
         try:
             response = http_connection.request(method, uri, body=None)
+            self._log.info("reading response")
+            data = response.read()
         except LumberyardHTTPError, instance:
             self._log.error(str(instance))
-            http_connection.close()
+            self._connection_pool.discard(http_connection)
+            raise
+        except Exception:
+            self._connection_pool.discard(http_connection)
             raise
         
-        self._log.info("reading response")
-        data = response.read()
-        http_connection.close()
-        collection_list = json.loads(data)
+        self._connection_pool.release(http_connection)
 
-        bucket_list = list()
-        for collection_name, _timestamp in collection_list:
-            bucket = Bucket(self._config, collection_name.decode("utf-8"))
-            bucket_list.append(bucket)
-        return bucket_list
+        return data
 
     def delete_bucket(self, bucket_name):
         method = "DELETE"
 
-        http_connection = HTTPConnection(
-            compute_default_hostname(),
-            self._config.user_name,
-            self._config.auth_key,
-            self._config.auth_key_id
+        http_connection = self._connection_pool.acquire(
+            compute_default_hostname()
         )
 
         if bucket_name.startswith("/"):
@@ -129,11 +208,44 @@ class S3Emulator(object):
         self._log.info("requesting %s" % (uri, ))
         try:
             response = http_connection.request(method, uri, body=None)
+            response.read()
         except LumberyardHTTPError, instance:
             self._log.error(str(instance))
-            http_connection.close()
+            self._connection_pool.discard(http_connection)
+            raise
+        except Exception:
+            self._connection_pool.discard(http_connection)
             raise
         
-        response.read()
-        http_connection.close()
-
+        self._connection_pool.release(http_connection)
+
+        if isinstance(bucket_name, str):
+            bucket_name = bucket_name.decode("utf-8")
+        with self._buckets_lock:
+            self._buckets.pop(bucket_name, None)
+
+    def _get_bucket_object(self, collection_name):
+        """
+        return our Bucket object for the collection, creating it
+        the first time
+        """
+        with self._buckets_lock:
+            bucket = self._buckets.get(collection_name)
+            if bucket is None:
+                bucket = self._create_bucket_object(collection_name)
+                self._buckets[collection_name] = bucket
+            return bucket
+
+    def _create_bucket_object(self, collection_name):
+        return Bucket(
+            self._config, 
+            collection_name, 
+            self._connection_pool,
+            self._metadata_cache,
+            self._content_cache,
+            self._retry_policy,
+            self._hedge_policy,
+            self._codec,
+            self._dedup,
+            self._read_buffer_size
+        )
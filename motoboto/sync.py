@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+sync.py
+
+mirror a local directory tree into a bucket, sending only what changed
+"""
+import json
+import logging
+import os
+import os.path
+import time
+import uuid
+
+from motoboto.s3.dedup import chunk_prefix
+from motoboto.s3.key import compute_md5
+
+_default_thread_count = 8
+
+# the state index lives in the tree it describes, and is never synced
+state_file_name = ".motoboto-sync-state"
+
+class SyncResult(object):
+    """
+    what a sync did, or with dry_run, would do
+
+    uploaded and deleted are lists of key names, failures is a list of
+    (key_name, exception) for uploads and (key_name, multi_delete.Error)
+    for deletes
+    """
+    def __init__(self):
+        self.uploaded = list()
+        self.deleted = list()
+        self.unchanged = 0
+        self.bytes_uploaded = 0
+        self.elapsed_seconds = 0.0
+        self.failures = list()
+
+    def __repr__(self):
+        return "<SyncResult %s uploaded, %s deleted, %s unchanged, " \
+               "%s failed in %.3fs>" % (
+            len(self.uploaded),
+            len(self.deleted),
+            self.unchanged,
+            len(self.failures),
+            self.elapsed_seconds,
+        )
+
+class SyncState(object):
+    """
+    the md5 of each local file, by relative path, with the size and mtime
+    it had when we hashed it: a file whose size and mtime have not
+    changed is not hashed again.
+    """
+    def __init__(self, path=None):
+        self._log = logging.getLogger("SyncState")
+        self._path = path
+        self._entries = dict()
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path) as input_file:
+                    self._entries = json.load(input_file)
+            except (IOError, ValueError, ), instance:
+                self._log.warn("ignoring unreadable state %s %s" % (
+                    path, instance,
+                ))
+
+    def compute_md5(self, local_path, relative_path, size, mtime):
+        """
+        return the hex md5 of the file, from the index if it is current
+        """
+        entry = self._entries.get(relative_path)
+        if entry is not None \
+        and entry["size"] == size and entry["mtime"] == mtime:
+            return entry["md5"]
+
+        with open(local_path, "rb") as input_file:
+            hex_digest, _, _ = compute_md5(input_file)
+        self._entries[relative_path] = {
+            "size"      : size,
+            "mtime"     : mtime,
+            "md5"       : hex_digest,
+        }
+        return hex_digest
+
+    def retain(self, relative_paths):
+        """
+        forget every file not in relative_paths
+        """
+        for relative_path in self._entries.keys():
+            if relative_path not in relative_paths:
+                del self._entries[relative_path]
+
+    def save(self):
+        """
+        write the index atomically, if we have a path
+        """
+        if self._path is None:
+            return
+        temp_path = "%s.%s.tmp" % (self._path, uuid.uuid4().hex, )
+        with open(temp_path, "w") as output_file:
+            json.dump(self._entries, output_file)
+        os.rename(temp_path, self._path)
+
+def _walk(directory):
+    """
+    generate (relative_path, local_path, size, mtime) for every file
+    in the tree, relative paths separated by "/"
+    """
+    for dir_path, dir_names, file_names in os.walk(directory):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            local_path = os.path.join(dir_path, file_name)
+            relative_path = os.path.relpath(local_path, directory)
+            relative_path = relative_path.replace(os.sep, "/")
+            if isinstance(relative_path, str):
+                # key names from the listing are unicode
+                relative_path = relative_path.decode("utf-8")
+            if relative_path == state_file_name:
+                continue
+            stat_result = os.stat(local_path)
+            yield relative_path, local_path, \
+                  stat_result.st_size, stat_result.st_mtime
+
+def sync_directory(
+    bucket,
+    directory,
+    prefix="",
+    delete=False,
+    state_path=None,
+    thread_count=_default_thread_count,
+    dry_run=False
+):
+    """
+    upload each file under directory whose key (prefix + relative path)
+    is missing from the bucket or differs in size or md5; with delete,
+    delete keys under prefix that have no local file. Return a SyncResult.
+
+    Remote sizes and etags come from the bucket listing. Local md5s
+    come from a state index (default: a file in the top of directory)
+    so unchanged files are not read again. Uploads go on thread_count
+    pooled connections.
+    """
+    log = logging.getLogger("sync_directory(%s)" % (bucket.name, ))
+    result = SyncResult()
+    start_time = time.time()
+
+    if state_path is None:
+        state_path = os.path.join(directory, state_file_name)
+    state = SyncState(state_path)
+
+    remote_keys = dict()
+    for key in bucket.list(prefix=prefix):
+        # the chunks of deduplicated keys are not ours to delete
+        if key.name.startswith(chunk_prefix):
+            continue
+        remote_keys[key.name] = key
+
+    upload_jobs = list()
+    upload_sizes = dict()
+    relative_paths = set()
+    for relative_path, local_path, size, mtime in _walk(directory):
+        relative_paths.add(relative_path)
+        key_name = "".join([prefix, relative_path])
+        remote_key = remote_keys.pop(key_name, None)
+        if remote_key is not None and remote_key.size == size \
+        and remote_key.etag is not None \
+        and remote_key.etag == state.compute_md5(
+            local_path, relative_path, size, mtime
+        ):
+            result.unchanged += 1
+            continue
+        upload_jobs.append((local_path, key_name, ))
+        upload_sizes[key_name] = size
+
+    state.retain(relative_paths)
+    state.save()
+
+    delete_names = sorted(remote_keys.keys()) if delete else []
+    log.info("%s to upload, %s to delete, %s unchanged" % (
+        len(upload_jobs), len(delete_names), result.unchanged,
+    ))
+
+    if dry_run:
+        result.uploaded = [name for _, name in upload_jobs]
+        result.deleted = delete_names
+        result.elapsed_seconds = time.time() - start_time
+        return result
+
+    if len(upload_jobs) > 0:
+        summary = bucket.upload_many(upload_jobs, thread_count=thread_count)
+        failed_names = set()
+        for (_, key_name), exception in summary.failures:
+            failed_names.add(key_name)
+            result.failures.append((key_name, exception, ))
+        for _, key_name in upload_jobs:
+            if key_name not in failed_names:
+                result.uploaded.append(key_name)
+                result.bytes_uploaded += upload_sizes[key_name]
+
+    if len(delete_names) > 0:
+        delete_result = bucket.delete_keys(
+            delete_names, quiet=False, thread_count=thread_count
+        )
+        result.deleted = [deleted.key for deleted in delete_result.deleted]
+        for error in delete_result.errors:
+            result.failures.append((error.key, error, ))
+
+    result.elapsed_seconds = time.time() - start_time
+    return result
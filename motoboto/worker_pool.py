@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+worker_pool.py
+
+run jobs on a bounded set of threads
+"""
+from collections import namedtuple
+import logging
+import Queue
+import threading
+
+job_result_template = namedtuple(
+    "JobResult", ["job", "result", "exception"]
+)
+
+_stop = object()
+
+def _worker(function, job_queue, result_queue):
+    log = logging.getLogger("worker_pool")
+    while True:
+        job = job_queue.get()
+        if job is _stop:
+            break
+        try:
+            result = function(job)
+        except Exception, instance:
+            log.debug("job %r failed: %s" % (job, instance, ))
+            result_queue.put(job_result_template(job, None, instance))
+        else:
+            result_queue.put(job_result_template(job, result, None))
+
+def run_jobs(function, jobs, thread_count, max_pending=None):
+    """
+    call function(job) for each job on thread_count threads.
+
+    Yield a JobResult(job, result, exception) for each job, in the order
+    they finish. An exception from a job is reported, not raised.
+
+    We take at most max_pending jobs from the jobs iterable ahead of the
+    caller, so a lazy iterable (reading parts of a file, for example)
+    gets backpressure and bounded memory.
+    """
+    if max_pending is None:
+        max_pending = thread_count * 2
+    assert thread_count > 0
+    assert max_pending >= thread_count
+
+    job_queue = Queue.Queue()
+    result_queue = Queue.Queue()
+
+    threads = list()
+    for _ in range(thread_count):
+        thread = threading.Thread(
+            target=_worker, args=(function, job_queue, result_queue, )
+        )
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    job_iterator = iter(jobs)
+    pending_count = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and pending_count < max_pending:
+                try:
+                    job = job_iterator.next()
+                except StopIteration:
+                    exhausted = True
+                    break
+                job_queue.put(job)
+                pending_count += 1
+
+            if pending_count == 0:
+                break
+
+            job_result = result_queue.get()
+            pending_count -= 1
+            yield job_result
+    finally:
+        # if the caller quits early, jobs already queued still run,
+        # then the workers see the stop markers
+        for _ in threads:
+            job_queue.put(_stop)
+        for thread in threads:
+            thread.join()
+
@@ -12,7 +12,8 @@ _version = "0.0.0"
 _author = "Doug Fort"
 _author_email = "dougfort@spideroak.com"
 _url = "https://spideroak.com"
-_packages = ["motoboto", "motoboto.s3", ]
+_packages = ["motoboto", "motoboto.s3", "motoboto.aio", ]
+_scripts = ["scripts/motoboto", ]
 _classifiers = [
     "Development Status :: 1 - Planning",
     "Intended Audience :: Developers",
@@ -22,7 +23,7 @@ _classifiers = [
     "Topic :: Software Development :: Libraries",
 
 ]
-_requires = ["lumberyard (>=0.1)", ]
+_requires = ["lumberyard (>=0.1)", "trollius", ]
 with open("README.txt") as input_file:
     _long_description = input_file.read()
 
@@ -34,6 +35,7 @@ setup(
     author_email=_author_email,
     url=_url,
     packages=_packages,
+    scripts=_scripts,
     version=_version,
     classifiers=_classifiers,
     requires=_requires
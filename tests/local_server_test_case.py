@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+local_server_test_case.py
+
+what the tests against a LocalServer share
+"""
+import random
+import unittest
+
+from motoboto.config import config_template
+from motoboto.connection_pool import ConnectionPool
+from motoboto.local_server import LocalServer
+from motoboto.s3.bucket import Bucket
+
+config = config_template(
+    user_name="test-user", auth_key_id=1, auth_key="test-key"
+)
+collection_name = "test-collection"
+
+def random_string(size):
+    return "".join([chr(random.randint(0, 255)) for _ in xrange(size)])
+
+class LocalServerTestCase(unittest.TestCase):
+    """
+    a TestCase with a fresh LocalServer for each test
+
+    setUp starts self._server, with a ConnectionPool to it as
+    self._pool and a Bucket for collection_name over that pool as
+    self._bucket. _connect_s3 returns an S3Emulator talking to the
+    server. tearDown closes all of them and stops the server.
+
+    Subclasses that override setUp or tearDown must call ours.
+    Override _create_server to start the server with options.
+    """
+    def _create_server(self):
+        return LocalServer()
+
+    def setUp(self):
+        self._server = self._create_server()
+        self._server.start()
+        self._emulators = list()
+        self._pool = ConnectionPool(
+            config, connection_factory=self._server.connection_factory(config)
+        )
+        self._bucket = Bucket(config, collection_name, self._pool)
+
+    def tearDown(self):
+        for emulator in self._emulators:
+            emulator.close()
+        self._pool.close()
+        self._server.stop()
+
+    def _connect_s3(self, **kwargs):
+        """
+        return an S3Emulator whose requests all go to our server
+        """
+        emulator = self._server.connect_s3(config, **kwargs)
+        self._emulators.append(emulator)
+        return emulator
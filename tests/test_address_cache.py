@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+test_address_cache.py
+
+test AddressCache
+"""
+import socket
+import time
+import unittest
+
+from motoboto.address_cache import AddressCache
+
+class TestAddressCache(unittest.TestCase):
+    """test caching resolved addresses"""
+
+    def test_cached(self):
+        """a second resolve inside the ttl does not ask DNS again"""
+        cache = AddressCache(ttl=60.0)
+        addresses = cache.resolve("localhost", 80)
+        self.assertTrue(len(addresses) > 0)
+        for address, port in addresses:
+            self.assertEqual(port, 80)
+        self.assertTrue(cache.resolve("localhost", 80) is addresses)
+
+    def test_expired(self):
+        """after the ttl, or invalidate, we resolve again"""
+        cache = AddressCache(ttl=0.01)
+        addresses = cache.resolve("localhost", 80)
+        time.sleep(0.02)
+        self.assertFalse(cache.resolve("localhost", 80) is addresses)
+
+        cache = AddressCache(ttl=60.0)
+        addresses = cache.resolve("localhost", 80)
+        cache.invalidate("localhost", 80)
+        self.assertFalse(cache.resolve("localhost", 80) is addresses)
+
+    def test_unknown_host(self):
+        """a name that does not resolve raises, and is not cached"""
+        cache = AddressCache()
+        self.assertRaises(
+            socket.gaierror, cache.resolve, "no-such-host.invalid", 80
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+test_aio.py
+
+test the event loop client against the local server
+"""
+from cStringIO import StringIO
+import unittest
+
+import trollius as asyncio
+from trollius import From
+
+from motoboto.aio.bucket import AsyncBucket
+from motoboto.aio.connection_pool import AsyncConnectionPool
+from motoboto.aio.http_connection import AsyncHTTPConnection
+from motoboto.local_server import LocalServer
+
+from tests.local_server_test_case import collection_name, config
+
+_max_active = 4
+
+class TestAio(unittest.TestCase):
+    """test AsyncBucket and AsyncKey"""
+
+    def setUp(self):
+        self._server = LocalServer()
+        self._server.start()
+        self._loop = asyncio.new_event_loop()
+
+        self._created = list()
+
+        def _factory(hostname):
+            http_connection = AsyncHTTPConnection(
+                hostname, 
+                config, 
+                address=self._server.address, 
+                use_ssl=False, 
+                loop=self._loop
+            )
+            self._created.append(http_connection)
+            return http_connection
+        self._pool = AsyncConnectionPool(
+            config,
+            max_active=_max_active,
+            connection_factory=_factory,
+            loop=self._loop
+        )
+        self._bucket = AsyncBucket(config, collection_name, self._pool)
+
+    def tearDown(self):
+        self._pool.close()
+        # let the loop run the transport closes before it goes away
+        self._run(asyncio.sleep(0, loop=self._loop))
+        self._loop.close()
+        self._server.stop()
+
+    def _run(self, coroutine):
+        return self._loop.run_until_complete(coroutine)
+
+    def test_round_trip(self):
+        """set, list, get, delete"""
+        key = self._bucket.get_key("a-key")
+        self.assertFalse(self._run(key.exists()))
+        self._run(key.set_contents_from_string("hello"))
+        self.assertTrue(self._run(key.exists()))
+
+        read_key = self._bucket.get_key("a-key")
+        self.assertEqual(self._run(read_key.get_contents_as_string()), "hello")
+
+        output_file = StringIO()
+        self._run(read_key.get_contents_to_file(output_file))
+        self.assertEqual(output_file.getvalue(), "hello")
+
+        result_set = self._run(self._bucket.get_all_keys())
+        self.assertEqual([k.name for k in result_set], ["a-key", ])
+        self.assertEqual(result_set[0].size, 5)
+
+        self._run(read_key.delete())
+        self.assertFalse(self._run(key.exists()))
+
+    def test_concurrent(self):
+        """many transfers share one loop and a few connections"""
+        @asyncio.coroutine
+        def _round_trip(index):
+            key = self._bucket.get_key("key-%03d" % (index, ))
+            yield From(key.set_contents_from_file(StringIO("x" * index)))
+            data = yield From(key.get_contents_as_string())
+            self.assertEqual(data, "x" * index)
+
+        done, pending = self._run(asyncio.wait(
+            [_round_trip(n) for n in range(100)], loop=self._loop
+        ))
+        self.assertEqual(len(pending), 0)
+        errors = [t.exception() for t in done if t.exception() is not None]
+        self.assertEqual(errors, [])
+        self.assertTrue(len(self._created) <= _max_active, self._created)
+
+        result_set = self._run(self._bucket.get_all_keys())
+        self.assertEqual(len(result_set), 100)
+
+    def test_acquire_waits(self):
+        """acquire waits for a connection to come back past max_active"""
+        held = [
+            self._run(self._bucket.acquire_http_connection())
+            for _ in range(_max_active)
+        ]
+        waiter = asyncio.async(
+            self._bucket.acquire_http_connection(), loop=self._loop
+        )
+        self._run(asyncio.sleep(0.01, loop=self._loop))
+        self.assertFalse(waiter.done())
+
+        self._pool.discard(held[0])
+        self.assertIsNotNone(self._run(waiter))
+
+        for http_connection in held[1:] + [waiter.result(), ]:
+            self._pool.release(http_connection)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+test_bucket_list.py
+
+test paged key listing against the local server
+"""
+import hashlib
+import unittest
+
+from motoboto.s3.bucket_list_result_set import BucketListResultSet
+from motoboto.s3.key import Key
+from motoboto.s3.prefix import Prefix
+
+from tests.local_server_test_case import LocalServerTestCase
+
+class TestBucketList(LocalServerTestCase):
+    """test get_all_keys and list"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._key_names = list()
+        for directory in ["a", "b", "c", ]:
+            for index in range(5):
+                key_name = "%s/%02d" % (directory, index, )
+                Key(self._bucket, key_name).set_contents_from_string("x")
+                self._key_names.append(key_name)
+        Key(self._bucket, "top").set_contents_from_string("x")
+        self._key_names.append("top")
+
+    def _list_count(self):
+        return len([
+            p for m, p in self._server.request_log 
+            if m == "GET" and p == "/data/"
+        ])
+
+    def test_get_all_keys_pages(self):
+        """max_keys and marker page through the keys"""
+        result_set = self._bucket.get_all_keys(max_keys=7)
+        self.assertEqual(len(result_set), 7)
+        self.assertTrue(result_set.is_truncated)
+        self.assertEqual(result_set.next_marker, "b/01")
+
+        result_set = self._bucket.get_all_keys(
+            max_keys=100, marker=result_set.next_marker
+        )
+        self.assertFalse(result_set.is_truncated)
+        self.assertEqual(
+            [key.name for key in result_set], self._key_names[7:]
+        )
+
+    def test_prefix(self):
+        """prefix filtering happens on the server"""
+        result_set = self._bucket.get_all_keys(prefix="b/")
+        self.assertEqual(
+            [key.name for key in result_set], self._key_names[5:10]
+        )
+
+    def test_list_is_lazy(self):
+        """list fetches a page at a time"""
+        lister = iter(BucketListResultSet(self._bucket, page_size=4))
+        self.assertEqual(lister.next().name, "a/00")
+        self.assertEqual(self._list_count(), 1)
+        self.assertEqual(
+            [key.name for key in lister], self._key_names[1:]
+        )
+        self.assertEqual(self._list_count(), 4)
+
+        self.assertEqual(
+            [key.name for key in self._bucket.list(prefix="c/")], 
+            self._key_names[10:15]
+        )
+
+    def test_delimiter(self):
+        """a delimiter rolls keys up into Prefix objects"""
+        items = list(self._bucket.list(delimiter="/"))
+        prefixes = [item.name for item in items if isinstance(item, Prefix)]
+        keys = [item.name for item in items if isinstance(item, Key)]
+        self.assertEqual(prefixes, ["a/", "b/", "c/", ])
+        self.assertEqual(keys, ["top", ])
+
+    def test_listed_keys_are_populated(self):
+        """listed keys carry size, etag and last_modified"""
+        Key(self._bucket, "sized").set_contents_from_string("x" * 42)
+        key = self._bucket.get_all_keys(prefix="sized")[0]
+        self.assertEqual(key.size, 42)
+        self.assertEqual(key.etag, hashlib.md5("x" * 42).hexdigest())
+        self.assertTrue(key.last_modified is not None)
+
+    def test_refresh(self):
+        """refresh fills the same attributes from one HEAD"""
+        Key(self._bucket, "sized").set_contents_from_string("x" * 42)
+        key = Key(self._bucket, "sized")
+        self.assertEqual(key.size, None)
+        key.refresh()
+        self.assertEqual(key.size, 42)
+        self.assertEqual(key.etag, hashlib.md5("x" * 42).hexdigest())
+        self.assertTrue(key.last_modified is not None)
+
+if __name__ == "__main__":
+    unittest.main()
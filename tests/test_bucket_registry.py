@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+test_bucket_registry.py
+
+test that S3Emulator hands out one Bucket object per collection
+"""
+import unittest
+
+from lumberyard.http_connection import LumberyardHTTPError
+
+from tests.local_server_test_case import LocalServerTestCase, collection_name
+
+class TestBucketRegistry(LocalServerTestCase):
+    """test S3Emulator.get_bucket and the buckets it keeps"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._emulator = self._connect_s3()
+
+    def test_same_handle(self):
+        """create_bucket, get_bucket and get_all_buckets agree"""
+        bucket = self._emulator.create_bucket(collection_name)
+        del self._server.request_log[:]
+        self.assertTrue(self._emulator.get_bucket(collection_name) is bucket)
+        self.assertEqual(self._server.request_log, [])
+
+        buckets = dict([
+            (b.name, b, ) for b in self._emulator.get_all_buckets()
+        ])
+        self.assertTrue(buckets[collection_name] is bucket)
+
+    def test_validate(self):
+        """validate asks the server, and fails for a missing bucket"""
+        bucket = self._emulator.create_bucket(collection_name)
+        del self._server.request_log[:]
+        self.assertTrue(
+            self._emulator.get_bucket(collection_name, validate=True) \
+            is bucket
+        )
+        self.assertEqual(len(self._server.request_log), 1)
+
+        self.assertRaises(
+            LumberyardHTTPError, 
+            self._emulator.get_bucket, 
+            "no-such-collection", 
+            validate=True
+        )
+
+    def test_delete(self):
+        """a deleted bucket's handle is dropped"""
+        bucket = self._emulator.create_bucket(collection_name)
+        self._emulator.delete_bucket(collection_name)
+        self.assertFalse(self._emulator.get_bucket(collection_name) is bucket)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+test_callback_throttle.py
+
+test that progress callbacks honor cb_count
+"""
+import unittest
+
+from motoboto.s3.callback_throttle import CallbackThrottle
+
+class TestCallbackThrottle(unittest.TestCase):
+    """test CallbackThrottle"""
+
+    def setUp(self):
+        self._calls = list()
+
+    def _callback(self, bytes_done, total_size):
+        self._calls.append((bytes_done, total_size, ))
+
+    def test_evenly_spaced(self):
+        """10000 small reads make at most cb_count calls"""
+        throttle = CallbackThrottle(self._callback, 1000000, 10)
+        for _ in range(10000):
+            throttle.add(100)
+        throttle.finish()
+        self.assertEqual(len(self._calls), 10)
+        self.assertEqual(self._calls[0], (100000, 1000000, ))
+        self.assertEqual(self._calls[-1], (1000000, 1000000, ))
+
+    def test_final_callback(self):
+        """the end is reported even if it falls short of a step"""
+        throttle = CallbackThrottle(self._callback, 1000, 3)
+        throttle.start()
+        throttle.add(200)
+        throttle.add(200)
+        throttle.finish()
+        self.assertEqual(self._calls, [(0, 1000), (400, 1000), ])
+
+    def test_unknown_size(self):
+        """without a size, calls are spaced by doubling"""
+        throttle = CallbackThrottle(self._callback, None, 10)
+        for _ in range(1024):
+            throttle.add(1)
+        throttle.finish()
+        self.assertEqual(
+            [bytes_done for bytes_done, _ in self._calls],
+            [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, ]
+        )
+
+if __name__ == "__main__":
+    unittest.main()
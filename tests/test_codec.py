@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+test_codec.py
+
+test compressed keys against the local server
+"""
+from cStringIO import StringIO
+import json
+import unittest
+
+from motoboto.s3.codec import codec_meta_key, get_codec
+from motoboto.s3.key import Key
+
+from tests.local_server_test_case import LocalServerTestCase, collection_name
+
+_test_data = json.dumps(
+    [{"line" : n, "message" : "something happened"} for n in range(20000)]
+)
+
+class TestCodec(LocalServerTestCase):
+    """test compressed keys"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._emulator = self._connect_s3()
+        self._bucket = self._emulator.create_bucket(collection_name)
+
+    def test_unknown_codec(self):
+        """an unknown codec name is a ValueError"""
+        self.assertRaises(ValueError, get_codec, "no-such-codec")
+        self.assertRaises(
+            ValueError, 
+            Key(self._bucket, "test-key").set_contents_from_string,
+            _test_data,
+            codec="no-such-codec"
+        )
+
+    def test_round_trip(self):
+        """each codec stores less and reads back the same"""
+        for codec_name in ["zlib", "gzip", "bz2", ]:
+            key = Key(self._bucket, "test-key-%s" % (codec_name, ))
+            key.set_contents_from_file(StringIO(_test_data), codec=codec_name)
+            stored = self._server.get_data("test-collection", key.name)
+            self.assertTrue(len(stored) < len(_test_data) / 5)
+            self.assertEqual(key.get_metadata(codec_meta_key), codec_name)
+
+            # a fresh key learns the codec from a listing
+            listed_key, = self._bucket.get_all_keys(prefix=key.name)
+            self.assertEqual(listed_key.get_contents_as_string(), _test_data)
+
+            output_file = StringIO()
+            listed_key.get_contents_to_file(output_file)
+            self.assertEqual(output_file.getvalue(), _test_data)
+
+    def test_fresh_key(self):
+        """a fresh Key looks up the codec, though the bucket has none"""
+        Key(self._bucket, "test-key").set_contents_from_string(
+            _test_data, codec="gzip"
+        )
+        self.assertEqual(
+            Key(self._bucket, "test-key").get_contents_as_string(), _test_data
+        )
+        output_file = StringIO()
+        Key(self._bucket, "test-key").get_contents_to_file(output_file)
+        self.assertEqual(output_file.getvalue(), _test_data)
+        self.assertEqual("".join(Key(self._bucket, "test-key")), _test_data)
+
+    def test_streaming_read(self):
+        """read and iteration decompress as they go"""
+        key = Key(self._bucket, "test-key")
+        key.set_contents_from_string(_test_data, codec="gzip")
+
+        self.assertEqual("".join(key.iter_content(1000)), _test_data)
+
+        chunks = list()
+        while True:
+            data = key.read(4096)
+            if len(data) == 0:
+                break
+            self.assertTrue(len(data) <= 4096)
+            chunks.append(data)
+        self.assertEqual("".join(chunks), _test_data)
+
+        self.assertRaises(ValueError, key.open)
+        self.assertRaises(
+            ValueError, 
+            key.get_contents_as_string, 
+            headers={"Range" : "bytes=0-9"}
+        )
+
+    def test_bucket_codec(self):
+        """a bucket codec compresses writes and looks up reads"""
+        emulator = self._connect_s3(codec="zlib")
+        bucket = emulator.create_bucket("codec-collection")
+        Key(bucket, "test-key").set_contents_from_string(_test_data)
+        self._server.populate("codec-collection", ["raw-key"], "raw")
+
+        self.assertEqual(
+            Key(bucket, "test-key").get_contents_as_string(), _test_data
+        )
+        buffer = bytearray(len(_test_data))
+        self.assertEqual(
+            Key(bucket, "test-key").get_contents_into(buffer), 
+            len(_test_data)
+        )
+        self.assertEqual(str(buffer), _test_data)
+        self.assertEqual(
+            Key(bucket, "raw-key").get_contents_as_string(), "raw"
+        )
+
+if __name__ == "__main__":
+    unittest.main()
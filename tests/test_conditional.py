@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+test_conditional.py
+
+test etag, md5 and conditional requests against the local server
+"""
+import email.utils
+import hashlib
+import time
+import unittest
+from cStringIO import StringIO
+
+from motoboto.s3.key import Key, compute_md5
+from motoboto.s3.not_modified import NotModified
+
+from tests.local_server_test_case import LocalServerTestCase
+
+_test_data = "conditional test data"
+
+class TestConditional(LocalServerTestCase):
+    """test conditional requests"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        Key(self._bucket, "test-key").set_contents_from_string(_test_data)
+
+    def _post_count(self):
+        return len([
+            path for method, path in self._server.request_log
+            if method == "POST"
+        ])
+
+    def test_etag_from_get(self):
+        """a GET fills in etag, size and last_modified"""
+        key = Key(self._bucket, "test-key")
+        key.get_contents_as_string()
+        self.assertEqual(key.etag, hashlib.md5(_test_data).hexdigest())
+        self.assertEqual(key.size, len(_test_data))
+        self.assertNotEqual(key.last_modified, None)
+
+    def test_if_none_match(self):
+        """a matching etag gets NotModified, a stale one gets the data"""
+        key = Key(self._bucket, "test-key")
+        headers = {"If-None-Match" : '"%s"' % (
+            hashlib.md5(_test_data).hexdigest(), 
+        )}
+        self.assertRaises(NotModified, key.get_contents_as_string,
+                          headers=headers)
+        self.assertRaises(NotModified, key.get_contents_to_file,
+                          StringIO(), headers=headers)
+
+        headers = {"If-None-Match" : '"stale"'}
+        self.assertEqual(key.get_contents_as_string(headers=headers),
+                         _test_data)
+
+    def test_if_modified_since(self):
+        """If-Modified-Since in the future gets NotModified"""
+        key = Key(self._bucket, "test-key")
+        headers = {
+            "If-Modified-Since" : email.utils.formatdate(
+                time.time() + 3600, usegmt=True
+            )
+        }
+        self.assertRaises(NotModified, key.get_contents_as_string,
+                          headers=headers)
+
+    def test_compute_md5(self):
+        """compute_md5 matches hashlib and leaves the file where it was"""
+        input_file = StringIO("xx" + _test_data)
+        input_file.seek(2)
+        hex_digest, _, size = compute_md5(input_file)
+        self.assertEqual(hex_digest, hashlib.md5(_test_data).hexdigest())
+        self.assertEqual(size, len(_test_data))
+        self.assertEqual(input_file.tell(), 2)
+
+    def test_skip_identical(self):
+        """identical contents are not sent again"""
+        post_count = self._post_count()
+
+        key = Key(self._bucket, "test-key")
+        key.set_contents_from_string(_test_data, skip_identical=True)
+        key.set_contents_from_file(StringIO(_test_data), skip_identical=True)
+        self.assertEqual(self._post_count(), post_count)
+        self.assertEqual(key.md5, hashlib.md5(_test_data).hexdigest())
+
+        key.set_contents_from_string("changed", skip_identical=True)
+        self.assertEqual(self._post_count(), post_count + 1)
+
+        # the same contents with new metadata are sent
+        key.set_metadata("color", "blue")
+        key.set_contents_from_string("changed", skip_identical=True)
+        self.assertEqual(self._post_count(), post_count + 2)
+        key.set_contents_from_string("changed", skip_identical=True)
+        self.assertEqual(self._post_count(), post_count + 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+test_connection_pool.py
+
+test the keep-alive connection pool without touching the network
+"""
+import httplib
+import time
+import unittest
+
+from lumberyard.http_connection import HTTPConnection
+
+from motoboto.connection_pool import ConnectionPool
+
+from tests.local_server_test_case import config
+
+class _FakeConnection(object):
+    def __init__(self, hostname):
+        self.hostname = hostname
+        self.sock = None
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class TestConnectionPool(unittest.TestCase):
+    """test ConnectionPool"""
+
+    def setUp(self):
+        self._created = list()
+
+    def _factory(self, hostname):
+        connection = _FakeConnection(hostname)
+        self._created.append(connection)
+        return connection
+
+    def test_reuse(self):
+        """a released connection is handed out again for the same host"""
+        pool = ConnectionPool(config, connection_factory=self._factory)
+        first = pool.acquire("a.example.com")
+        pool.release(first)
+        second = pool.acquire("a.example.com")
+        self.assertTrue(first is second)
+        other = pool.acquire("b.example.com")
+        self.assertFalse(other is first)
+        self.assertEqual(len(self._created), 2)
+
+    def test_max_size(self):
+        """connections beyond max_size are closed on release"""
+        pool = ConnectionPool(
+            config, max_size=1, connection_factory=self._factory
+        )
+        first = pool.acquire("a.example.com")
+        second = pool.acquire("a.example.com")
+        pool.release(first)
+        pool.release(second)
+        self.assertFalse(first.closed)
+        self.assertTrue(second.closed)
+
+    def test_idle_timeout(self):
+        """a connection idle too long is closed, not reused"""
+        pool = ConnectionPool(
+            config, idle_timeout=0.01, connection_factory=self._factory
+        )
+        first = pool.acquire("a.example.com")
+        pool.release(first)
+        time.sleep(0.05)
+        second = pool.acquire("a.example.com")
+        self.assertFalse(first is second)
+        self.assertTrue(first.closed)
+
+    def test_discard_and_close(self):
+        """discard closes at once, close drains idle and active"""
+        pool = ConnectionPool(config, connection_factory=self._factory)
+        first = pool.acquire("a.example.com")
+        pool.discard(first)
+        self.assertTrue(first.closed)
+        second = pool.acquire("a.example.com")
+        third = pool.acquire("a.example.com")
+        pool.release(second)
+        pool.close()
+        self.assertTrue(second.closed)
+        self.assertTrue(third.closed)
+        self.assertRaises(ValueError, pool.acquire, "a.example.com")
+
+    def test_address_ttl(self):
+        """the address cache is opt in, and refused for HTTPS"""
+        pool = ConnectionPool(config)
+        self.assertEqual(pool._address_cache, None)
+        pool.close()
+        if issubclass(HTTPConnection, httplib.HTTPSConnection):
+            self.assertRaises(
+                ValueError, ConnectionPool, config, address_ttl=60.0
+            )
+        else:
+            ConnectionPool(config, address_ttl=60.0).close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+test_content_cache.py
+
+test the read-through disk cache against the local server
+"""
+import shutil
+import tempfile
+import unittest
+from cStringIO import StringIO
+
+from motoboto.retry import RetryPolicy
+from motoboto.s3.bucket import Bucket
+from motoboto.s3.content_cache import ContentCache
+from motoboto.s3.key import Key
+
+from tests.local_server_test_case import LocalServerTestCase, \
+        collection_name, config
+
+class TestContentCache(LocalServerTestCase):
+    """test ContentCache"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._directory = tempfile.mkdtemp()
+        self._cache = ContentCache(self._directory, max_size=1024)
+        self._bucket = Bucket(
+            config, collection_name, self._pool, content_cache=self._cache
+        )
+        # the same collection, without a cache
+        self._plain_bucket = Bucket(config, collection_name, self._pool)
+
+    def tearDown(self):
+        LocalServerTestCase.tearDown(self)
+        shutil.rmtree(self._directory)
+
+    def test_warm_read_from_disk(self):
+        """a current entry is read from disk, not the server"""
+        Key(self._plain_bucket, "test-key").set_contents_from_string("a" * 10)
+        self.assertEqual(
+            Key(self._bucket, "test-key").get_contents_as_string(), "a" * 10
+        )
+        entry = self._cache.lookup(collection_name, "test-key")
+        self.assertEqual(entry.size, 10)
+
+        # if the bytes come from the server, we see the original
+        with open(entry.path, "wb") as output_file:
+            output_file.write("b" * 10)
+        output_file = StringIO()
+        Key(self._bucket, "test-key").get_contents_to_file(output_file)
+        self.assertEqual(output_file.getvalue(), "b" * 10)
+
+    def test_retried(self):
+        """a 503 is retried, a 304 still reads from disk"""
+        bucket = Bucket(
+            config,
+            collection_name,
+            self._pool,
+            content_cache=self._cache,
+            retry_policy=RetryPolicy(base_delay=0.0)
+        )
+        key = Key(bucket, "test-key")
+        key.set_contents_from_string("a" * 10)
+        self._server.fail_next("GET")
+        self.assertEqual(key.get_contents_as_string(), "a" * 10)
+        self._server.fail_next("GET")
+        self.assertEqual(key.get_contents_as_string(), "a" * 10)
+        self.assertEqual(len(self._cache), 1)
+
+    def test_stale_entry_is_replaced(self):
+        """a change made elsewhere is fetched again"""
+        Key(self._plain_bucket, "test-key").set_contents_from_string("old")
+        Key(self._bucket, "test-key").get_contents_as_string()
+        Key(self._plain_bucket, "test-key").set_contents_from_string("new")
+        self.assertEqual(
+            Key(self._bucket, "test-key").get_contents_as_string(), "new"
+        )
+        self.assertEqual(len(self._cache), 1)
+
+    def test_write_and_delete_invalidate(self):
+        """set_contents and delete through the bucket drop the entry"""
+        key = Key(self._bucket, "test-key")
+        key.set_contents_from_string("data")
+        key.get_contents_as_string()
+        self.assertEqual(len(self._cache), 1)
+        key.set_contents_from_string("more data")
+        self.assertEqual(len(self._cache), 0)
+        self.assertEqual(key.get_contents_as_string(), "more data")
+        key.delete()
+        self.assertEqual(len(self._cache), 0)
+
+    def test_lru_eviction(self):
+        """the least recently used entry goes to stay under max_size"""
+        for name in ["a", "b", "c", ]:
+            Key(self._bucket, name).set_contents_from_string("x" * 400)
+        Key(self._bucket, "a").get_contents_as_string()
+        Key(self._bucket, "b").get_contents_as_string()
+        Key(self._bucket, "a").get_contents_as_string()
+        Key(self._bucket, "c").get_contents_as_string()
+        self.assertEqual(self._cache.size, 800)
+        self.assertEqual(self._cache.lookup(collection_name, "b"), None)
+        self.assertNotEqual(self._cache.lookup(collection_name, "a"), None)
+
+    def test_reload_and_mmap(self):
+        """entries survive into a new ContentCache, and map read only"""
+        Key(self._bucket, "test-key").set_contents_from_string("mapped")
+        Key(self._bucket, "test-key").get_contents_as_string()
+
+        cache = ContentCache(self._directory, max_size=1024)
+        self.assertEqual(len(cache), 1)
+        bucket = Bucket(
+            config, collection_name, self._pool, content_cache=cache
+        )
+        contents = Key(bucket, "test-key").get_contents_as_mmap()
+        self.assertEqual(contents[:], "mapped")
+        contents.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+test_dedup.py
+
+test content defined chunking and deduplicated keys
+"""
+from cStringIO import StringIO
+import os
+import random
+import unittest
+
+import motoboto.s3.dedup
+from motoboto.s3.dedup import chunk_prefix, iter_chunks
+from motoboto.s3.key import Key
+
+from tests.local_server_test_case import LocalServerTestCase, collection_name
+
+_min_size = 4 * 1024
+_average_size = 16 * 1024
+_max_size = 64 * 1024
+
+def _chunks(data):
+    return list(iter_chunks(
+        StringIO(data), 
+        min_size=_min_size, 
+        average_size=_average_size, 
+        max_size=_max_size
+    ))
+
+class TestChunking(unittest.TestCase):
+    """test content defined chunking"""
+
+    def test_sizes(self):
+        """chunks are within bounds and add up to the data"""
+        data = os.urandom(1024 * 1024)
+        chunks = _chunks(data)
+        self.assertEqual("".join(chunks), data)
+        for chunk in chunks[:-1]:
+            self.assertTrue(_min_size <= len(chunk) <= _max_size)
+        self.assertEqual(_chunks(""), [])
+
+    def test_average_size(self):
+        """chunks average about average_size"""
+        chunks = _chunks(os.urandom(4 * 1024 * 1024))
+        average = sum([len(chunk) for chunk in chunks]) / len(chunks)
+        self.assertTrue(
+            0.75 * _average_size < average < 1.25 * _average_size, average
+        )
+
+    def test_insert(self):
+        """an insert only changes the chunks around it"""
+        data = os.urandom(1024 * 1024)
+        changed_data = "".join([
+            data[:500 * 1024], "inserted", data[500 * 1024:]
+        ])
+        chunks = _chunks(data)
+        changed_chunks = _chunks(changed_data)
+        new_chunks = set(changed_chunks) - set(chunks)
+        self.assertTrue(1 <= len(new_chunks) <= 3)
+
+    @unittest.skipIf(motoboto.s3.dedup.numpy is None, "needs numpy")
+    def test_numpy_boundaries(self):
+        """numpy finds the same boundaries as pure Python"""
+        data = os.urandom(1024 * 1024)
+        chunks = _chunks(data)
+        numpy = motoboto.s3.dedup.numpy
+        motoboto.s3.dedup.numpy = None
+        try:
+            self.assertEqual(_chunks(data), chunks)
+        finally:
+            motoboto.s3.dedup.numpy = numpy
+
+class TestDedup(LocalServerTestCase):
+    """test deduplicated keys against the local server"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._emulator = self._connect_s3(dedup=True)
+        self._bucket = self._emulator.create_bucket(collection_name)
+        generator = random.Random(0)
+        self._data = "".join([
+            chr(generator.randint(0, 255)) for _ in xrange(3 * 1024 * 1024)
+        ])
+
+    def _chunk_keys(self):
+        return [
+            key for key in self._bucket.get_all_keys(prefix=chunk_prefix)
+        ]
+
+    def _bytes_posted(self):
+        return sum([
+            len(self._server.get_data("test-collection", key.name))
+            for key in self._chunk_keys()
+        ])
+
+    def test_round_trip(self):
+        """a fresh key reads the chunks back in order"""
+        Key(self._bucket, "image").set_contents_from_file(
+            StringIO(self._data)
+        )
+        self.assertTrue(len(self._chunk_keys()) > 1)
+
+        key = Key(self._bucket, "image")
+        self.assertEqual(key.get_contents_as_string(), self._data)
+        output_file = StringIO()
+        Key(self._bucket, "image").get_contents_to_file(output_file)
+        self.assertEqual(output_file.getvalue(), self._data)
+        self.assertRaises(ValueError, Key(self._bucket, "image").read)
+
+    def test_plain_bucket(self):
+        """a fresh Key finds the manifest, though the bucket has no dedup"""
+        bucket = self._connect_s3().create_bucket("plain-collection")
+        Key(bucket, "image").set_contents_from_file(
+            StringIO(self._data), dedup=True
+        )
+        self.assertTrue(len(bucket.get_all_keys(prefix=chunk_prefix)) > 1)
+        self.assertEqual(
+            Key(bucket, "image").get_contents_as_string(), self._data
+        )
+
+    def test_only_new_chunks_sent(self):
+        """a small change sends a few chunks, an identical file none"""
+        Key(self._bucket, "image").set_contents_from_file(
+            StringIO(self._data)
+        )
+        chunk_count = len(self._chunk_keys())
+
+        Key(self._bucket, "copy").set_contents_from_file(
+            StringIO(self._data)
+        )
+        self.assertEqual(len(self._chunk_keys()), chunk_count)
+
+        changed_data = "".join([
+            self._data[:1024 * 1024], "changed", self._data[1024 * 1024:]
+        ])
+        Key(self._bucket, "image").set_contents_from_file(
+            StringIO(changed_data)
+        )
+        new_chunk_count = len(self._chunk_keys()) - chunk_count
+        self.assertTrue(1 <= new_chunk_count <= 3)
+        self.assertEqual(
+            Key(self._bucket, "image").get_contents_as_string(), changed_data
+        )
+
+    def test_compressed_chunks(self):
+        """a codec applies to each chunk"""
+        data = "some very repetitive text\n" * 200000
+        key = Key(self._bucket, "log")
+        key.set_contents_from_file(StringIO(data), codec="gzip")
+        self.assertTrue(self._bytes_posted() < len(data) / 10)
+        self.assertEqual(
+            Key(self._bucket, "log").get_contents_as_string(), data
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+test_delete_keys.py
+
+test batch delete against the local server
+"""
+import unittest
+
+from motoboto.local_server import LocalServer
+from motoboto.s3.key import Key
+
+from tests.local_server_test_case import LocalServerTestCase
+
+class _DeleteKeysBase(object):
+    bulk_delete = True
+
+    def _create_server(self):
+        return LocalServer(bulk_delete=self.bulk_delete)
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._key_names = ["key-%03d" % (n, ) for n in range(20)]
+        for key_name in self._key_names:
+            Key(self._bucket, key_name).set_contents_from_string("x")
+
+    def test_delete_keys(self):
+        """names and Key objects are deleted, missing keys are not errors"""
+        keys = self._key_names[:10] + [
+            Key(self._bucket, name) for name in self._key_names[10:]
+        ] + ["no-such-key"]
+        result = self._bucket.delete_keys(keys, quiet=False)
+        self.assertEqual(len(result.errors), 0)
+        self.assertEqual(len(result.deleted), 21)
+        self.assertEqual(len(self._bucket.get_all_keys()), 0)
+
+    def test_quiet(self):
+        """quiet reports only errors"""
+        result = self._bucket.delete_keys(self._key_names)
+        self.assertEqual(result.deleted, [])
+        self.assertEqual(result.errors, [])
+
+class TestBulkDelete(_DeleteKeysBase, LocalServerTestCase):
+    """the server takes bulk deletes"""
+
+    def test_one_request(self):
+        """twenty keys go in one request"""
+        self._bucket.delete_keys(self._key_names)
+        deletes = [
+            p for m, p in self._server.request_log 
+            if m == "DELETE" or (m == "POST" and p == "/data/")
+        ]
+        self.assertEqual(len(deletes), 1)
+
+class TestDeleteFallback(_DeleteKeysBase, LocalServerTestCase):
+    """the server does not take bulk deletes"""
+    bulk_delete = False
+
+    def test_errors_reported(self):
+        """a failed DELETE is reported, the rest go on"""
+        self._server.fail_next("DELETE", status=500)
+        result = self._bucket.delete_keys(self._key_names)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(result.errors[0].code, 500)
+        self.assertEqual(len(self._bucket.get_all_keys()), 1)
+
+if __name__ == "__main__":
+    unittest.main()
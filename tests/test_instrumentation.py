@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+test_instrumentation.py
+
+test request hooks and the histogram collector against the local server
+"""
+import unittest
+
+from motoboto.instrumentation import HistogramCollector, LatencyHistogram, \
+        RequestHook, compute_operation
+from motoboto.s3.key import Key
+
+from tests.local_server_test_case import LocalServerTestCase, collection_name
+
+class _RecordingHook(RequestHook):
+    def __init__(self):
+        self.points = list()
+
+    def before_request(self, event):
+        self.points.append(("before_request", event.operation, ))
+
+    def connection_acquired(self, event):
+        self.points.append(("connection_acquired", event.operation, ))
+
+    def first_byte(self, event):
+        self.points.append(("first_byte", event.operation, ))
+
+    def response_complete(self, event):
+        self.points.append(("response_complete", event.operation, ))
+
+    def error(self, event):
+        self.points.append(("error", event.operation, event.status, ))
+
+class TestInstrumentation(LocalServerTestCase):
+    """test request hooks"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._emulator = self._connect_s3()
+        self._bucket = self._emulator.create_bucket(collection_name)
+
+    def test_compute_operation(self):
+        """operations leave out the key name"""
+        self.assertEqual(compute_operation("GET", "/data/a/b"), "GET data")
+        self.assertEqual(compute_operation("GET", "/data/?max_keys=10"),
+                         "GET data/")
+        self.assertEqual(
+            compute_operation("GET", "/data/k?action=get_meta&meta_key=x"),
+            "GET data?get_meta"
+        )
+
+    def test_hook_points(self):
+        """each point fires in order, errors fire error"""
+        hook = _RecordingHook()
+        self._emulator.add_request_hook(hook)
+
+        key = Key(self._bucket, "test-key")
+        key.set_contents_from_string("data")
+        self.assertEqual(hook.points, [
+            ("before_request", "POST data", ),
+            ("connection_acquired", "POST data", ),
+            ("first_byte", "POST data", ),
+            ("response_complete", "POST data", ),
+        ])
+
+        del hook.points[:]
+        self.assertFalse(Key(self._bucket, "no-such-key").exists())
+        self.assertEqual(hook.points[-1], ("error", "HEAD data", 404, ))
+
+        self._emulator.remove_request_hook(hook)
+        del hook.points[:]
+        key.get_contents_as_string()
+        self.assertEqual(hook.points, [])
+
+    def test_histogram_collector(self):
+        """the collector counts operations, bytes and percentiles"""
+        collector = HistogramCollector()
+        self._emulator.add_request_hook(collector)
+
+        for n in range(10):
+            Key(self._bucket, "key-%s" % (n, )).set_contents_from_string(
+                "x" * 100
+            )
+        for key in self._bucket.get_all_keys():
+            key.get_contents_as_string()
+
+        summary = collector.summary()
+        self.assertEqual(summary["POST data"]["count"], 10)
+        self.assertEqual(summary["POST data"]["bytes_sent"], 1000)
+        self.assertEqual(summary["GET data"]["count"], 10)
+        self.assertEqual(summary["GET data"]["bytes_received"], 1000)
+        self.assertEqual(summary["GET data/"]["count"], 1)
+        self.assertTrue(
+            summary["GET data"]["p50"] <= summary["GET data"]["p99"]
+        )
+        self.assertNotEqual(
+            collector.percentile("GET data", 95, phase="first_byte"), None
+        )
+
+    def test_latency_histogram(self):
+        """percentiles are within a bucket of the truth"""
+        histogram = LatencyHistogram()
+        for n in range(1, 1001):
+            histogram.record(n / 1000.0)
+        self.assertAlmostEqual(histogram.percentile(50), 0.5, delta=0.03)
+        self.assertAlmostEqual(histogram.percentile(99), 0.99, delta=0.05)
+        self.assertEqual(histogram.percentile(100), 1.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+test_key_reader.py
+
+test partial reads against the local server
+"""
+import os
+import unittest
+
+from motoboto.s3.key import Key
+
+from tests.local_server_test_case import LocalServerTestCase, random_string
+
+class TestKeyReader(LocalServerTestCase):
+    """test range reads and Key.open"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._test_string = random_string(10 * 1024)
+        Key(self._bucket, "a-key").set_contents_from_string(
+            self._test_string
+        )
+
+    def _get_count(self):
+        return len([m for m, _ in self._server.request_log if m == "GET"])
+
+    def test_range_header(self):
+        """boto style Range headers return part of the key"""
+        key = Key(self._bucket, "a-key")
+        self.assertEqual(
+            key.get_contents_as_string(headers={"Range" : "bytes=10-19"}),
+            self._test_string[10:20]
+        )
+        self.assertEqual(
+            key.get_contents_as_string(headers={"Range" : "bytes=-100"}),
+            self._test_string[-100:]
+        )
+
+    def test_seek_and_read(self):
+        """reads are served from the read ahead buffer"""
+        with Key(self._bucket, "a-key").open(read_ahead=4096) as reader:
+            # open looked up the metadata with one GET
+            self.assertEqual(self._get_count(), 1)
+            self.assertEqual(reader.size, len(self._test_string))
+            self.assertEqual(reader.read(16), self._test_string[:16])
+            self.assertEqual(reader.read(16), self._test_string[16:32])
+            self.assertEqual(self._get_count(), 2)
+
+            reader.seek(-32, os.SEEK_END)
+            self.assertEqual(reader.read(), self._test_string[-32:])
+            self.assertEqual(reader.read(), "")
+            self.assertEqual(self._get_count(), 3)
+
+            reader.seek(4090)
+            self.assertEqual(reader.read(12), self._test_string[4090:4102])
+            self.assertEqual(reader.tell(), 4102)
+
+        self.assertRaises(ValueError, reader.read)
+
+    def test_get_contents_into(self):
+        """contents land in a caller's buffer, which can be reused"""
+        key = Key(self._bucket, "a-key")
+        buffer = bytearray(len(self._test_string) + 100)
+        bytes_read = key.get_contents_into(buffer)
+        self.assertEqual(bytes_read, len(self._test_string))
+        self.assertEqual(str(buffer[:bytes_read]), self._test_string)
+
+        bytes_read = key.get_contents_into(
+            buffer, headers={"Range" : "bytes=0-9"}
+        )
+        self.assertEqual(str(buffer[:bytes_read]), self._test_string[:10])
+
+        self.assertRaises(ValueError, key.get_contents_into, bytearray(10))
+        self.assertEqual(key.get_contents_as_string(), self._test_string)
+
+    def test_streaming(self):
+        """iterate, read and abandon streaming reads"""
+        key = Key(self._bucket, "a-key")
+        chunks = list(key.iter_content(chunk_size=1000))
+        self.assertEqual(len(chunks), 11)
+        self.assertEqual("".join(chunks), self._test_string)
+
+        self.assertEqual("".join(key), self._test_string)
+
+        self.assertEqual(key.read(100), self._test_string[:100])
+        self.assertEqual(key.read(), self._test_string[100:])
+        self.assertEqual(key.read(), self._test_string)
+
+        iterator = key.iter_content(chunk_size=100)
+        self.assertEqual(iterator.next(), self._test_string[:100])
+        iterator.close()
+        self.assertTrue(key.exists())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+test_local_server.py
+
+test the local server's collections, storage and fault injection
+"""
+import shutil
+import tempfile
+import time
+import unittest
+
+from lumberyard.http_connection import LumberyardHTTPError
+
+from motoboto.local_server import LocalServer
+from motoboto.s3.key import Key
+
+from tests.local_server_test_case import collection_name, config
+
+class TestLocalServer(unittest.TestCase):
+    """test LocalServer"""
+
+    def setUp(self):
+        self._servers = list()
+        self._storage_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for local_server, emulator in self._servers:
+            emulator.close()
+            local_server.stop()
+        shutil.rmtree(self._storage_path)
+
+    def _start(self, **kwargs):
+        local_server = LocalServer(**kwargs)
+        local_server.start()
+        emulator = local_server.connect_s3(config)
+        self._servers.append((local_server, emulator, ))
+        return local_server, emulator
+
+    def test_collections(self):
+        """create, list and delete collections, get space usage"""
+        _, emulator = self._start()
+        bucket = emulator.create_bucket(collection_name)
+        Key(bucket, "test-key").set_contents_from_string("data")
+        self.assertEqual(
+            [b.name for b in emulator.get_all_buckets()], ["test-collection"]
+        )
+        space_usage = bucket.get_space_used()
+        self.assertTrue(space_usage["success"])
+        self.assertEqual(
+            space_usage["operational_stats"][0]["success_bytes_in"], 4
+        )
+        emulator.delete_bucket("test-collection")
+        self.assertEqual(emulator.get_all_buckets(), [])
+
+    def test_disk_storage(self):
+        """with storage_path, keys survive a restart"""
+        _, emulator = self._start(storage_path=self._storage_path)
+        bucket = emulator.create_bucket(collection_name)
+        key = Key(bucket, "test-key")
+        key.set_metadata("color", "blue")
+        key.set_contents_from_string("persistent data")
+
+        _, emulator = self._start(storage_path=self._storage_path)
+        bucket = emulator.get_all_buckets()[0]
+        key = Key(bucket, "test-key")
+        self.assertEqual(key.get_contents_as_string(), "persistent data")
+        self.assertEqual(key.get_metadata("color"), "blue")
+
+    def test_error_rate(self):
+        """error_rate=1.0 fails every request"""
+        _, emulator = self._start(error_rate=1.0, seed=0)
+        try:
+            emulator.get_all_buckets()
+        except LumberyardHTTPError, instance:
+            self.assertEqual(instance.status, 503)
+        else:
+            self.fail("expected 503")
+
+    def test_latency_and_bandwidth(self):
+        """latency and bandwidth slow requests down"""
+        _, emulator = self._start(latency=0.05, bandwidth=1024 * 1024)
+        bucket = emulator.create_bucket(collection_name)
+        start_time = time.time()
+        Key(bucket, "test-key").set_contents_from_string("x" * 256 * 1024)
+        Key(bucket, "test-key").get_contents_as_string()
+        self.assertTrue(time.time() - start_time >= 0.6)
+
+if __name__ == "__main__":
+    unittest.main()
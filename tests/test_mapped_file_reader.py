@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+test_mapped_file_reader.py
+
+test uploads of local files from a memory map
+"""
+from cStringIO import StringIO
+import os
+import tempfile
+import unittest
+
+from motoboto.local_server import LocalServer
+from motoboto.s3.key import Key
+from motoboto.s3.mapped_file_reader import create_mapped_file_reader
+
+from tests.local_server_test_case import collection_name, config
+
+class TestMappedFileReader(unittest.TestCase):
+    """test MappedFileReader and the upload path that uses it"""
+
+    def setUp(self):
+        self._test_string = os.urandom(3 * 1024 * 1024 + 17)
+        self._file = tempfile.TemporaryFile()
+        self._file.write(self._test_string)
+        self._file.seek(0)
+
+    def tearDown(self):
+        self._file.close()
+
+    def test_read(self):
+        """reads are slices of the file, from its position"""
+        self._file.seek(100)
+        size = len(self._test_string) - 100
+        reader = create_mapped_file_reader(self._file, size)
+        read_sizes = list()
+        reader.set_callback(read_sizes.append)
+        blocks = list()
+        while True:
+            block = reader.read(8192)
+            if len(block) == 0:
+                break
+            blocks.append(str(block))
+        reader.close()
+        self.assertEqual("".join(blocks), self._test_string[100:])
+        self.assertEqual(sum(read_sizes), size)
+        self.assertEqual(self._file.tell(), len(self._test_string))
+
+    def test_not_mappable(self):
+        """a StringIO or an empty file is not mapped"""
+        self.assertEqual(create_mapped_file_reader(StringIO("abc"), 3), None)
+        self.assertEqual(create_mapped_file_reader(self._file, 0), None)
+
+    def test_upload(self):
+        """a local file uploads intact, reporting progress"""
+        server = LocalServer()
+        server.start()
+        emulator = server.connect_s3(config)
+        try:
+            bucket = emulator.create_bucket(collection_name)
+            progress = list()
+            key = Key(bucket, "a-key")
+            key.set_contents_from_file(
+                self._file, 
+                cb=lambda sent, total: progress.append((sent, total, )),
+                multipart_threshold=None
+            )
+            self.assertEqual(
+                server.get_data(collection_name, "a-key"), self._test_string
+            )
+            self.assertEqual(
+                progress[-1], 
+                (len(self._test_string), len(self._test_string), )
+            )
+            self.assertEqual(self._file.tell(), len(self._test_string))
+        finally:
+            emulator.close()
+            server.stop()
+
+if __name__ == "__main__":
+    unittest.main()
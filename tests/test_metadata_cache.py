@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+test_metadata_cache.py
+
+test the client side metadata cache against the local server
+"""
+import time
+import unittest
+
+from motoboto.s3.bucket import Bucket
+from motoboto.s3.key import Key
+from motoboto.s3.metadata_cache import MetadataCache
+
+from tests.local_server_test_case import LocalServerTestCase, \
+        collection_name, config
+
+class TestMetadataCache(LocalServerTestCase):
+    """test MetadataCache"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._cache = MetadataCache(max_size=2, ttl=60.0)
+        self._bucket = Bucket(
+            config, collection_name, self._pool, self._cache
+        )
+        key = Key(self._bucket, "test-key")
+        key.update_metadata({"color" : "blue", "size" : "large", })
+        key.set_contents_from_string("x")
+
+    def _get_meta_count(self):
+        return len([
+            path for method, path in self._server.request_log
+            if method == "GET" and path == "/data/test-key"
+        ])
+
+    def test_get_all_metadata(self):
+        """all metadata comes back in one request"""
+        metadata = Key(self._bucket, "test-key").get_all_metadata()
+        self.assertEqual(metadata, {"color" : "blue", "size" : "large", })
+        self.assertEqual(self._get_meta_count(), 1)
+
+    def test_fresh_key_is_warm(self):
+        """a new Key for the same name reads from the cache"""
+        self.assertEqual(Key(self._bucket, "test-key").get_metadata("color"),
+                         "blue")
+        self.assertEqual(Key(self._bucket, "test-key").get_metadata("size"),
+                         "large")
+        self.assertRaises(
+            KeyError, Key(self._bucket, "test-key").get_metadata, "weight"
+        )
+        self.assertEqual(self._get_meta_count(), 1)
+        self.assertEqual(self._cache.hits, 2)
+
+    def test_missing_key(self):
+        """a missing key raises KeyError, as it does without the cache"""
+        self.assertRaises(
+            KeyError, Key(self._bucket, "no-such-key").get_metadata, "color"
+        )
+
+    def test_write_invalidates(self):
+        """set_contents and delete drop the cached entry"""
+        Key(self._bucket, "test-key").get_all_metadata()
+
+        key = Key(self._bucket, "test-key")
+        key.set_metadata("color", "red")
+        key.set_contents_from_string("y")
+        self.assertEqual(Key(self._bucket, "test-key").get_metadata("color"),
+                         "red")
+        self.assertEqual(self._get_meta_count(), 2)
+
+        key.delete()
+        self.assertEqual(len(self._cache), 0)
+
+    def test_lru_and_ttl(self):
+        """the least recently used entry goes first, entries expire"""
+        self._cache.put("c", "a", {})
+        self._cache.put("c", "b", {})
+        self._cache.get("c", "a")
+        self._cache.put("c", "c", {})
+        self.assertEqual(self._cache.get("c", "b"), None)
+        self.assertEqual(self._cache.get("c", "a"), {})
+
+        cache = MetadataCache(ttl=0.01)
+        cache.put("c", "a", {})
+        time.sleep(0.02)
+        self.assertEqual(cache.get("c", "a"), None)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+test_multipart_upload.py
+
+test parallel multipart upload against the local server
+"""
+from cStringIO import StringIO
+import unittest
+
+from motoboto.retry import RetryPolicy
+from motoboto.s3.key import Key
+import motoboto.s3.multipart_upload
+
+from tests.local_server_test_case import LocalServerTestCase, \
+        collection_name, random_string
+
+class TestMultipartUpload(LocalServerTestCase):
+    """test multipart upload"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._saved_retry_policy = \
+                motoboto.s3.multipart_upload._part_retry_policy
+        motoboto.s3.multipart_upload._part_retry_policy = \
+                RetryPolicy(max_attempts=4, base_delay=0.0)
+
+    def tearDown(self):
+        motoboto.s3.multipart_upload._part_retry_policy = \
+                self._saved_retry_policy
+        LocalServerTestCase.tearDown(self)
+
+    def test_explicit_parts(self):
+        """the boto style initiate / upload_part / complete sequence"""
+        test_string = random_string(10 * 1024)
+        multipart_upload = self._bucket.initiate_multipart_upload("a-key")
+
+        upload_list = self._bucket.get_all_multipart_uploads()
+        self.assertEqual(len(upload_list), 1)
+        self.assertEqual(upload_list[0].id, multipart_upload.id)
+
+        input_file = StringIO(test_string)
+        multipart_upload.upload_part_from_file(input_file, 1, size=4096)
+        multipart_upload.upload_part_from_file(input_file, 2)
+        key = multipart_upload.complete_upload()
+
+        self.assertEqual(key.name, "a-key")
+        self.assertEqual(
+            self._server.get_data(collection_name, "a-key"), test_string
+        )
+        self.assertEqual(len(self._bucket.get_all_multipart_uploads()), 0)
+
+    def test_automatic_multipart(self):
+        """set_contents_from_file goes multipart above the threshold"""
+        test_string = random_string(100 * 1024 + 17)
+        progress = list()
+
+        key = Key(self._bucket, "big-key")
+        key.set_contents_from_file(
+            StringIO(test_string),
+            cb=lambda sent, total: progress.append((sent, total, )),
+            multipart_threshold=1024,
+            part_size=10 * 1024,
+            thread_count=3
+        )
+
+        self.assertEqual(
+            self._server.get_data(collection_name, "big-key"), test_string
+        )
+        part_posts = [
+            path for method, path in self._server.request_log
+            if method == "POST" and path == "/data/big-key"
+        ]
+        self.assertEqual(len(part_posts), 11)
+        self.assertEqual(progress[-1], (len(test_string), len(test_string)))
+
+    def test_failed_part_is_retried(self):
+        """a part that gets a 503 is sent again, alone"""
+        test_string = random_string(4 * 1024)
+        multipart_upload = self._bucket.initiate_multipart_upload("r-key")
+        self._server.fail_next("POST", count=2)
+        multipart_upload.upload_parts_from_file(
+            StringIO(test_string), 1024, 2
+        )
+        multipart_upload.complete_upload()
+        self.assertEqual(
+            self._server.get_data(collection_name, "r-key"), test_string
+        )
+
+if __name__ == "__main__":
+    unittest.main()
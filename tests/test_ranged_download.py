@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+test_ranged_download.py
+
+test parallel ranged download against the local server
+"""
+from cStringIO import StringIO
+import os
+import tempfile
+import unittest
+
+from motoboto.retry import RetryPolicy
+from motoboto.s3.key import Key
+import motoboto.s3.ranged_download
+from motoboto.s3.ranged_download import compute_ranges
+
+from tests.local_server_test_case import LocalServerTestCase, random_string
+
+class TestRangedDownload(LocalServerTestCase):
+    """test ranged download"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._saved_retry_policy = \
+                motoboto.s3.ranged_download._range_retry_policy
+        motoboto.s3.ranged_download._range_retry_policy = \
+                RetryPolicy(max_attempts=4, base_delay=0.0)
+        self._test_string = random_string(100 * 1024 + 17)
+        Key(self._bucket, "a-key").set_contents_from_string(
+            self._test_string
+        )
+
+    def tearDown(self):
+        motoboto.s3.ranged_download._range_retry_policy = \
+                self._saved_retry_policy
+        LocalServerTestCase.tearDown(self)
+
+    def test_compute_ranges(self):
+        """ranges cover the object with no gaps"""
+        self.assertEqual(compute_ranges(10, 4), [(0, 3), (4, 7), (8, 9)])
+        self.assertEqual(compute_ranges(8, 4), [(0, 3), (4, 7)])
+        self.assertEqual(compute_ranges(0, 4), [])
+
+    def test_to_real_file(self):
+        """a real file is memory mapped and filled in by range"""
+        progress = list()
+        file_handle, path = tempfile.mkstemp()
+        os.close(file_handle)
+        try:
+            with open(path, "w+b") as output_file:
+                Key(self._bucket, "a-key").get_contents_to_file(
+                    output_file,
+                    cb=lambda done, total: progress.append((done, total, )),
+                    thread_count=4,
+                    part_size=8 * 1024
+                )
+                self.assertEqual(output_file.tell(), len(self._test_string))
+            with open(path, "rb") as input_file:
+                self.assertEqual(input_file.read(), self._test_string)
+        finally:
+            os.unlink(path)
+
+        range_gets = [
+            request_path for method, request_path in self._server.request_log
+            if method == "GET"
+        ]
+        # a metadata lookup and 13 ranges
+        self.assertEqual(len(range_gets), 14)
+        self.assertEqual(
+            progress[-1], (len(self._test_string), len(self._test_string))
+        )
+
+    def test_to_file_like_object_with_retry(self):
+        """without a file descriptor we seek and write; 503s are retried"""
+        key = Key(self._bucket, "a-key")
+        # with the metadata known, the failures fall on range GETs
+        key.get_all_metadata()
+        self._server.fail_next("GET", count=2)
+        output_file = StringIO()
+        key.get_contents_to_file(
+            output_file, thread_count=3, part_size=10 * 1024
+        )
+        self.assertEqual(output_file.getvalue(), self._test_string)
+
+if __name__ == "__main__":
+    unittest.main()
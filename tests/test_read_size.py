@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+test_read_size.py
+
+test fixed and adaptive read buffer sizes
+"""
+from cStringIO import StringIO
+import os
+import unittest
+
+from motoboto.s3.key import Key
+from motoboto.s3.read_size import AdaptiveReadSize, create_read_size, \
+        validate_read_buffer_size
+
+from tests.local_server_test_case import LocalServerTestCase, collection_name
+
+class TestAdaptiveReadSize(unittest.TestCase):
+    """test how the adaptive size follows throughput"""
+
+    def test_grow_and_shrink(self):
+        """fast reads double the size, slow reads halve it"""
+        read_size = AdaptiveReadSize(
+            min_size=1024, max_size=8192, target_seconds=1.0
+        )
+        initial_size = read_size.size
+        for _ in range(10):
+            read_size.record(read_size.size, 0.0)
+        self.assertEqual(read_size.size, 8192)
+        for _ in range(10):
+            read_size.record(read_size.size, 10.0)
+        self.assertEqual(read_size.size, 1024)
+        self.assertTrue(initial_size >= 1024)
+
+    def test_short_read(self):
+        """a short read does not change the size"""
+        read_size = AdaptiveReadSize(target_seconds=1.0)
+        size = read_size.size
+        read_size.record(size - 1, 0.0)
+        self.assertEqual(read_size.size, size)
+
+    def test_content_length(self):
+        """we never ask for more than is left"""
+        read_size = AdaptiveReadSize(content_length=1000)
+        self.assertEqual(read_size.size, 1000)
+        read_size.record(600, 0.0)
+        self.assertEqual(read_size.size, 400)
+
+    def test_validate(self):
+        """we accept None, "adaptive" and a positive number"""
+        for value in [None, "adaptive", 1, 1024 * 1024, ]:
+            self.assertEqual(validate_read_buffer_size(value), value)
+        for value in [0, -1, "big", 1.5, ]:
+            self.assertRaises(ValueError, validate_read_buffer_size, value)
+        self.assertEqual(create_read_size(4096).size, 4096)
+
+class TestReadBufferSize(LocalServerTestCase):
+    """test reads with a read_buffer_size against the local server"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._emulator = self._connect_s3(read_buffer_size="adaptive")
+        self._bucket = self._emulator.create_bucket(collection_name)
+        self._test_string = os.urandom(5 * 1024 * 1024 + 3)
+        Key(self._bucket, "a-key").set_contents_from_string(
+            self._test_string
+        )
+
+    def test_reads(self):
+        """every read path returns the contents, whatever the size"""
+        for read_buffer_size in [None, 1000, 1024 * 1024, "adaptive", ]:
+            key = Key(self._bucket, "a-key")
+            self.assertEqual(
+                key.get_contents_as_string(
+                    read_buffer_size=read_buffer_size
+                ),
+                self._test_string
+            )
+            output_file = StringIO()
+            key.get_contents_to_file(
+                output_file, read_buffer_size=read_buffer_size
+            )
+            self.assertEqual(output_file.getvalue(), self._test_string)
+
+    def test_streaming(self):
+        """iteration reads in the bucket's read size"""
+        key = Key(self._bucket, "a-key")
+        chunks = list(key)
+        self.assertEqual("".join(chunks), self._test_string)
+        self.assertTrue(max([len(chunk) for chunk in chunks]) > 64 * 1024)
+
+    def test_bad_size(self):
+        """a bucket rejects a read_buffer_size it does not understand"""
+        self.assertRaises(
+            ValueError, self._connect_s3, read_buffer_size=0
+        )
+
+if __name__ == "__main__":
+    unittest.main()
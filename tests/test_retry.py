@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+test_retry.py
+
+test retry policies and hedged reads against the local server
+"""
+from cStringIO import StringIO
+import time
+import unittest
+
+from lumberyard.http_connection import LumberyardHTTPError
+
+from motoboto.instrumentation import HistogramCollector
+from motoboto.retry import HedgePolicy, RetryBudget, RetryPolicy
+from motoboto.s3.key import Key
+
+from tests.local_server_test_case import LocalServerTestCase, collection_name
+
+class TestRetry(LocalServerTestCase):
+    """test retry policies"""
+
+    def _connect(self, **kwargs):
+        emulator = self._connect_s3(**kwargs)
+        bucket = emulator.create_bucket(collection_name)
+        # the Key that wrote knows its metadata, so its reads make
+        # one GET, with no metadata lookup first
+        self._key = Key(bucket, "test-key")
+        self._key.set_contents_from_string("test data")
+        del self._server.request_log[:]
+        return bucket
+
+    def _count(self, method):
+        return len([m for m, _ in self._server.request_log if m == method])
+
+    def test_compute_delay(self):
+        """the backoff is random, doubling up to max_delay"""
+        policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+        for _ in range(100):
+            self.assertTrue(0.0 <= policy.compute_delay(1) <= 1.0)
+            self.assertTrue(0.0 <= policy.compute_delay(2) <= 2.0)
+            self.assertTrue(0.0 <= policy.compute_delay(10) <= 4.0)
+
+    def test_no_policy(self):
+        """without a retry policy a 503 goes straight to the caller"""
+        bucket = self._connect()
+        self._server.fail_next("GET")
+        self.assertRaises(
+            LumberyardHTTPError, Key(bucket, "test-key").get_contents_as_string
+        )
+        self.assertEqual(self._count("GET"), 1)
+
+    def test_idempotent_retried(self):
+        """GET, HEAD, DELETE and listings are retried after a 503"""
+        bucket = self._connect(
+            retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001)
+        )
+        key = self._key
+
+        self._server.fail_next("GET", count=2)
+        self.assertEqual(key.get_contents_as_string(), "test data")
+        self.assertEqual(self._count("GET"), 3)
+
+        self._server.fail_next("GET")
+        output_file = StringIO()
+        key.get_contents_to_file(output_file)
+        self.assertEqual(output_file.getvalue(), "test data")
+
+        self._server.fail_next("HEAD")
+        self.assertTrue(key.exists())
+
+        self._server.fail_next("GET")
+        self.assertEqual(len(bucket.get_all_keys()), 1)
+
+        self._server.fail_next("DELETE")
+        key.delete()
+        self.assertFalse(key.exists())
+
+    def test_delete_retried_after_success(self):
+        """a 404 on a DELETE retry means an earlier try deleted the key"""
+        bucket = self._connect(
+            retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001)
+        )
+        self.assertRaises(
+            LumberyardHTTPError, Key(bucket, "no-such-key").delete
+        )
+
+        # as if the first DELETE had worked and its response was lost
+        self._server.fail_next("DELETE")
+        Key(bucket, "no-such-key").delete()
+        self.assertEqual(self._count("DELETE"), 3)
+
+    def test_limits(self):
+        """max_attempts, non retryable errors and POST are not retried"""
+        self._connect(
+            retry_policy=RetryPolicy(max_attempts=2, base_delay=0.001)
+        )
+        key = self._key
+
+        self._server.fail_next("GET", count=2)
+        self.assertRaises(LumberyardHTTPError, key.get_contents_as_string)
+        self.assertEqual(self._count("GET"), 2)
+
+        self.assertRaises(KeyError, key.get_metadata, "no-such-meta")
+        self.assertEqual(self._count("GET"), 3)
+
+        self._server.fail_next("POST")
+        self.assertRaises(
+            LumberyardHTTPError, key.set_contents_from_string, "new data"
+        )
+        self.assertEqual(self._count("POST"), 1)
+
+    def test_budget(self):
+        """once the budget is spent, errors go straight to the caller"""
+        budget = RetryBudget(ratio=0.0, reserve=1.0)
+        bucket = self._connect(
+            retry_policy=RetryPolicy(base_delay=0.001, budget=budget)
+        )
+        key = Key(bucket, "test-key")
+
+        self._server.fail_next("GET")
+        self.assertEqual(key.get_contents_as_string(), "test data")
+        self.assertEqual(budget.balance, 0.0)
+
+        self._server.fail_next("GET")
+        self.assertRaises(LumberyardHTTPError, key.get_contents_as_string)
+
+class TestHedge(LocalServerTestCase):
+    """test hedged reads"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._hedge_policy = HedgePolicy(HistogramCollector(), min_samples=5)
+        self._emulator = self._connect_s3(hedge_policy=self._hedge_policy)
+        self._bucket = self._emulator.create_bucket(collection_name)
+        self._key = Key(self._bucket, "test-key")
+        self._key.set_contents_from_string("test data")
+
+    def test_no_hedge_without_samples(self):
+        """until we know the usual latency, we wait"""
+        self._server.delay_next("GET", 0.2)
+        self.assertEqual(self._key.get_contents_as_string(), "test data")
+        self.assertEqual(self._hedge_policy.hedge_count, 0)
+
+    def test_slow_read_hedged(self):
+        """a stalled GET loses to its hedge"""
+        for _ in range(10):
+            self._key.get_contents_as_string()
+            self._key.exists()
+        self.assertEqual(self._hedge_policy.hedge_count, 0)
+
+        self._server.delay_next("GET", 2.0)
+        start_time = time.time()
+        self.assertEqual(self._key.get_contents_as_string(), "test data")
+        self.assertTrue(time.time() - start_time < 1.0)
+        self.assertEqual(self._hedge_policy.hedge_count, 1)
+
+        self._server.delay_next("HEAD", 2.0)
+        start_time = time.time()
+        self.assertTrue(self._key.exists())
+        self.assertTrue(time.time() - start_time < 1.0)
+        self.assertEqual(self._hedge_policy.hedge_count, 2)
+
+    def test_big_read_not_hedged(self):
+        """a read bigger than max_size is not hedged, however slow"""
+        for _ in range(10):
+            self._key.get_contents_as_string()
+        self.assertTrue(self._hedge_policy.accepts_size(1024))
+        self.assertFalse(self._hedge_policy.accepts_size(None))
+
+        key = Key(self._bucket, "big-key")
+        key.set_contents_from_string("x" * (2 * 1024 * 1024))
+        self._server.delay_next("GET", 0.2)
+        self.assertEqual(len(key.get_contents_as_string()), 2 * 1024 * 1024)
+        self.assertEqual(self._hedge_policy.hedge_count, 0)
+
+if __name__ == "__main__":
+    unittest.main()
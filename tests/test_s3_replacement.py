@@ -343,7 +343,7 @@ class TestS3(unittest.TestCase):
         # delete the bucket
         self._s3_connection.delete_bucket(bucket_name)
         
-    def xxxtest_simple_multipart(self):
+    def test_simple_multipart(self):
         """
         test a simple multipart upload
         """
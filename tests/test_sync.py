@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+test_sync.py
+
+test directory sync against the local server
+"""
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from motoboto.s3.key import Key
+from motoboto.sync import sync_directory, state_file_name
+
+from tests.local_server_test_case import LocalServerTestCase, collection_name
+
+class TestSync(LocalServerTestCase):
+    """test sync_directory"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._directory = tempfile.mkdtemp()
+        self._write("a.txt", "aaa")
+        self._write("sub/b.txt", "bbbb")
+        self._write("sub/deeper/c.txt", "c")
+
+    def tearDown(self):
+        LocalServerTestCase.tearDown(self)
+        shutil.rmtree(self._directory)
+
+    def _write(self, relative_path, data):
+        path = os.path.join(self._directory, *relative_path.split("/"))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as output_file:
+            output_file.write(data)
+
+    def _post_count(self):
+        return len([
+            path for method, path in self._server.request_log
+            if method == "POST"
+        ])
+
+    def test_first_sync(self):
+        """every file goes up, the state index does not"""
+        result = sync_directory(self._bucket, self._directory, prefix="p/")
+        self.assertEqual(sorted(result.uploaded), 
+                         ["p/a.txt", "p/sub/b.txt", "p/sub/deeper/c.txt", ])
+        self.assertEqual(result.bytes_uploaded, 8)
+        self.assertEqual(result.failures, [])
+        self.assertEqual(
+            self._server.get_data(collection_name, "p/sub/b.txt"), "bbbb"
+        )
+        self.assertTrue(
+            os.path.exists(os.path.join(self._directory, state_file_name))
+        )
+        self.assertEqual(len(self._bucket.get_all_keys()), 3)
+
+    def test_only_changes_go_up(self):
+        """a second sync sends only the changed and new files"""
+        sync_directory(self._bucket, self._directory)
+        post_count = self._post_count()
+
+        self._write("sub/b.txt", "BBBB")
+        self._write("new.txt", "new")
+        result = sync_directory(self._bucket, self._directory)
+        self.assertEqual(sorted(result.uploaded), ["new.txt", "sub/b.txt", ])
+        self.assertEqual(result.unchanged, 2)
+        self.assertEqual(self._post_count(), post_count + 2)
+        self.assertEqual(
+            self._server.get_data(collection_name, "sub/b.txt"), "BBBB"
+        )
+
+    def test_delete_and_dry_run(self):
+        """with delete, remote keys with no local file go"""
+        Key(self._bucket, "stale.txt").set_contents_from_string("old")
+        Key(self._bucket, "other/x").set_contents_from_string("x")
+
+        result = sync_directory(
+            self._bucket, self._directory, delete=True, dry_run=True
+        )
+        self.assertEqual(len(result.uploaded), 3)
+        self.assertEqual(result.deleted, ["other/x", "stale.txt", ])
+        self.assertEqual(len(self._bucket.get_all_keys()), 2)
+
+        result = sync_directory(self._bucket, self._directory, delete=True)
+        self.assertEqual(result.deleted, ["other/x", "stale.txt", ])
+        self.assertEqual(
+            sorted([key.name for key in self._bucket.get_all_keys()]),
+            ["a.txt", "sub/b.txt", "sub/deeper/c.txt", ]
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+test_transfer_manager.py
+
+test bulk upload and download against the local server
+"""
+from cStringIO import StringIO
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from tests.local_server_test_case import LocalServerTestCase, collection_name
+
+class TestTransferManager(LocalServerTestCase):
+    """test upload_many and download_many"""
+
+    def setUp(self):
+        LocalServerTestCase.setUp(self)
+        self._test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._test_dir)
+        LocalServerTestCase.tearDown(self)
+
+    def test_round_trip(self):
+        """paths, files and buffers up, paths and files down"""
+        upload_jobs = list()
+        for index in range(20):
+            path = os.path.join(self._test_dir, "up-%02d" % (index, ))
+            with open(path, "wb") as output_file:
+                output_file.write("p" * index)
+            upload_jobs.append((path, "path-%02d" % (index, ), ))
+        upload_jobs.append((StringIO("file data"), "file-key", ))
+        upload_jobs.append((bytearray("buffer data"), "buffer-key", ))
+
+        progress = list()
+        summary = self._bucket.upload_many(
+            iter(upload_jobs), 
+            thread_count=4, 
+            cb=lambda jobs, bytes: progress.append((jobs, bytes, ))
+        )
+        self.assertEqual(summary.failed, 0)
+        self.assertEqual(summary.succeeded, 22)
+        self.assertEqual(summary.bytes_transferred, 190 + 9 + 11)
+        self.assertEqual(progress[-1], (22, 210, ))
+
+        download_path = os.path.join(self._test_dir, "down")
+        download_file = StringIO()
+        summary = self._bucket.download_many([
+            (download_path, "path-07", ),
+            (download_file, "buffer-key", ),
+            (StringIO(), "no-such-key", ),
+        ])
+        self.assertEqual(summary.succeeded, 2)
+        self.assertEqual(summary.failed, 1)
+        self.assertEqual(summary.failures[0][0][1], "no-such-key")
+        with open(download_path, "rb") as input_file:
+            self.assertEqual(input_file.read(), "p" * 7)
+        self.assertEqual(download_file.getvalue(), "buffer data")
+
+    def test_retry(self):
+        """a 503 is retried and the source rewound"""
+        self._server.fail_next("POST", count=1)
+        summary = self._bucket.upload_many(
+            [(StringIO("retry me"), "retry-key", )], retry_delay=0.0
+        )
+        self.assertEqual(summary.succeeded, 1)
+        self.assertEqual(
+            self._server.get_data(collection_name, "retry-key"), "retry me"
+        )
+
+if __name__ == "__main__":
+    unittest.main()